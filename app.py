@@ -4,6 +4,7 @@ import random
 import json
 from functools import wraps
 import gzip
+import os
 from io import BytesIO
 from flask_babel import Babel, gettext as _, lazy_gettext
 
@@ -13,6 +14,14 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = 'fish_smart_hub_2023'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///fish_farm.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# SQLite调优：WAL模式、页缓存、内存映射等（见 services/sqlite_tuning.py）
+app.config['SQLITE_PROFILE'] = 'production'
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_recycle': 3600,
+    'connect_args': {'timeout': 30, 'check_same_thread': False}
+}
 app.config['DEBUG'] = False
 app.config['TESTING'] = False
 
@@ -30,6 +39,67 @@ app.config['COMPRESS_MIMETYPES'] = [
 app.config['COMPRESS_LEVEL'] = 6
 app.config['COMPRESS_THRESHOLD'] = 100  # 大于100字节才压缩
 
+# 传感器读数写入队列配置
+app.config['INGEST_QUEUE_MAX_ROWS'] = 200000  # 队列中最多积压的读数条数，超出返回429
+app.config['INGEST_BATCH_SIZE'] = 5000  # 累计满多少条读数提交一次
+app.config['INGEST_FLUSH_INTERVAL_MS'] = 200  # 最长等待多少毫秒提交一次
+app.config['INGEST_MAX_RETRIES'] = 3  # 其他错误重试多少次后拆分批次或转入死信文件（数据库被锁或忙时一直重试）
+app.config['INGEST_RETRY_BACKOFF_MS'] = 100  # 首次重试前等待的毫秒数，之后每次加倍
+app.config['INGEST_RETRY_MAX_BACKOFF_MS'] = 5000  # 重试等待的上限
+app.config['INGEST_DEAD_LETTER_PATH'] = os.path.join(app.instance_path, 'ingest_dead_letter.ndjson')  # 无法写入的读数（每行一条JSON）
+
+# 水质原始数据分区、归档与保留策略
+app.config['WATER_QUALITY_PARTITION_DIR'] = os.path.join(app.instance_path, 'partitions')
+app.config['WATER_QUALITY_HOT_DAYS'] = 35  # 热表保留最近多少天，更早的整月转存到月分区文件
+app.config['WATER_QUALITY_ARCHIVE_AFTER_DAYS'] = 180  # 分区结束多少天后压缩归档
+app.config['WATER_QUALITY_RETENTION_DAYS'] = None  # 分区结束多少天后删除原始数据（汇总完整时），None为永久保留
+app.config['WATER_QUALITY_ARCHIVE_CACHE_TTL'] = 3600  # 归档分区解压缓存保留的秒数
+
+# 已结束的天按塘口写成列式归档文件（需要安装pyarrow），用于长时间范围的查询和导出
+app.config['COLUMNAR_ARCHIVE_ENABLED'] = True
+app.config['COLUMNAR_ARCHIVE_DIR'] = os.path.join(app.instance_path, 'columnar')
+app.config['COLUMNAR_ARCHIVE_COMPRESSION'] = 'zstd'
+app.config['SCHEDULER_ENABLED'] = True  # 是否运行后台定时任务
+app.config['SCHEDULER_LOCK_PATH'] = os.path.join(app.instance_path, 'scheduler.lock')  # 多个工作进程时只有持有该锁的进程执行定时任务，None为不加锁
+app.config['SCHEDULER_LOCK_POLL'] = 30  # 未持有锁的进程每隔多少秒尝试接替
+
+# 读接口响应缓存：memory 为进程内缓存，file 为多个工作进程共享的目录缓存（可放在 /dev/shm），None 为关闭
+app.config['RESPONSE_CACHE_BACKEND'] = 'memory'
+app.config['RESPONSE_CACHE_DIR'] = None  # file 后端的目录，默认 instance/response_cache
+app.config['RESPONSE_CACHE_TTL'] = 60  # 缓存项最长保留的秒数（塘口有写入时立即失效）
+app.config['RESPONSE_CACHE_MAX_ENTRIES'] = 1024
+
+# 实时推送（/data/stream）配置
+app.config['STREAM_HEARTBEAT_SECONDS'] = 15  # 空闲时发送心跳的间隔，也是断线后浏览器重连的等待时间
+app.config['STREAM_QUEUE_SIZE'] = 1000  # 每个连接最多积压的事件数，超出后通知客户端重新加载
+app.config['STREAM_HISTORY_SIZE'] = 1000  # 保留的最近事件数，用于断线重连时补发
+app.config['STREAM_MAX_CLIENTS'] = 200  # 最大同时连接数
+
+# 阈值预警引擎：每批读数写入后按阈值规则评估，持续超限只产生一条预警
+app.config['ALERT_ENGINE_ENABLED'] = True
+app.config['ALERT_THRESHOLD_RELOAD_SECONDS'] = 60  # 定期重新加载阈值规则和预警状态（其他工作进程的修改在此时间内生效）
+app.config['ACTIVE_ALERT_INDEX_TTL'] = 5  # 活跃预警索引的有效秒数（本进程的预警变更立即生效）
+
+# 每日投喂方案预计算：读数、投喂记录写入后由定时任务更新对应塘口今天各时段的方案
+app.config['FEEDING_PLAN_ENABLED'] = True
+app.config['FEEDING_PLAN_INTERVAL'] = 30  # 检查待更新塘口的间隔秒数
+app.config['FEEDING_PLAN_SLOTS'] = (8, 14, 20)  # 每天的投喂时段（小时）
+app.config['FEEDING_PLAN_TOLERANCE'] = 0.05  # 推荐投喂量相对变化超过该比例时更新方案
+app.config['FEEDING_PLAN_INPUT_TOLERANCES'] = None  # 各水质指标的变化容差，None使用默认值（见 services/feeding_plans.py）
+
+# 周报预生成：已结束的周只生成一次，本周的周报由定时任务增量更新
+app.config['WEEKLY_REPORT_WEEKS'] = 4  # 维护最近几周的周报
+app.config['WEEKLY_REPORT_INTERVAL'] = 300  # 定时任务更新本周周报的间隔秒数
+app.config['WEEKLY_REPORT_OPEN_MAX_AGE'] = 600  # 请求时本周周报超过该秒数未更新则先增量更新
+
+# 多塘口导出：按塘口分片，由进程池中的工作进程各自以只读连接读取
+app.config['EXPORT_PROCESSES'] = None  # 工作进程数，None为 min(4, CPU核数)，1为不使用进程池
+app.config['EXPORT_START_METHOD'] = 'spawn'  # 工作进程的启动方式（spawn 不继承请求进程中的线程和锁）
+app.config['EXPORT_PRESTART'] = True  # 打开数据页面时在后台预先启动工作进程，False为第一次并行导出时再启动
+
+# API响应的JSON序列化：安装了orjson时使用orjson，否则使用标准库json（见 services/json_provider.py）
+app.config['JSON_USE_ORJSON'] = True
+
 # 语言选择函数
 def get_locale():
     # 从session获取语言设置，如果没有则使用浏览器语言
@@ -74,12 +144,56 @@ def add_cache_headers(response):
         response.headers['Cache-Control'] = 'public, max-age=31536000'
     return response
 
+# 安装JSON序列化层
+from services.json_provider import init_json_provider
+init_json_provider(app)
+
 # 导入模型和db实例
 from models import db, User, Pond, WaterQuality, FeedingRecord, Alert, FeedingDecision
 
 # 初始化数据库
 db.init_app(app)
 
+# 为每个数据库连接设置SQLite PRAGMA
+from services.sqlite_tuning import init_sqlite_tuning
+init_sqlite_tuning(app, db)
+
+# 初始化读数写入队列（后台写线程在第一次入队时启动）
+from services.ingest_queue import ingest_queue
+ingest_queue.init_app(app)
+
+# 初始化响应缓存（塘口有写入时失效）
+from services.cache import response_cache
+response_cache.init_app(app)
+
+# 初始化实时推送事件中心（读数写入和预警提交后推送）
+from services.stream import event_broker
+event_broker.init_app(app)
+
+# 初始化阈值预警引擎（读数写入后评估，新预警经事件中心推送）
+from services.alert_engine import alert_engine, ensure_default_thresholds
+alert_engine.init_app(app)
+
+# 初始化活跃预警索引（预警列表保存在数据库，会话中只保存已读游标）
+from services.active_alerts import active_alert_index
+active_alert_index.init_app(app)
+
+# 初始化每日投喂方案预计算（读数和投喂记录写入后标记待更新的塘口）
+from services.feeding_plans import feeding_planner
+feeding_planner.init_app(app)
+
+# 初始化周报引擎（预生成的周报保存在数据库中）
+from services.reports import report_engine
+report_engine.init_app(app)
+
+# 初始化多塘口导出的进程池（导入时不启动工作进程）
+from services.export import export_pool
+export_pool.init_app(app)
+
+# 初始化定时任务调度器
+from services.scheduler import scheduler
+scheduler.init_app(app)
+
 # 导入路由
 from routes import main_bp
 from route_modules.data_routes import data_bp
@@ -296,10 +410,31 @@ def create_demo_data():
     
     db.session.commit()
 
-# 创建数据库表和演示数据
-with app.app_context():
-    db.create_all()
-    create_demo_data()
+# 创建数据库表、补建新增列和索引、默认预警阈值、演示数据和水质汇总
+from services.migrations import apply_index_migrations, apply_column_migrations
+from services.rollups import ensure_rollups
+
+# 多塘口导出的工作进程以spawn方式启动时会以 __mp_main__ 重新导入本文件，工作进程不执行初始化和定时任务
+if __name__ != '__mp_main__':
+    with app.app_context():
+        db.create_all()
+        apply_column_migrations(db)
+        apply_index_migrations(db)
+        ensure_default_thresholds()
+        create_demo_data()
+        ensure_rollups()
+
+    # 注册定时任务
+    from services.storage import maintain_partitions
+    from services.columnar_archive import archive_closed_days
+
+    scheduler.add_job('water_quality_partitions', maintain_partitions, interval=3600, delay=60)
+    scheduler.add_job('water_quality_columnar_archive', archive_closed_days, interval=3600, delay=120)
+    scheduler.add_job('weekly_reports', report_engine.refresh, interval=app.config['WEEKLY_REPORT_INTERVAL'], delay=30)
+    if app.config['FEEDING_PLAN_ENABLED']:
+        scheduler.add_job('feeding_plans', feeding_planner.refresh, interval=app.config['FEEDING_PLAN_INTERVAL'], delay=5)
+    if app.config['SCHEDULER_ENABLED']:
+        scheduler.start()
 
 if __name__ == '__main__':
     # Release模式：关闭调试，使用生产环境配置
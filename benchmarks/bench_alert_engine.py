@@ -0,0 +1,93 @@
+"""阈值预警引擎评估速度基准测试：向量化 vs 逐条
+
+按默认阈值为若干塘口生成随机游走的读数批次（偶尔越过阈值），分别用以下方式
+评估整批读数，输出每秒评估的读数条数，并检查两者得到的级别变化完全一致：
+    python  - 逐条读数、逐个指标计算级别（未安装numpy时的实现）
+    numpy   - 整批读数、全部指标向量化计算
+
+用法（在项目根目录运行，不访问数据库）：
+    python benchmarks/bench_alert_engine.py [--rows 10000 100000 1000000] [--ponds 20] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import AlertThreshold
+from services.alert_engine import AlertEngine, DEFAULT_THRESHOLDS, THRESHOLD_FIELDS, _bounds, np
+from services.water_quality import METRIC_FIELDS
+
+
+def make_engine(ponds):
+    engine = AlertEngine()
+    bounds = [_bounds(AlertThreshold(metric=metric, enabled=True, **dict(zip(THRESHOLD_FIELDS, DEFAULT_THRESHOLDS[metric]))))
+              for metric in METRIC_FIELDS]
+    engine._thresholds = {pond_id: bounds for pond_id in range(1, ponds + 1)}
+    return engine
+
+
+def make_rows(count, ponds, seed=1):
+    """每个塘口每分钟一条读数，各指标在默认阈值附近随机游走"""
+    rnd = random.Random(seed)
+    center = {}
+    for metric, (warning_min, warning_max, danger_min, danger_max, _) in DEFAULT_THRESHOLDS.items():
+        low = warning_min if warning_min is not None else 0.5 * warning_max
+        high = warning_max if warning_max is not None else 2 * warning_min
+        center[metric] = ((low + high) / 2, (high - low) / 2)
+
+    state = {pond_id: {metric: mid for metric, (mid, _) in center.items()} for pond_id in range(1, ponds + 1)}
+    start = datetime.now() - timedelta(minutes=count // ponds + 1)
+    rows = []
+    for i in range(count):
+        pond_id = i % ponds + 1
+        row = {'pond_id': pond_id, 'timestamp': start + timedelta(minutes=i // ponds)}
+        values = state[pond_id]
+        for metric, (mid, spread) in center.items():
+            # 向中心回归的随机游走，步长让读数不时越过阈值
+            values[metric] += 0.05 * (mid - values[metric]) + rnd.gauss(0, 0.1 * spread)
+            row[metric] = None if rnd.random() < 0.05 else values[metric]
+        rows.append(row)
+    return rows
+
+
+def best_of(repeat, func):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--ponds', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    engine = make_engine(args.ponds)
+    modes = ['python'] + (['numpy'] if np is not None else [])
+    print(f'{args.ponds} 个塘口，{len(METRIC_FIELDS)} 项指标；取 {args.repeat} 次中最快的一次')
+    print(f"{'读数条数':>10}{'级别变化':>10}" + ''.join(f'{mode + " 条/秒":>16}' for mode in modes) + f"{'结果一致':>10}")
+
+    for count in args.rows:
+        rows = make_rows(count, args.ponds)
+        rates = {}
+        results = {}
+        for mode in modes:
+            elapsed, results[mode] = best_of(args.repeat, lambda: engine.scan(rows, use_numpy=mode == 'numpy'))
+            rates[mode] = count / elapsed
+        same = all(result == results['python'] for result in results.values())
+        print(f'{count:>10}{len(results["python"][0]):>10}'
+              + ''.join(f'{rates[mode]:>16,.0f}' for mode in modes) + f'{"是" if same else "否":>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""投喂决策计算速度基准测试：批量向量化 vs 逐个塘口
+
+随机生成若干塘口的面积、最新水质和最近投喂时间（部分塘口无投喂记录），分别测试：
+    计算   - 内存中的同一份状态，逐个塘口调用 calculate_feeding_amount（未安装numpy
+             时的实现）与 feeding_recommendations 一次计算全部塘口
+    含读取 - 临时数据库中的同样数据，原今日投喂方案的逐塘口查询加逐个计算，与
+             load_feeding_state/load_day_feedings 集合查询加批量计算
+输出耗时并检查两种方式得到的推荐投喂量完全一致。
+
+用法（在项目根目录运行，使用临时数据库）：
+    python benchmarks/bench_feeding_engine.py [--ponds 100 1000 10000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+import services.feeding_engine as feeding_engine
+from models import db, User, Pond, WaterQuality, FeedingRecord, FeedingDecision
+from services.feeding_engine import (FEEDING_METRICS, calculate_feeding_amount, feeding_recommendations,
+                                     load_feeding_state, load_day_feedings)
+from services.water_quality import latest_rows_by_pond, latest_water_quality_by_pond
+
+PondRow = namedtuple('PondRow', 'id name area species')
+WaterQualityRow = namedtuple('WaterQualityRow', ('pond_id',) + FEEDING_METRICS)
+FeedingRow = namedtuple('FeedingRow', 'pond_id time amount')
+
+
+def make_state(ponds, now, seed=1):
+    """与 load_feeding_state 结构相同的状态；取值覆盖各系数的全部分支和边界"""
+    rnd = random.Random(seed)
+    state = {'ponds': [], 'water_quality': {}, 'latest_feeding': {}, 'latest_decision': {}}
+    for pond_id in range(1, ponds + 1):
+        state['ponds'].append(PondRow(pond_id, f'{pond_id}号塘', rnd.choice([0.1, 0.3, 1.0, 2.5, 5.0, 12.0]), '草鱼'))
+        if rnd.random() < 0.9:
+            state['water_quality'][pond_id] = WaterQualityRow(
+                pond_id,
+                rnd.choice([20, 28, round(rnd.uniform(15, 33), 1)]),
+                rnd.choice([4.0, 7.0, round(rnd.uniform(2, 10), 2)]),
+                rnd.choice([7.0, 8.5, round(rnd.uniform(6, 9.5), 2)]),
+                rnd.choice([0.4, round(rnd.uniform(0, 1), 3)])
+            )
+        if rnd.random() < 0.8:
+            hours = rnd.choice([6, 24, rnd.uniform(0, 72)])
+            state['latest_feeding'][pond_id] = FeedingRow(pond_id, now - timedelta(hours=hours), 10.0)
+    return state
+
+
+def default_water_quality():
+    return {'temperature': 25.0, 'dissolved_oxygen': 6.0, 'ph': 7.5, 'ammonia': 0.2}
+
+
+def scalar(state, now):
+    results = []
+    for pond in state['ponds']:
+        latest = state['water_quality'].get(pond.id)
+        water_quality = default_water_quality() if latest is None else {metric: getattr(latest, metric) for metric in FEEDING_METRICS}
+        latest_feeding = state['latest_feeding'].get(pond.id)
+        results.append(calculate_feeding_amount(pond, water_quality, latest_feeding, now))
+    return results
+
+
+def batch(state, now):
+    return [amount for *_, amount in feeding_recommendations(state, default_water_quality, now)]
+
+
+def seed(state, now):
+    """把内存中的状态写入数据库：每个塘口除最新一条外另有较早的水质和投喂记录"""
+    db.session.execute(insert(User), [{'id': 1, 'username': 'bench'}])
+    db.session.execute(insert(Pond), [
+        {'id': pond.id, 'name': pond.name, 'area': pond.area, 'species': pond.species, 'user_id': 1}
+        for pond in state['ponds']
+    ])
+    readings = []
+    for pond_id, row in state['water_quality'].items():
+        for age in (0, 1, 2):
+            reading = {metric: getattr(row, metric) for metric in FEEDING_METRICS}
+            readings.append(dict(reading, pond_id=pond_id, timestamp=now - timedelta(hours=age)))
+    db.session.execute(insert(WaterQuality), readings)
+    feedings = []
+    for pond_id, row in state['latest_feeding'].items():
+        for age in (0, 8):
+            feedings.append({'pond_id': pond_id, 'time': row.time - timedelta(hours=age), 'amount': row.amount})
+    db.session.execute(insert(FeedingRecord), feedings)
+    db.session.commit()
+
+
+def per_pond_plan(now):
+    """原今日投喂方案的实现：批量取最新记录，但逐塘口查询当天投喂和决策并逐个计算"""
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    today_end = today_start + timedelta(days=1)
+    latest_snapshot = latest_water_quality_by_pond()
+    latest_feedings = latest_rows_by_pond(FeedingRecord, FeedingRecord.time)
+    amounts = []
+    for pond in Pond.query.all():
+        latest = latest_snapshot.get(pond.id)
+        water_quality = default_water_quality() if latest is None else {metric: getattr(latest, metric) for metric in FEEDING_METRICS}
+        today_feedings = FeedingRecord.query.filter(
+            FeedingRecord.pond_id == pond.id, FeedingRecord.time >= today_start, FeedingRecord.time < today_end
+        ).all()
+        FeedingDecision.query.filter(
+            FeedingDecision.pond_id == pond.id, FeedingDecision.created_at >= today_start,
+            FeedingDecision.created_at < today_end
+        ).order_by(FeedingDecision.created_at.desc()).first()
+        amount = calculate_feeding_amount(pond, water_quality, latest_feedings.get(pond.id), now)
+        amounts.append((amount, sum(feeding.amount for feeding in today_feedings)))
+    return amounts
+
+
+def batch_plan(now):
+    state = load_feeding_state()
+    today_feedings = load_day_feedings(now.date())
+    return [(amount, sum(feeding.amount for feeding in today_feedings.get(pond.id, [])))
+            for pond, _, _, amount in feeding_recommendations(state, default_water_quality, now)]
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    db.init_app(app)
+    return app
+
+
+def best_of(repeat, func):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ponds', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if feeding_engine.np is None:
+        print('未安装numpy，批量计算退回逐个塘口计算，无可比较的结果')
+        return
+
+    now = datetime.now()
+    print(f'取 {args.repeat} 次中最快的一次')
+    print(f"{'塘口数':>8}{'计算 python':>14}{'计算 numpy':>14}{'含读取 逐塘口':>16}{'含读取 批量':>14}{'结果一致':>10}  (毫秒)")
+    for ponds in args.ponds:
+        state = make_state(ponds, now)
+        python_elapsed, expected = best_of(args.repeat, lambda: scalar(state, now))
+        numpy_elapsed, actual = best_of(args.repeat, lambda: batch(state, now))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            app = make_app(os.path.join(tmp, 'bench.db'))
+            with app.app_context():
+                db.create_all()
+                seed(state, now)
+                per_pond_elapsed, per_pond_result = best_of(args.repeat, lambda: per_pond_plan(now))
+                batch_elapsed, batch_result = best_of(args.repeat, lambda: batch_plan(now))
+                db.session.remove()
+                db.engine.dispose()
+
+        same = actual == expected and batch_result == per_pond_result
+        print(f'{ponds:>8}{python_elapsed * 1000:>14.2f}{numpy_elapsed * 1000:>14.2f}'
+              f'{per_pond_elapsed * 1000:>16.2f}{batch_elapsed * 1000:>14.2f}{"是" if same else "否":>10}')
+
+
+if __name__ == '__main__':
+    main()
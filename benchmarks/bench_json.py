@@ -0,0 +1,109 @@
+"""API响应JSON序列化基准测试
+
+通过测试客户端请求数据量最大的几个API，记录各接口交给 jsonify 的数据，
+再分别用以下序列化层重复生成响应，输出单次序列化耗时和整个请求的耗时：
+    flask   - Flask默认的 DefaultJSONProvider（标准库json）
+    stdlib  - FastJSONProvider 未使用orjson时的回退实现
+    orjson  - FastJSONProvider 使用orjson（需要安装orjson）
+
+用法（在项目根目录运行，会使用应用配置的数据库）：
+    python benchmarks/bench_json.py [--repeat 20] [URL ...]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask.json.provider import DefaultJSONProvider
+
+from app import app
+from services.json_provider import FastJSONProvider, orjson
+
+DEFAULT_URLS = [
+    '/data/api/water_quality/1?days=30',
+    '/data/api/water_quality/1?days=7&compare=1',
+    '/data/api/water_quality/1?days=7&format=columnar',
+    '/decision/api/decisions',
+    '/decision/api/today_feeding_plan',
+    '/alert/api/alert_detail/1',
+    '/weekly_report/data',
+]
+
+
+def providers():
+    result = {
+        'flask': DefaultJSONProvider(app),
+        'stdlib': FastJSONProvider(app, use_orjson=False),
+    }
+    if orjson is not None:
+        result['orjson'] = FastJSONProvider(app)
+    return result
+
+
+def capture_payload(client, url):
+    """请求一次URL，返回交给 jsonify 的对象"""
+    captured = []
+
+    class RecordingProvider(FastJSONProvider):
+        def response(self, *args, **kwargs):
+            captured.append(self._prepare_response_obj(args, kwargs))
+            return super().response(*args, **kwargs)
+
+    app.json = RecordingProvider(app)
+    client.get(url).get_data()
+    return captured[-1] if captured else None
+
+
+def best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('urls', nargs='*')
+    args = parser.parse_args()
+
+    client = app.test_client()
+    candidates = providers()
+    names = list(candidates)
+
+    print(f'取 {args.repeat} 次中最快的一次；序列化为单次 response() 耗时（毫秒），请求为完整请求耗时（毫秒）')
+    print(f"{'接口':<52}{'大小':>10}" + ''.join(f'{name + " 序列化":>14}' for name in names)
+          + ''.join(f'{name + " 请求":>12}' for name in names))
+
+    original = app.json
+    try:
+        for url in args.urls or DEFAULT_URLS:
+            payload = capture_payload(client, url)
+            if payload is None:
+                print(f'{url:<52}  未调用 jsonify，跳过')
+                continue
+
+            serialize = {}
+            request = {}
+            size = 0
+            for name, provider in candidates.items():
+                with app.app_context():
+                    size = len(provider.response(payload).get_data())
+                    serialize[name] = best_of(args.repeat, lambda: provider.response(payload))
+                app.json = provider
+                request[name] = best_of(args.repeat, lambda: client.get(url).get_data())
+
+            print(f'{url:<52}{size:>10}'
+                  + ''.join(f'{serialize[name] * 1000:>14.2f}' for name in names)
+                  + ''.join(f'{request[name] * 1000:>12.1f}' for name in names))
+    finally:
+        app.json = original
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""水质记录读取方式基准测试：ORM对象 vs Core元组查询
+
+在临时数据库上预置指定条数的读数，分别用以下方式读出并转换为趋势API使用的字典，
+输出每秒处理的行数：
+    orm   - 查询完整的 WaterQuality ORM 对象，再逐个复制属性到字典（原实现）
+    core  - Core select 只查询所需列，直接按下标从行元组取值（当前只读路径的实现）
+
+用法（在项目根目录运行）：
+    python benchmarks/bench_row_hydration.py [--rows 10000 100000 1000000] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+from models import db, WaterQuality
+
+# 与趋势API默认返回的指标一致
+FIELDS = ['temperature', 'dissolved_oxygen', 'ph', 'ammonia']
+BATCH_SIZE = 1000
+
+INSERT_SQL = text(
+    "INSERT INTO water_quality (pond_id, timestamp, temperature, ph, dissolved_oxygen, ammonia) "
+    "VALUES (1, :timestamp, :temperature, :ph, :dissolved_oxygen, :ammonia)"
+)
+
+
+def seed(engine, rows, now):
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO user (id, username) VALUES (1, 'bench')"))
+        conn.execute(text("INSERT INTO pond (id, name, area, species, user_id) VALUES (1, '1号塘', 5, 'bench', 1)"))
+        for offset in range(0, rows, 100000):
+            conn.execute(INSERT_SQL, [
+                {
+                    'timestamp': (now - timedelta(seconds=30 * i)).isoformat(sep=' ', timespec='microseconds'),
+                    'temperature': random.uniform(20, 30),
+                    'ph': random.uniform(6.5, 8.5),
+                    'dissolved_oxygen': random.uniform(4, 8),
+                    'ammonia': random.uniform(0.1, 0.5)
+                }
+                for i in range(offset, min(offset + 100000, rows))
+            ])
+
+
+def read_orm(session, start_time):
+    query = session.query(WaterQuality).filter(
+        WaterQuality.pond_id == 1,
+        WaterQuality.timestamp >= start_time
+    ).order_by(WaterQuality.timestamp.asc(), WaterQuality.id.asc()).yield_per(BATCH_SIZE)
+
+    data = []
+    for wq in query:
+        item = {'timestamp': wq.timestamp.isoformat()}
+        for field in FIELDS:
+            item[field] = getattr(wq, field)
+        data.append(item)
+    return len(data)
+
+
+def read_core(session, start_time):
+    table = WaterQuality.__table__
+    stmt = select(table.c.timestamp, *[table.c[field] for field in FIELDS]).where(
+        table.c.pond_id == 1,
+        table.c.timestamp >= start_time
+    ).order_by(table.c.timestamp.asc(), table.c.id.asc())
+
+    data = []
+    for row in session.execute(stmt, execution_options={'yield_per': BATCH_SIZE}):
+        item = {'timestamp': row[0].isoformat()}
+        for index, field in enumerate(FIELDS, start=1):
+            item[field] = row[index]
+        data.append(item)
+    return len(data)
+
+
+METHODS = {'orm': read_orm, 'core': read_core}
+
+
+def run(rows, repeat):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    engine = create_engine(f'sqlite:///{path}')
+    now = datetime.now()
+    seed(engine, rows, now)
+    start_time = now - timedelta(seconds=30 * rows)
+
+    result = {}
+    try:
+        for name, method in METHODS.items():
+            best = None
+            for _ in range(repeat):
+                # 每次使用新会话，避免标识映射中残留上一轮的对象
+                with Session(engine) as session:
+                    started = time.perf_counter()
+                    count = method(session, start_time)
+                    elapsed = time.perf_counter() - started
+                assert count == rows, f'{name} 读取 {count} 行，预期 {rows} 行'
+                best = elapsed if best is None else min(best, elapsed)
+            result[name] = rows / best
+    finally:
+        engine.dispose()
+        os.remove(path)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'指标 {len(FIELDS)} 项，每批 {BATCH_SIZE} 行，取 {args.repeat} 次中最快的一次')
+    print(f"{'行数':>10}{'ORM 行/秒':>14}{'Core 行/秒':>14}{'提升':>8}")
+    for rows in args.rows:
+        result = run(rows, args.repeat)
+        print(f"{rows:>10}{result['orm']:>14,.0f}{result['core']:>14,.0f}"
+              f"{result['core'] / result['orm']:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""SQLite配置档混合读写基准测试
+
+在临时数据库上分别以各配置档运行相同的负载：若干读线程循环查询最新读数和
+24小时区间数据，一个写线程持续以小批量提交新读数。输出每秒读/写次数和锁错误数。
+
+用法（在项目根目录运行）：
+    python benchmarks/bench_sqlite_profile.py [--seconds 5] [--readers 4] [--rows 200000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from models import db
+from services.sqlite_tuning import SQLITE_PROFILES, install_pragma_hook, profile_pragmas
+
+POND_COUNT = 20
+WRITE_BATCH = 50
+
+INSERT_SQL = text(
+    "INSERT INTO water_quality (pond_id, timestamp, temperature, ph, dissolved_oxygen, ammonia) "
+    "VALUES (:pond_id, :timestamp, :temperature, :ph, :dissolved_oxygen, :ammonia)"
+)
+LATEST_SQL = text(
+    "SELECT * FROM water_quality WHERE pond_id = :pond_id ORDER BY timestamp DESC LIMIT 1"
+)
+RANGE_SQL = text(
+    "SELECT timestamp, temperature, ph, dissolved_oxygen, ammonia FROM water_quality "
+    "WHERE pond_id = :pond_id AND timestamp >= :start ORDER BY timestamp"
+)
+
+
+def reading(pond_id, timestamp):
+    return {
+        'pond_id': pond_id,
+        'timestamp': timestamp.isoformat(sep=' ', timespec='microseconds'),
+        'temperature': random.uniform(20, 30),
+        'ph': random.uniform(6.5, 8.5),
+        'dissolved_oxygen': random.uniform(4, 8),
+        'ammonia': random.uniform(0.1, 0.5)
+    }
+
+
+def build_engine(path, profile):
+    engine = create_engine(
+        f'sqlite:///{path}',
+        pool_size=10, max_overflow=20,
+        connect_args={'timeout': 30, 'check_same_thread': False}
+    )
+    install_pragma_hook(engine, profile_pragmas(profile))
+    return engine
+
+
+def seed(engine, rows, now):
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO user (id, username) VALUES (1, 'bench')"))
+        for pond_id in range(1, POND_COUNT + 1):
+            conn.execute(text(
+                "INSERT INTO pond (id, name, area, species, user_id) VALUES (:id, :name, 5, 'bench', 1)"
+            ), {'id': pond_id, 'name': f'{pond_id}号塘'})
+        per_pond = rows // POND_COUNT
+        conn.execute(INSERT_SQL, [
+            reading(pond_id, now - timedelta(minutes=5 * i))
+            for pond_id in range(1, POND_COUNT + 1)
+            for i in range(per_pond)
+        ])
+
+
+def run(profile, seconds, readers, rows):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    engine = build_engine(path, profile)
+    now = datetime.now()
+    seed(engine, rows, now)
+
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    lock = threading.Lock()
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+
+    def reader():
+        while not stop.is_set():
+            pond_id = random.randint(1, POND_COUNT)
+            try:
+                with engine.connect() as conn:
+                    conn.execute(LATEST_SQL, {'pond_id': pond_id}).fetchall()
+                    conn.execute(RANGE_SQL, {
+                        'pond_id': pond_id,
+                        'start': (now - timedelta(hours=24)).isoformat(sep=' ')
+                    }).fetchall()
+                count('reads')
+            except OperationalError:
+                count('locked')
+
+    def writer():
+        tick = 0
+        while not stop.is_set():
+            tick += 1
+            batch = [
+                reading(random.randint(1, POND_COUNT), now + timedelta(seconds=tick, microseconds=i))
+                for i in range(WRITE_BATCH)
+            ]
+            try:
+                with engine.begin() as conn:
+                    conn.execute(INSERT_SQL, batch)
+                count('writes')
+            except OperationalError:
+                count('locked')
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    engine.dispose()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    return {
+        'reads_per_sec': counts['reads'] / seconds,
+        'writes_per_sec': counts['writes'] / seconds,
+        'rows_written_per_sec': counts['writes'] * WRITE_BATCH / seconds,
+        'locked': counts['locked']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--profiles', nargs='+', default=list(SQLITE_PROFILES))
+    args = parser.parse_args()
+
+    print(f'读线程 {args.readers} 个，写线程 1 个（每批 {WRITE_BATCH} 条），'
+          f'预置 {args.rows} 条读数，每个配置档运行 {args.seconds} 秒')
+    print(f"{'配置档':<12}{'读/秒':>10}{'写事务/秒':>12}{'写入行/秒':>12}{'锁错误':>8}")
+    for profile in args.profiles:
+        result = run(profile, args.seconds, args.readers, args.rows)
+        print(f"{profile:<12}{result['reads_per_sec']:>10.1f}{result['writes_per_sec']:>12.1f}"
+              f"{result['rows_written_per_sec']:>12.1f}{result['locked']:>8}")
+
+
+if __name__ == '__main__':
+    main()
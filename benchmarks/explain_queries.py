@@ -0,0 +1,92 @@
+"""核对核心页面和API实际执行的SQL的查询计划
+
+通过测试客户端请求各页面，记录期间执行的全部SELECT语句，
+再逐条执行 EXPLAIN QUERY PLAN。对大表的全表扫描（SCAN）和额外排序
+（USE TEMP B-TREE）做出标记，便于确认查询走了 (pond_id, 时间) 复合索引。
+
+用法（在项目根目录运行，会使用应用配置的数据库）：
+    python benchmarks/explain_queries.py [URL ...]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import app
+from models import db
+
+DEFAULT_URLS = [
+    '/',
+    '/pond/1',
+    '/data/api/pond/1',
+    '/data/api/ponds',
+    '/data/api/latest_water_quality',
+    '/data/api/water_quality/1?days=7',
+    '/data/export?format=csv&pond_id=1&days=7',
+    '/decision/',
+    '/decision/api/decisions',
+    '/decision/api/today_feeding_plan',
+    '/decision/api/historical_decisions/1',
+    '/decision/api/decision_analysis/1',
+    '/alert/api/alert_detail/1',
+]
+
+# 数据量大的表，出现在这些表上的全表扫描需要关注
+LARGE_TABLES = ('water_quality', 'feeding_record', 'feeding_decision', 'alert')
+
+
+def capture_statements(urls):
+    statements = {}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            statements.setdefault(statement, (parameters, set()))[1].add(current_url[0])
+
+    current_url = [None]
+    client = app.test_client()
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            for url in urls:
+                current_url[0] = url
+                response = client.get(url)
+                response.get_data()
+                print(f'{response.status_code} {url}')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def flag(detail):
+    for table in LARGE_TABLES:
+        if detail.startswith(f'SCAN {table}') and 'INDEX' not in detail:
+            return '!! 全表扫描'
+    if 'USE TEMP B-TREE FOR ORDER BY' in detail or 'RIGHT PART OF ORDER BY' in detail:
+        return '!  额外排序'
+    return ''
+
+
+def main():
+    urls = sys.argv[1:] or DEFAULT_URLS
+    statements = capture_statements(urls)
+    flagged = 0
+
+    with app.app_context():
+        conn = db.session.connection()
+        for statement, (parameters, sources) in statements.items():
+            plan = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+            print('\n' + '=' * 80)
+            print('来源: ' + ', '.join(sorted(sources)))
+            print(' '.join(statement.split()))
+            for row in plan:
+                mark = flag(row[3])
+                flagged += bool(mark)
+                print(f'  {mark:<10} {row[3]}')
+
+    print(f'\n共 {len(statements)} 条语句，{flagged} 处需要关注')
+
+
+if __name__ == '__main__':
+    main()
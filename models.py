@@ -35,7 +35,7 @@ class Pond(db.Model):
 
 class WaterQuality(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    pond_id = db.Column(db.Integer, db.ForeignKey('pond.id'), nullable=False, index=True)
+    pond_id = db.Column(db.Integer, db.ForeignKey('pond.id'), nullable=False)
     temperature = db.Column(db.Float, nullable=False)  # 温度（℃）
     turbidity = db.Column(db.Float, nullable=True)  # 浊度（NTU）
     conductivity = db.Column(db.Float, nullable=True)  # 电导率（μS/cm）
@@ -53,40 +53,187 @@ class WaterQuality(db.Model):
     biotoxicity = db.Column(db.Float, nullable=True)  # 生物毒性（%）
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
+    # 按塘口+时间范围查询（SQLite可反向扫描升序索引，DESC排序同样不需要额外排序）
+    __table_args__ = (
+        db.Index('ix_water_quality_pond_id_timestamp', 'pond_id', 'timestamp'),
+    )
+    
     def __repr__(self):
         return f'<WaterQuality {self.pond_id} at {self.timestamp}>'
 
+class WaterQualityRollupMixin:
+    """水质汇总表公共字段：每个塘口、每个时间桶、每项指标一行"""
+    pond_id = db.Column(db.Integer, db.ForeignKey('pond.id'), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)  # 时间桶起点（整点或零点）
+    metric = db.Column(db.String(30), primary_key=True)  # 指标字段名
+    sample_count = db.Column(db.Integer, nullable=False)  # 有效读数条数（不含该指标为空的读数）
+    value_sum = db.Column(db.Float, nullable=False)
+    value_min = db.Column(db.Float, nullable=False)
+    value_max = db.Column(db.Float, nullable=False)
+    value_first = db.Column(db.Float, nullable=False)  # 桶内最早一条有效读数的值
+    first_at = db.Column(db.DateTime, nullable=False)
+    value_last = db.Column(db.Float, nullable=False)  # 桶内最新一条有效读数的值
+    last_at = db.Column(db.DateTime, nullable=False)
+    
+    @property
+    def value_avg(self):
+        return self.value_sum / self.sample_count
+
+class WaterQualityHourly(WaterQualityRollupMixin, db.Model):
+    __tablename__ = 'water_quality_hourly'
+    
+    def __repr__(self):
+        return f'<WaterQualityHourly {self.pond_id} {self.metric} at {self.bucket_start}>'
+
+class WaterQualityDaily(WaterQualityRollupMixin, db.Model):
+    __tablename__ = 'water_quality_daily'
+    
+    def __repr__(self):
+        return f'<WaterQualityDaily {self.pond_id} {self.metric} at {self.bucket_start}>'
+
+class WaterQualityPartition(db.Model):
+    """水质原始数据月分区登记表（分区文件位于 WATER_QUALITY_PARTITION_DIR）"""
+    __tablename__ = 'water_quality_partition'
+    
+    month = db.Column(db.String(7), primary_key=True)  # 分区月份，如 2024-01
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)  # 下月1日零点（不含）
+    file_name = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='active')  # active, archived, dropped
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    retention_days = db.Column(db.Integer, nullable=True)  # 为空时使用 WATER_QUALITY_RETENTION_DAYS
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    archived_at = db.Column(db.DateTime, nullable=True)
+    dropped_at = db.Column(db.DateTime, nullable=True)
+    # 各塘口的最新读数是否已记入 WaterQualityPartitionLatest（之前创建的分区由维护任务补记）
+    latest_recorded = db.Column(db.Boolean, nullable=True)
+    
+    def __repr__(self):
+        return f'<WaterQualityPartition {self.month} {self.status}>'
+
+class WaterQualityPartitionLatest(db.Model):
+    """各塘口已转存到月分区的最新一条读数，热表中没有读数的塘口从这里取最新水质，不打开分区文件"""
+    __tablename__ = 'water_quality_partition_latest'
+    
+    pond_id = db.Column(db.Integer, db.ForeignKey('pond.id'), primary_key=True)
+    month = db.Column(db.String(7), nullable=False)  # 读数所在的分区月份
+    reading_id = db.Column(db.Integer, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    reading = db.Column(db.Text, nullable=False)  # 读数各列的值（JSON）
+    
+    def __repr__(self):
+        return f'<WaterQualityPartitionLatest {self.pond_id} at {self.timestamp}>'
+
+class WaterQualityDayArchive(db.Model):
+    """按塘口、按天写出的列式归档文件登记表（文件位于 COLUMNAR_ARCHIVE_DIR）"""
+    __tablename__ = 'water_quality_day_archive'
+    
+    pond_id = db.Column(db.Integer, db.ForeignKey('pond.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    file_name = db.Column(db.String(100), nullable=False)
+    row_count = db.Column(db.Integer, nullable=False)  # 写出时的记录数，与天汇总计数不一致时说明有迟到数据
+    unrecoverable = db.Column(db.Boolean, nullable=True)  # 原始数据已删除、未写出文件（row_count 为当时的天汇总计数）
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f'<WaterQualityDayArchive {self.pond_id} {self.day}>'
+
 class FeedingRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    pond_id = db.Column(db.Integer, db.ForeignKey('pond.id'), nullable=False, index=True)
+    pond_id = db.Column(db.Integer, db.ForeignKey('pond.id'), nullable=False)
     amount = db.Column(db.Float, nullable=False)  # 投喂量（kg）
     time = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     notes = db.Column(db.Text, nullable=True)
     
+    __table_args__ = (
+        db.Index('ix_feeding_record_pond_id_time', 'pond_id', 'time'),
+    )
+    
     def __repr__(self):
         return f'<FeedingRecord {self.pond_id}: {self.amount}kg at {self.time}>'
 
 class Alert(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    pond_id = db.Column(db.Integer, db.ForeignKey('pond.id'), nullable=False, index=True)
+    pond_id = db.Column(db.Integer, db.ForeignKey('pond.id'), nullable=False)
     level = db.Column(db.String(20), nullable=False)  # info, warning, danger
     title = db.Column(db.String(100), nullable=False)
     message = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     status = db.Column(db.String(20), default='active')  # active, resolved
+    # 阈值预警引擎生成的预警记录触发指标、读数值和越过的阈值，其他预警为空
+    metric = db.Column(db.String(30), nullable=True)
+    value = db.Column(db.Float, nullable=True)
+    threshold = db.Column(db.Float, nullable=True)
+    # 指标仍超限时被手动解除的阈值预警：指标恢复正常前引擎不再为该指标新建预警
+    latched = db.Column(db.Boolean, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_alert_pond_id_timestamp', 'pond_id', 'timestamp'),
+        db.Index('ix_alert_status_timestamp', 'status', 'timestamp'),
+        # 每个塘口每项指标最多一条未解决的阈值预警（多个工作进程同时评估读数时由数据库保证）
+        db.Index('ux_alert_active_pond_id_metric', 'pond_id', 'metric', unique=True,
+                 sqlite_where=db.text("status = 'active' AND metric IS NOT NULL")),
+    )
     
     def __repr__(self):
         return f'<Alert {self.level}: {self.title}>'
 
+class AlertThreshold(db.Model):
+    """预警阈值规则：pond_id 和 species 都为空时为全局规则，按 塘口 > 品种 > 全局 的优先级取用"""
+    __tablename__ = 'alert_threshold'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    pond_id = db.Column(db.Integer, db.ForeignKey('pond.id'), nullable=True)
+    species = db.Column(db.String(50), nullable=True)  # 养殖品种，与 Pond.species 对应
+    metric = db.Column(db.String(30), nullable=False)  # 指标字段名
+    warning_min = db.Column(db.Float, nullable=True)  # 为空表示不检查该下限/上限
+    warning_max = db.Column(db.Float, nullable=True)
+    danger_min = db.Column(db.Float, nullable=True)
+    danger_max = db.Column(db.Float, nullable=True)
+    hysteresis = db.Column(db.Float, nullable=False, default=0.0)  # 回差：读数回到阈值内侧超过该值才解除预警
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    __table_args__ = (
+        db.Index('ix_alert_threshold_scope', 'pond_id', 'species', 'metric'),
+    )
+    
+    def __repr__(self):
+        return f'<AlertThreshold {self.metric} pond={self.pond_id} species={self.species}>'
+
 class FeedingDecision(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    pond_id = db.Column(db.Integer, db.ForeignKey('pond.id'), nullable=False, index=True)
+    pond_id = db.Column(db.Integer, db.ForeignKey('pond.id'), nullable=False)
     recommended_amount = db.Column(db.Float, nullable=False)  # 推荐投喂量（kg）
     reasoning = db.Column(db.Text, nullable=False)  # 决策依据
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     applied = db.Column(db.Boolean, default=False)  # 是否已应用
     # rejected = db.Column(db.Boolean, default=False)  # 是否已拒绝
     # rejected_at = db.Column(db.DateTime, nullable=True)  # 拒绝时间
+    # 后台预计算的每日投喂方案：方案日期、投喂时段序号和计划投喂时间，其他决策为空
+    plan_date = db.Column(db.Date, nullable=True)
+    slot = db.Column(db.Integer, nullable=True)
+    slot_time = db.Column(db.DateTime, nullable=True)
+    water_quality = db.Column(db.Text, nullable=True)  # 计算时使用的水质（JSON）
+    
+    __table_args__ = (
+        db.Index('ix_feeding_decision_pond_id_created_at', 'pond_id', 'created_at'),
+        # 每个塘口每天每个时段只有一条方案（其他决策的 plan_date 为空，不受唯一约束）
+        db.Index('ux_feeding_decision_plan_date_pond_id_slot', 'plan_date', 'pond_id', 'slot', unique=True),
+    )
+    
+    def __repr__(self):
+        return f'<FeedingDecision {self.pond_id}: {self.recommended_amount}kg>'
+
+
+class WeeklyReport(db.Model):
+    """预生成的周报（按自然周），内容为zlib压缩的JSON，结构见 services/reports.py"""
+    __tablename__ = 'weekly_report'
+    
+    week_start = db.Column(db.Date, primary_key=True)  # 周一
+    closed = db.Column(db.Boolean, nullable=False, default=False)  # 该周已结束，内容不再更新
+    payload = db.Column(db.LargeBinary, nullable=False)
+    built_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
     
     def __repr__(self):
-        return f'<FeedingDecision {self.pond_id}: {self.recommended_amount}kg>'
\ No newline at end of file
+        return f'<WeeklyReport {self.week_start} closed={self.closed}>'
@@ -2,6 +2,11 @@ from flask import Blueprint, render_template, jsonify, request, redirect, url_fo
 from datetime import datetime, timedelta
 import random
 from models import db, Alert, Pond, WaterQuality
+from services.water_quality import hourly_series, METRIC_FIELDS
+from services.alert_engine import (DEFAULT_THRESHOLDS, METRIC_LABELS, effective_thresholds, save_threshold,
+                                    threshold_to_dict, resolve_alert)
+from services.active_alerts import active_alert_index, alert_type
+from services.reports import recent_weeks
 
 alert_bp = Blueprint('alert', __name__, url_prefix='/alert')
 
@@ -12,143 +17,23 @@ def alerts():
     ponds = Pond.query.all()
     
     # 获取最近4周的时间范围用于周报选择
-    weeks = []
-    for i in range(4):
-        week_end = datetime.now().date() - timedelta(days=i*7)
-        week_start = week_end - timedelta(days=6)
-        weeks.append({
-            'id': i+1,
-            'start_date': week_start.strftime('%Y-%m-%d'),
-            'end_date': week_end.strftime('%Y-%m-%d')
-        })
+    weeks = recent_weeks()
     
     return render_template('alerts.html', ponds=ponds, weeks=weeks, selected_week_id=1)
 
-def generate_active_alerts():
-    """生成活跃预警数据 - 共享函数，确保统计API和活跃预警API使用相同数据"""
-    # 检查session中是否已有预警数据
-    if 'active_alerts' in session and session['active_alerts']:
-        print(f"DEBUG: Using cached alerts from session, count: {len(session['active_alerts'])}")
-        return session['active_alerts']
-    
-    # 模拟获取活跃预警数据
-    active_alerts = []
-    
-    # 获取所有塘口
-    ponds = Pond.query.all()
-    print(f"DEBUG: Found {len(ponds)} ponds")
-    
-    # 为每个塘口生成可能的预警
-    has_generated_alert = False
-    for pond in ponds:
-        # 随机决定是否有预警，但确保至少有一个预警用于测试
-        should_generate_alert = random.random() < 0.8 or not has_generated_alert
-        if should_generate_alert:
-            has_generated_alert = True
-            alert_types = ['dissolved_oxygen', 'temperature', 'ph', 'ammonia', 'turbidity', 'conductivity', 'water_level', 'cod', 'heavy_metals', 'residual_chlorine', 'total_phosphorus', 'total_nitrogen', 'coliform', 'algae', 'biotoxicity']
-            alert_type = random.choice(alert_types)
-            
-            # 根据预警类型设置内容
-            if alert_type == 'dissolved_oxygen':
-                title = '溶解氧过低'
-                message = f'{pond.name}溶解氧值为{random.uniform(2.0, 3.4):.1f}mg/L，低于安全阈值'
-                level = 'danger' if random.random() < 0.5 else 'warning'
-            elif alert_type == 'temperature':
-                title = '水温异常'
-                message = f'{pond.name}水温为{random.uniform(15, 18):.1f}°C，超出适宜范围'
-                level = 'warning'
-            elif alert_type == 'ph':
-                title = 'pH值异常'
-                message = f'{pond.name}pH值为{random.uniform(6.0, 6.5):.1f}，超出适宜范围'
-                level = 'warning'
-            elif alert_type == 'ammonia':
-                title = '氨氮过高'
-                message = f'{pond.name}氨氮浓度为{random.uniform(0.4, 0.8):.1f}mg/L，超过安全阈值'
-                level = 'danger' if random.random() < 0.6 else 'warning'
-            elif alert_type == 'turbidity':
-                title = '浊度异常'
-                message = f'{pond.name}浊度为{random.uniform(25, 40):.1f}NTU，超出正常范围'
-                level = 'warning'
-            elif alert_type == 'conductivity':
-                title = '电导率异常'
-                message = f'{pond.name}电导率为{random.uniform(800, 1200):.0f}μS/cm，超出正常范围'
-                level = 'warning'
-            elif alert_type == 'water_level':
-                title = '液位异常'
-                message = f'{pond.name}液位为{random.uniform(0.8, 1.2):.2f}m，低于安全水位'
-                level = 'danger'
-            elif alert_type == 'cod':
-                title = '化学需氧量过高'
-                message = f'{pond.name}化学需氧量为{random.uniform(30, 50):.1f}mg/L，超过安全阈值'
-                level = 'danger' if random.random() < 0.7 else 'warning'
-            elif alert_type == 'heavy_metals':
-                title = '重金属含量异常'
-                message = f'{pond.name}重金属含量为{random.uniform(0.1, 0.2):.3f}μg/L，超过安全阈值'
-                level = 'danger'
-            elif alert_type == 'residual_chlorine':
-                title = '余氯含量异常'
-                message = f'{pond.name}余氯含量为{random.uniform(0.5, 0.8):.2f}mg/L，超出正常范围'
-                level = 'warning'
-            elif alert_type == 'total_phosphorus':
-                title = '总磷含量过高'
-                message = f'{pond.name}总磷含量为{random.uniform(0.5, 1.0):.2f}mg/L，超过安全阈值'
-                level = 'warning'
-            elif alert_type == 'total_nitrogen':
-                title = '总氮含量过高'
-                message = f'{pond.name}总氮含量为{random.uniform(2.0, 3.0):.2f}mg/L，超过安全阈值'
-                level = 'warning'
-            elif alert_type == 'coliform':
-                title = '总大肠菌群超标'
-                message = f'{pond.name}总大肠菌群数为{random.uniform(1000, 2000):.0f}个/L，超过安全标准'
-                level = 'danger' if random.random() < 0.6 else 'warning'
-            elif alert_type == 'algae':
-                title = '藻类密度过高'
-                message = f'{pond.name}藻类密度为{random.uniform(10000, 20000):.0f}个/mL，可能引发水华'
-                level = 'warning'
-            else:  # biotoxicity
-                title = '生物毒性异常'
-                message = f'{pond.name}生物毒性为{random.uniform(20, 30):.1f}%，超过安全阈值'
-                level = 'danger'
-            
-            alert = {
-                'id': random.randint(1000, 9999),
-                'pond_id': pond.id,
-                'pond_name': pond.name,
-                'type': alert_type,
-                'title': title,
-                'message': message,
-                'level': level,
-                'status': 'active',  # 添加状态字段，默认为active
-                'timestamp': (datetime.now() - timedelta(minutes=random.randint(5, 60))).strftime('%Y-%m-%d %H:%M:%S'),
-                'value': random.uniform(2.0, 8.0),
-                'threshold': random.uniform(3.0, 5.0)
-            }
-            
-            active_alerts.append(alert)
-    
-    # 将数据存储到session中
-    session['active_alerts'] = active_alerts
-    print(f"DEBUG: Generated {len(active_alerts)} active alerts")
-    
-    return active_alerts
-
 @alert_bp.route('/api/active_alerts')
 def get_active_alerts():
     """获取活跃预警API"""
-    active_alerts = generate_active_alerts()
-    print(f"DEBUG: Returning {len(active_alerts)} alerts from get_active_alerts")
-    for alert in active_alerts:
-        print(f"DEBUG: Alert ID: {alert['id']}, Status: {alert['status']}")
-    return jsonify(active_alerts)
+    pond_id = request.args.get('pond_id', type=int)
+    if pond_id is not None:
+        return jsonify(active_alert_index.for_pond(pond_id))
+    return jsonify(active_alert_index.all())
 
 @alert_bp.route('/api/refresh_alerts')
 def refresh_alerts():
-    """刷新预警数据API - 清除缓存并重新生成数据"""
-    if 'active_alerts' in session:
-        session.pop('active_alerts')
-    active_alerts = generate_active_alerts()
-    session['active_alerts'] = active_alerts
-    return jsonify(active_alerts)
+    """刷新预警数据API - 重新从数据库加载活跃预警"""
+    active_alert_index.invalidate()
+    return jsonify(active_alert_index.all())
 
 @alert_bp.route('/api/alert_history')
 def get_alert_history():
@@ -248,32 +133,45 @@ def get_alert_detail(alert_id):
         'chart_data': {}
     }
     
-    # 生成历史数据（过去24小时）
+    # 如果预警记录存在，使用记录中的内容
+    alert_record = Alert.query.get(alert_id)
+    if alert_record:
+        alert['pond_id'] = alert_record.pond_id
+        alert['pond_name'] = alert_record.pond.name
+        alert['title'] = alert_record.title
+        alert['message'] = alert_record.message
+        alert['level'] = alert_record.level
+        alert['status'] = alert_record.status
+        if alert_record.timestamp:
+            alert['timestamp'] = alert_record.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        metric = alert_type(alert_record.metric, alert_record.title)
+        if metric in METRIC_LABELS:
+            alert['type'] = metric
+            alert['unit'] = METRIC_LABELS[metric][1]
+        if alert_record.value is not None:
+            alert['value'] = alert_record.value
+            alert['threshold'] = alert_record.threshold
+    
+    # 获取历史数据（过去24小时，逐小时聚合，没有数据的小时值为None）
     history = []
     labels = []
     values = []
     
-    for i in range(24):
-        timestamp = datetime.now() - timedelta(hours=23-i)
-        value = 3.5 + random.uniform(-0.5, 0.5)
-        
-        # 最后几个值呈下降趋势
-        if i >= 20:
-            value = 3.5 - (i - 19) * 0.1 + random.uniform(-0.1, 0.1)
-        
-        labels.append(timestamp.strftime('%H:%M'))
-        values.append(round(value, 2))
+    for point in hourly_series(alert['pond_id'], hours=24, metrics=[alert['type']]):
+        labels.append(point['timestamp'][11:16])
+        values.append(point[alert['type']])
         history.append({
-            'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            'value': round(value, 2)
+            'timestamp': point['timestamp'],
+            'value': point[alert['type']],
+            'has_data': point['has_data']
         })
     
     # 设置图表数据
     alert['chart_data'] = {
         'labels': labels,
         'data': values,
-        'datasetLabel': '溶解氧 (mg/L)',
-        'threshold': 3.5,
+        'datasetLabel': f"{METRIC_LABELS[alert['type']][0]} ({alert['unit']})" if alert['unit'] else METRIC_LABELS[alert['type']][0],
+        'threshold': alert['threshold'],
         'borderColor': '#007bff',
         'backgroundColor': 'rgba(0, 123, 255, 0.1)'
     }
@@ -312,30 +210,12 @@ def get_alert_detail(alert_id):
 @alert_bp.route('/api/mark_resolved/<int:alert_id>', methods=['POST'])
 def mark_alert_resolved(alert_id):
     """标记预警为已解决"""
-    # 直接从session获取活跃预警数据，不调用generate_active_alerts
-    print(f"DEBUG: Session before: {session}")
-    if 'active_alerts' not in session:
-        session['active_alerts'] = generate_active_alerts()
-    
-    active_alerts = session['active_alerts']
-    print(f"DEBUG: Active alerts from session: {len(active_alerts)}")
-    
-    # 查找并更新指定ID的预警状态
-    found_alert = False
-    for alert in active_alerts:
-        if alert['id'] == alert_id:
-            alert['status'] = 'resolved'
-            found_alert = True
-            print(f"DEBUG: Found and marked alert {alert_id} as resolved")
-            break
-    
-    if not found_alert:
-        print(f"DEBUG: Alert {alert_id} not found in active alerts")
-    
-    # 更新session中的数据
-    session['active_alerts'] = active_alerts
-    print(f"DEBUG: Updated session with {len(active_alerts)} alerts")
-    print(f"DEBUG: Session after: {session}")
+    alert = Alert.query.get(alert_id)
+    if alert is None:
+        return jsonify({'success': False, 'message': '预警不存在'}), 404
+
+    resolve_alert(alert)
+    db.session.commit()
     
     return jsonify({
         'success': True,
@@ -345,35 +225,82 @@ def mark_alert_resolved(alert_id):
 @alert_bp.route('/api/mark_all_resolved', methods=['POST'])
 def mark_all_alerts_resolved():
     """标记所有预警为已解决"""
-    # 直接从session获取活跃预警数据，不调用generate_active_alerts
-    if 'active_alerts' not in session:
-        session['active_alerts'] = generate_active_alerts()
-    
-    active_alerts = session['active_alerts']
-    
-    # 将所有预警状态更新为'resolved'
-    for alert in active_alerts:
-        alert['status'] = 'resolved'
-    
-    # 更新session中的数据
-    session['active_alerts'] = active_alerts
+    # 逐条修改而不是批量UPDATE，使响应缓存和活跃预警索引随提交失效
+    for alert in Alert.query.filter_by(status='active').all():
+        resolve_alert(alert)
+    db.session.commit()
     
     return jsonify({
         'success': True,
         'message': '所有预警已标记为已解决'
     })
 
+@alert_bp.route('/api/thresholds')
+def get_thresholds():
+    """获取预警阈值API（给出 pond_id 时返回该塘口实际生效的阈值）"""
+    pond_id = request.args.get('pond_id', type=int)
+    pond = None
+    if pond_id is not None:
+        pond = Pond.query.get(pond_id)
+        if pond is None:
+            return jsonify({'error': '塘口不存在'}), 404
+
+    thresholds = effective_thresholds(pond)
+    return jsonify({
+        metric: threshold_to_dict(rule) if rule is not None else None
+        for metric, rule in thresholds.items()
+    })
+
 @alert_bp.route('/api/update_threshold', methods=['POST'])
 def update_threshold():
-    """更新预警阈值"""
-    param_type = request.json.get('type')
-    value = request.json.get('value')
-    
-    # 在实际应用中，这里会更新数据库中的阈值设置
-    # 这里只是模拟返回成功响应
+    """更新预警阈值
+
+    参数：type（指标字段名）、value（单个数值或"下限,上限"）、可选的 level
+    （warning/danger，默认warning）、hysteresis（回差）以及 pond_id 或 species
+    （指定塘口或品种的规则，都不给出时修改全局规则）。
+    单个数值对溶解氧、液位等只有下限的指标设置下限，其余指标设置上限。
+    """
+    data = request.get_json(silent=True) or request.form
+    param_type = data.get('type') or data.get('metric')
+    value = data.get('value')
+    level = data.get('level') or 'warning'
+
+    if param_type not in METRIC_FIELDS:
+        return jsonify({'success': False, 'message': f'不支持的指标: {param_type}'}), 400
+    if level not in ('warning', 'danger'):
+        return jsonify({'success': False, 'message': f'不支持的预警级别: {level}'}), 400
+
+    try:
+        updates = {}
+        parts = [part.strip() for part in str(value if value is not None else '').split(',')]
+        if len(parts) == 2:
+            updates[f'{level}_min'] = float(parts[0]) if parts[0] else None
+            updates[f'{level}_max'] = float(parts[1]) if parts[1] else None
+        elif len(parts) == 1 and parts[0]:
+            lower_only = DEFAULT_THRESHOLDS[param_type][1] is None
+            updates[f'{level}_min' if lower_only else f'{level}_max'] = float(parts[0])
+        elif data.get('hysteresis') in (None, ''):
+            raise ValueError()
+        if data.get('hysteresis') not in (None, ''):
+            updates['hysteresis'] = float(data.get('hysteresis'))
+            if updates['hysteresis'] < 0:
+                raise ValueError()
+        pond_id = data.get('pond_id')
+        pond_id = int(pond_id) if pond_id not in (None, '') else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': '阈值格式错误'}), 400
+
+    species = data.get('species') or None
+    if pond_id is not None and species is not None:
+        return jsonify({'success': False, 'message': '塘口和品种只能指定一个'}), 400
+    if pond_id is not None and Pond.query.get(pond_id) is None:
+        return jsonify({'success': False, 'message': '塘口不存在'}), 404
+
+    rule = save_threshold(param_type, updates, pond_id=pond_id, species=species)
     return jsonify({
         'success': True,
-        'message': f'{param_type}阈值已更新为{value}'
+        'message': f'{param_type}阈值已更新为{value}',
+        'threshold': threshold_to_dict(rule)
     })
 
 @alert_bp.route('/api/update_notification_settings', methods=['POST'])
@@ -391,11 +318,8 @@ def update_notification_settings():
 @alert_bp.route('/api/statistics')
 def get_alert_statistics():
     """获取预警统计API"""
-    # 从session获取活跃预警数据，确保统计与实际显示数据一致
-    if 'active_alerts' not in session:
-        session['active_alerts'] = generate_active_alerts()
-    
-    active_alerts = session['active_alerts']
+    # 与活跃预警API读取同一索引，确保统计与实际显示数据一致
+    active_alerts = active_alert_index.all()
     
     # 计算统计数据
     active_count = len([alert for alert in active_alerts if alert['status'] != 'resolved'])
@@ -433,29 +357,17 @@ def get_alert_statistics():
 
 @alert_bp.route('/check_alerts', methods=['POST'])
 def check_alerts():
-    """检查新预警API"""
-    # 在实际应用中，这里应该查询数据库获取自上次检查以来的新预警
-    # 目前我们使用session来模拟新预警的产生
-    
-    # 获取当前活跃预警
-    current_alerts = generate_active_alerts()
-    
-    # 检查session中是否存储了上次的预警ID
-    last_alert_ids = session.get('last_alert_ids', set())
-    
-    # 找出新的预警（不在上次预警ID集合中的）
-    new_alerts = []
-    current_alert_ids = set()
-    
-    for alert in current_alerts:
-        current_alert_ids.add(alert['id'])
-        if alert['id'] not in last_alert_ids:
-            new_alerts.append(alert)
+    """检查新预警API
+
+    会话中只保存游标（客户端已见过的最大预警ID），返回ID大于游标的活跃预警。
+    """
+    cursor = session.get('alert_cursor')
+    new_alerts = active_alert_index.newer_than(cursor)
     
-    # 更新session中的预警ID集合
-    session['last_alert_ids'] = current_alert_ids
+    if new_alerts:
+        session['alert_cursor'] = max(alert['id'] for alert in new_alerts)
     
     return jsonify({
         'success': True,
         'new_alerts': new_alerts
-    })
\ No newline at end of file
+    })
@@ -1,10 +1,28 @@
-from flask import Blueprint, render_template, jsonify, request, Response, send_file
+from flask import Blueprint, render_template, jsonify, request, Response, send_file, stream_with_context
 from datetime import datetime, timedelta
+from urllib.parse import quote
 import random
 import csv
 import io
-import pandas as pd
+import json
+import tempfile
+import zipfile
 from models import db, Pond, WaterQuality
+from services.water_quality import latest_water_quality_by_pond, hourly_series, METRIC_FIELDS
+from services.downsample import downsample_indices, MAX_SERIES_POINTS, DOWNSAMPLE_METHODS
+from services.rollups import choose_granularity, rollup_points
+from services.columnar_archive import iter_pond_history, load_pond_history_columns
+from services.ingest import (
+    parse_ingest_payload, validate_readings, insert_readings, known_pond_ids,
+    IngestPayloadError, MAX_INGEST_BATCH
+)
+from services.ingest_queue import ingest_queue, IngestQueueFull
+from services.stream import event_broker, StreamFull, STREAM_EVENT_TYPES
+from services.cache import cached
+from services.conditional import conditional, water_quality_validators
+from services.export import (
+    export_column_labels, export_row, iter_export_water_qualities, export_pool, chunk_lines, chunk_blocks
+)
 
 data_bp = Blueprint('data', __name__)
 
@@ -19,9 +37,13 @@ def data():
     if not selected_pond_id and ponds:
         selected_pond_id = ponds[0].id
     
+    # 数据页面提供导出功能，在后台预先启动导出进程池
+    export_pool.start()
+    
     return render_template('data.html', ponds=ponds, selected_pond_id=selected_pond_id)
 
 @data_bp.route('/api/pond/<int:pond_id>')
+@cached(pond_arg='pond_id')
 def get_pond_data(pond_id):
     """获取塘口数据API"""
     # 获取塘口信息
@@ -48,50 +70,8 @@ def get_pond_data(pond_id):
             'timestamp': latest_water_quality.timestamp.strftime('%Y-%m-%d %H:%M:%S')
         }
     
-    # 获取24小时历史数据
-    now = datetime.now()
-    history_data = []
-    
-    for i in range(24):
-        time_point = now - timedelta(hours=i)
-        water_quality = WaterQuality.query.filter_by(pond_id=pond_id).filter(
-            WaterQuality.timestamp <= time_point,
-            WaterQuality.timestamp > time_point - timedelta(hours=1)
-        ).first()
-        
-        if water_quality:
-            history_data.append({
-                'timestamp': water_quality.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                'temperature': water_quality.temperature,
-                'dissolved_oxygen': water_quality.dissolved_oxygen,
-                'ph': water_quality.ph,
-                'ammonia': water_quality.ammonia
-            })
-        else:
-            # 如果没有数据，生成模拟数据
-            base_temp = 25 + random.uniform(-2, 2)
-            base_do = 6.0 + random.uniform(-1.5, 1.5)
-            base_ph = 7.5 + random.uniform(-0.5, 0.5)
-            base_ammonia = 0.2 + random.uniform(-0.1, 0.2)
-            
-            # 模拟夜间溶解氧下降
-            if time_point.hour >= 0 and time_point.hour <= 6:
-                base_do -= random.uniform(0.5, 1.5)
-            
-            # 模拟午后温度升高
-            if time_point.hour >= 12 and time_point.hour <= 15:
-                base_temp += random.uniform(1, 3)
-            
-            history_data.append({
-                'timestamp': time_point.strftime('%Y-%m-%d %H:%M:%S'),
-                'temperature': round(base_temp, 1),
-                'dissolved_oxygen': round(max(3.0, base_do), 1),
-                'ph': round(max(6.5, min(8.5, base_ph)), 1),
-                'ammonia': round(max(0, base_ammonia), 2)
-            })
-    
-    # 反转历史数据，使时间从早到晚
-    history_data.reverse()
+    # 获取24小时历史数据（逐小时聚合，没有数据的小时标记为 has_data=False）
+    history_data = hourly_series(pond_id, hours=24, metrics=['temperature', 'dissolved_oxygen', 'ph', 'ammonia'])
     
     return jsonify({
         'pond': {
@@ -105,14 +85,16 @@ def get_pond_data(pond_id):
     })
 
 @data_bp.route('/api/ponds')
+@cached()
 def get_ponds():
     """获取所有塘口API"""
     ponds = Pond.query.all()
     
     ponds_data = []
+    latest_snapshot = latest_water_quality_by_pond()
     for pond in ponds:
         # 获取最新水质数据
-        latest_water_quality = WaterQuality.query.filter_by(pond_id=pond.id).order_by(WaterQuality.timestamp.desc()).first()
+        latest_water_quality = latest_snapshot.get(pond.id)
         
         if latest_water_quality:
             pond_data = {
@@ -145,11 +127,26 @@ def get_ponds():
     return jsonify(ponds_data)
 
 @data_bp.route('/api/water_quality/<int:pond_id>')
+@conditional(lambda pond_id: water_quality_validators([pond_id], _series_window_start()))
 def get_water_quality_data(pond_id):
     """获取塘口水质趋势数据API"""
     # 获取请求参数
     days = request.args.get('days', 1, type=int)
     compare = request.args.get('compare', 0, type=int)  # 是否需要昨日对比数据
+    points = request.args.get('points', type=int)  # 最多返回的点数（所有指标共享）
+    resolution = request.args.get('resolution', type=int)  # 每个点代表的秒数
+    method = request.args.get('method', 'lttb')  # 降采样算法：lttb 或 minmax
+    response_format = request.args.get('format', 'rows')  # rows：逐行对象；columnar：按列数组
+    fields = parse_metric_fields(request.args.get('fields'))  # 只返回（并只查询）指定指标
+    
+    if method not in DOWNSAMPLE_METHODS:
+        return jsonify({'error': '不支持的降采样算法'}), 400
+    if response_format not in ('rows', 'columnar'):
+        return jsonify({'error': '不支持的响应格式'}), 400
+    if fields is None:
+        return jsonify({'error': '不支持的指标字段'}), 400
+    
+    max_points = _series_max_points(days, points, resolution)
     
     # 获取塘口信息
     pond = Pond.query.get_or_404(pond_id)
@@ -158,33 +155,18 @@ def get_water_quality_data(pond_id):
     now = datetime.now()
     start_time = now - timedelta(days=days)
     
+    # 超过7天或请求的分辨率不低于1小时时读取小时/天汇总，否则读取原始记录
+    granularity = None
+    if days > 7 or (resolution and resolution >= 3600):
+        granularity = choose_granularity(resolution, max_points, start_time, now)
+    
     # 获取当前数据
     current_data = []
-    water_qualities = WaterQuality.query.filter_by(pond_id=pond_id).filter(
-        WaterQuality.timestamp >= start_time
-    ).order_by(WaterQuality.timestamp.asc()).all()
-    
-    if water_qualities:
-        for wq in water_qualities:
-            current_data.append({
-                'timestamp': wq.timestamp.isoformat(),
-                'temperature': wq.temperature,
-                'turbidity': wq.turbidity,
-                'conductivity': wq.conductivity,
-                'water_level': wq.water_level,
-                'dissolved_oxygen': wq.dissolved_oxygen,
-                'ph': wq.ph,
-                'cod': wq.cod,
-                'ammonia': wq.ammonia,
-                'heavy_metals': wq.heavy_metals,
-                'residual_chlorine': wq.residual_chlorine,
-                'total_phosphorus': wq.total_phosphorus,
-                'total_nitrogen': wq.total_nitrogen,
-                'coliform': wq.coliform,
-                'algae': wq.algae,
-                'biotoxicity': wq.biotoxicity
-            })
-    else:
+    current_data, raw_count, returned_count = load_water_quality_data(
+        pond_id, start_time, None, fields, granularity, max_points, method, response_format
+    )
+    
+    if not returned_count:
         # 如果没有数据，生成模拟数据
         if days <= 7:
             # 7天及以内，按小时生成数据
@@ -285,27 +267,21 @@ def get_water_quality_data(pond_id):
                     'biotoxicity': round(random.uniform(5, 20), 1)
                 })
     
+        # 模拟数据同样按指标投影并转换为请求的格式
+        current_data = project_water_quality_dicts(current_data, fields, response_format)
+    
     # 获取昨日数据（用于对比）
     yesterday_data = []
+    yesterday_fields = [field for field in ['temperature', 'dissolved_oxygen', 'ph', 'ammonia'] if field in fields]
     if compare == 1:  # 只有在需要对比时才提供昨日数据
         yesterday_start = start_time - timedelta(days=1)
         yesterday_end = now - timedelta(days=1)
         
-        yesterday_water_qualities = WaterQuality.query.filter_by(pond_id=pond_id).filter(
-            WaterQuality.timestamp >= yesterday_start,
-            WaterQuality.timestamp <= yesterday_end
-        ).order_by(WaterQuality.timestamp.asc()).all()
+        yesterday_data, _, yesterday_count = load_water_quality_data(
+            pond_id, yesterday_start, yesterday_end, yesterday_fields, granularity, max_points, method, response_format
+        )
         
-        if yesterday_water_qualities:
-            for wq in yesterday_water_qualities:
-                yesterday_data.append({
-                    'timestamp': wq.timestamp.isoformat(),
-                    'temperature': wq.temperature,
-                    'dissolved_oxygen': wq.dissolved_oxygen,
-                    'ph': wq.ph,
-                    'ammonia': wq.ammonia
-                })
-        else:
+        if not yesterday_count:
             # 生成模拟数据
             if days <= 7:
                 # 7天及以内，按小时生成数据
@@ -351,6 +327,9 @@ def get_water_quality_data(pond_id):
                         'ammonia': round(max(0, base_ammonia), 2)
                     })
     
+            # 模拟数据同样按指标投影并转换为请求的格式
+            yesterday_data = project_water_quality_dicts(yesterday_data, yesterday_fields, response_format)
+    
     # 生成事件数据
     events = []
     if days <= 7:  # 只在查看7天及以内数据时提供事件
@@ -383,9 +362,271 @@ def get_water_quality_data(pond_id):
         },
         'current_data': current_data,
         'yesterday_data': yesterday_data,
-        'events': events
+        'events': events,
+        'sampling': {
+            'source': granularity or 'raw',
+            'method': method,
+            'max_points': max_points,
+            'raw_count': raw_count,
+            'returned_count': returned_count
+        }
     })
 
+def load_water_quality_series(pond_id, start_time, end_time, fields, granularity=None):
+    """读取塘口时间范围内的 (timestamp, 指标...) 序列
+
+    granularity 为 hour/day 时读取对应汇总表的桶均值，为 None 时读取原始记录
+    （已归档的天读列式文件，其余读SQLite）；end_time 为 None 时不限制结束时间。
+    """
+    if granularity:
+        return rollup_points(pond_id, start_time, end_time, granularity, fields)
+    
+    return list(iter_pond_history(pond_id, ['timestamp'] + fields, start_time, end_time))
+
+def load_water_quality_data(pond_id, start_time, end_time, fields, granularity, max_points, method, response_format):
+    """读取、降采样并转换塘口的水质序列，返回 (数据, 原始点数, 返回点数)，没有数据时数据为空列表
+
+    按列输出原始记录时直接按列读取（归档天整列转换），不经过逐行的记录元组。
+    """
+    if response_format == 'columnar' and not granularity:
+        columns = load_pond_history_columns(pond_id, ['timestamp'] + fields, start_time, end_time)
+        raw_count = len(columns['timestamp'])
+        columns = _downsample_water_quality_columns(columns, fields, max_points, method)
+        if not columns['timestamp']:
+            return [], raw_count, 0
+        data = {'timestamps': columns['timestamp']}
+        for field in fields:
+            data[field] = columns[field]
+        return data, raw_count, len(columns['timestamp'])
+    
+    water_qualities = load_water_quality_series(pond_id, start_time, end_time, fields, granularity)
+    raw_count = len(water_qualities)
+    water_qualities = _downsample_water_qualities(water_qualities, fields, max_points, method)
+    if not water_qualities:
+        return [], raw_count, 0
+    return serialize_water_quality_rows(water_qualities, fields, response_format), raw_count, len(water_qualities)
+
+def parse_metric_fields(fields_param):
+    """解析 fields 参数（逗号分隔的指标名），未指定时返回全部指标，包含未知指标时返回None"""
+    if not fields_param:
+        return list(METRIC_FIELDS)
+    
+    fields = [field.strip() for field in fields_param.split(',') if field.strip()]
+    if not fields or any(field not in METRIC_FIELDS for field in fields):
+        return None
+    return fields
+
+def serialize_water_quality_rows(rows, fields, response_format='rows'):
+    """将 (timestamp, 指标...) 查询结果转换为逐行对象列表或按列数组
+
+    时间保持为datetime，由应用的JSON序列化层统一输出为ISO 8601字符串。
+    """
+    if response_format == 'columnar':
+        columns = list(zip(*rows)) if rows else [()] * (len(fields) + 1)
+        data = {'timestamps': list(columns[0])}
+        for index, field in enumerate(fields, start=1):
+            data[field] = list(columns[index])
+        return data
+    
+    data = []
+    for row in rows:
+        item = {'timestamp': row[0]}
+        for index, field in enumerate(fields, start=1):
+            item[field] = row[index]
+        data.append(item)
+    return data
+
+def project_water_quality_dicts(items, fields, response_format='rows'):
+    """对已是字典形式的水质数据（如模拟数据）做指标投影和格式转换"""
+    if response_format == 'columnar':
+        data = {'timestamps': [item['timestamp'] for item in items]}
+        for field in fields:
+            data[field] = [item.get(field) for item in items]
+        return data
+    
+    return [
+        dict({'timestamp': item['timestamp']}, **{field: item.get(field) for field in fields})
+        for item in items
+    ]
+
+def _series_max_points(days, points, resolution):
+    """计算返回的点数上限（所有指标共享），无论时间范围多长都不超过 MAX_SERIES_POINTS"""
+    max_points = MAX_SERIES_POINTS
+    if points:
+        max_points = min(points, MAX_SERIES_POINTS)
+    elif resolution:
+        max_points = min(int(days * 86400 / resolution), MAX_SERIES_POINTS)
+    return max(max_points, 3)
+
+def _series_window_start():
+    """趋势数据查询窗口的起点，按每个点代表的秒数向下取整
+
+    窗口随当前时间滑动，取整后同一分辨率内的重复请求得到相同的验证器，
+    窗口前移一个点的距离后验证器随之变化。
+    """
+    days = request.args.get('days', 1, type=int)
+    points = request.args.get('points', type=int)
+    resolution = request.args.get('resolution', type=int)
+    step = max(int(days * 86400 / _series_max_points(days, points, resolution)), 1)
+
+    start = int((datetime.now() - timedelta(days=days)).timestamp())
+    return datetime.fromtimestamp(start - start % step)
+
+def _downsample_water_qualities(water_qualities, metrics, max_points, method):
+    """按指标分别降采样水质记录，返回保留下来的记录（保持时间顺序）"""
+    if len(water_qualities) <= max_points:
+        return water_qualities
+    
+    xs = [wq[0].timestamp() for wq in water_qualities]
+    series = {
+        metric: [wq[index] for wq in water_qualities]
+        for index, metric in enumerate(metrics, start=1)
+    }
+    indices = downsample_indices(xs, series, max_points, method)
+    return [water_qualities[i] for i in indices]
+
+def _downsample_water_quality_columns(columns, metrics, max_points, method):
+    """按列数据的降采样，与 _downsample_water_qualities 选取相同的点"""
+    if len(columns['timestamp']) <= max_points:
+        return columns
+    
+    xs = [timestamp.timestamp() for timestamp in columns['timestamp']]
+    indices = downsample_indices(xs, {metric: columns[metric] for metric in metrics}, max_points, method)
+    return {column: [values[i] for i in indices] for column, values in columns.items()}
+
+# 流式导出时每批从数据库游标读取的记录数
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = ('csv', 'ndjson', 'json', 'columnar', 'excel', 'zip')
+
+def attachment_headers(download_name):
+    """生成附件下载响应头，非ASCII文件名按RFC 5987编码"""
+    ascii_name = download_name.encode('ascii', 'ignore').decode('ascii') or 'export'
+    return {
+        'Content-Disposition': f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(download_name)}"
+    }
+
+def csv_header(columns):
+    """CSV文件开头：BOM和表头（utf-8-sig，便于Excel正确打开）"""
+    buffer = io.StringIO()
+    csv.DictWriter(buffer, fieldnames=columns).writeheader()
+    return '\ufeff' + buffer.getvalue()
+
+def stream_csv(rows, columns):
+    """逐批生成CSV内容，首块包含BOM和表头"""
+    yield csv_header(columns)
+    
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def stream_ndjson(rows):
+    """逐批生成NDJSON内容，每行一个JSON对象"""
+    batch = []
+    for row in rows:
+        batch.append(json.dumps(row, ensure_ascii=False))
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield '\n'.join(batch) + '\n'
+            batch = []
+    
+    if batch:
+        yield '\n'.join(batch) + '\n'
+
+def stream_json_export(rows, header, time_range):
+    """逐批生成JSON导出文件，记录总数写在数据之后的 export_info 中
+
+    rows 为已序列化的JSON对象字符串（多塘口并行导出时直接取自NDJSON分块）。
+    """
+    yield '{\n'
+    for key, value in header.items():
+        yield f'  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},\n'
+    yield '  "water_quality_data": ['
+    
+    total_records = 0
+    batch = []
+    for row in rows:
+        batch.append(('\n    ' if total_records == 0 else ',\n    ') + row)
+        total_records += 1
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield ''.join(batch)
+            batch = []
+    
+    if batch:
+        yield ''.join(batch)
+    
+    export_info = {'time_range': time_range, 'total_records': total_records}
+    yield ('\n  ' if total_records else '') + '],\n'
+    yield f'  "export_info": {json.dumps(export_info, ensure_ascii=False)}\n}}\n'
+
+def excel_sheet_title(name, used_titles):
+    """生成合法且不重复的工作表名称（Excel限制31个字符且不能包含 []:*?/\\）"""
+    title = ''.join('_' if char in '[]:*?/\\' else char for char in name)[:31] or '塘口'
+    candidate = title
+    suffix = 2
+    while candidate in used_titles:
+        candidate = f'{title[:31 - len(str(suffix)) - 1]}_{suffix}'
+        suffix += 1
+    used_titles.add(candidate)
+    return candidate
+
+def write_excel_export(pond_rows, fields):
+    """以openpyxl只写模式生成Excel导出文件，返回已定位到开头的临时文件
+
+    pond_rows 为 (塘口, 导出行迭代器)，每个塘口一个工作表。只写工作簿逐行落盘，
+    数据从数据库游标或并行导出的分块文件逐行读取，内存占用与导出范围无关。
+    """
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    columns = export_column_labels(fields)
+    used_titles = set()
+    
+    for pond, rows in pond_rows:
+        sheet = workbook.create_sheet(title=excel_sheet_title(pond.name, used_titles))
+        sheet.append(columns)
+        for row in rows:
+            sheet.append([row[column] for column in columns])
+    
+    # 没有塘口时也生成一个空工作表，保证文件可以正常打开
+    if not used_titles:
+        workbook.create_sheet(title='水质数据').append(columns)
+    
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+def write_zip_export(chunks):
+    """把每个塘口的CSV分块文件写入ZIP压缩包（文件名规则与Excel工作表名称相同），返回已定位到开头的临时文件"""
+    output = tempfile.TemporaryFile()
+    used_names = set()
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for pond, path, _ in chunks:
+            archive.write(path, arcname=f'{excel_sheet_title(pond.name, used_names)}.csv')
+    output.seek(0)
+    return output
+
+def stream_chunk_files(chunks, prefix=''):
+    """先输出 prefix，再按塘口顺序拼接各分块文件的内容"""
+    if prefix:
+        yield prefix
+    for _, path, _ in chunks:
+        yield from chunk_blocks(path)
+
+def iter_chunk_lines(chunks):
+    for _, path, _ in chunks:
+        yield from chunk_lines(path)
+
 @data_bp.route('/export')
 def export_data():
     """导出水质数据API"""
@@ -393,366 +634,161 @@ def export_data():
     export_format = request.args.get('format', 'csv')
     days = request.args.get('days', 7, type=int)
     pond_id = request.args.get('pond_id', type=int)
+    fields = parse_metric_fields(request.args.get('fields'))  # 只导出（并只查询）指定指标
+    resolution = request.args.get('resolution', type=int)  # 每行代表的秒数，不低于1小时时导出汇总均值
+    
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': '不支持的导出格式'}), 400
+    if fields is None:
+        return jsonify({'error': '不支持的指标字段'}), 400
+    if resolution is not None and resolution <= 0:
+        return jsonify({'error': '分辨率必须为正数'}), 400
+    granularity = choose_granularity(resolution) if resolution else None
     
     # 计算时间范围
     now = datetime.now()
     start_time = now - timedelta(days=days)
+    time_range = f"{start_time.strftime('%Y-%m-%d')} 至 {now.strftime('%Y-%m-%d')}"
     
-    # 查询数据
+    # 确定导出的塘口
     if pond_id:
         # 导出特定塘口的数据
         pond = Pond.query.get_or_404(pond_id)
-        water_qualities = WaterQuality.query.filter_by(pond_id=pond_id).filter(
-            WaterQuality.timestamp >= start_time
-        ).order_by(WaterQuality.timestamp.asc()).all()
-        
-        # 如果没有真实数据，生成模拟数据
-        if not water_qualities:
-            water_qualities = []
-            if days <= 7:
-                # 7天及以内，按小时生成数据
-                hours = days * 24
-                for i in range(hours):
-                    time_point = now - timedelta(hours=hours-i)
-                    
-                    # 根据塘口类型模拟不同的基础数据
-                    if pond.species == "南美白对虾":
-                        base_temp = 28 + random.uniform(-2, 2)
-                        base_do = 6.5 + random.uniform(-1.0, 1.0)
-                        base_ph = 8.0 + random.uniform(-0.3, 0.3)
-                        base_ammonia = 0.15 + random.uniform(-0.05, 0.1)
-                    else:  # 草鱼
-                        base_temp = 24 + random.uniform(-2, 2)
-                        base_do = 7.0 + random.uniform(-1.0, 1.5)
-                        base_ph = 7.5 + random.uniform(-0.5, 0.5)
-                        base_ammonia = 0.2 + random.uniform(-0.1, 0.2)
-                    
-                    # 模拟夜间溶解氧下降
-                    if time_point.hour >= 0 and time_point.hour <= 6:
-                        base_do -= random.uniform(0.8, 1.8)
-                    
-                    # 模拟午后温度升高
-                    if time_point.hour >= 12 and time_point.hour <= 15:
-                        base_temp += random.uniform(1, 3)
-                    
-                    # 模拟投喂后氨氮升高
-                    if time_point.hour in [9, 10] or time_point.hour in [18, 19]:
-                        base_ammonia += random.uniform(0.1, 0.3)
-                    
-                    # 创建模拟数据对象
-                    wq = type('WaterQuality', (), {
-                        'timestamp': time_point,
-                        'temperature': round(base_temp, 1),
-                        'turbidity': round(random.uniform(5, 25), 1),
-                        'conductivity': round(random.uniform(300, 800), 0),
-                        'water_level': round(random.uniform(1.5, 2.5), 2),
-                        'dissolved_oxygen': round(max(3.0, base_do), 1),
-                        'ph': round(max(6.5, min(9.0, base_ph)), 1),
-                        'cod': round(random.uniform(10, 30), 1),
-                        'ammonia': round(max(0, base_ammonia), 2),
-                        'heavy_metals': round(random.uniform(0.01, 0.1), 3),
-                        'residual_chlorine': round(random.uniform(0.1, 0.5), 2),
-                        'total_phosphorus': round(random.uniform(0.1, 0.5), 2),
-                        'total_nitrogen': round(random.uniform(0.5, 2.0), 2),
-                        'coliform': round(random.uniform(100, 1000), 0),
-                        'algae': round(random.uniform(1000, 10000), 0),
-                        'biotoxicity': round(random.uniform(5, 20), 1)
-                    })()
-                    water_qualities.append(wq)
-            else:
-                # 超过7天，按天生成数据（每天取中午12点的数据）
-                for i in range(days):
-                    time_point = now - timedelta(days=days-i)
-                    time_point = time_point.replace(hour=12, minute=0, second=0, microsecond=0)
-                    
-                    # 根据塘口类型模拟不同的基础数据
-                    if pond.species == "南美白对虾":
-                        base_temp = 28 + random.uniform(-2, 2)
-                        base_do = 6.5 + random.uniform(-1.0, 1.0)
-                        base_ph = 8.0 + random.uniform(-0.3, 0.3)
-                        base_ammonia = 0.15 + random.uniform(-0.05, 0.1)
-                    else:  # 草鱼
-                        base_temp = 24 + random.uniform(-2, 2)
-                        base_do = 7.0 + random.uniform(-1.0, 1.5)
-                        base_ph = 7.5 + random.uniform(-0.5, 0.5)
-                        base_ammonia = 0.2 + random.uniform(-0.1, 0.2)
-                    
-                    # 模拟一些天的水质异常情况
-                    if random.random() < 0.05:
-                        if random.random() < 0.5:
-                            base_do -= random.uniform(1.5, 2.5)
-                        else:
-                            base_ph += random.uniform(0.8, 1.2)
-                    
-                    # 创建模拟数据对象
-                    wq = type('WaterQuality', (), {
-                        'timestamp': time_point,
-                        'temperature': round(base_temp, 1),
-                        'turbidity': round(random.uniform(5, 25), 1),
-                        'conductivity': round(random.uniform(300, 800), 0),
-                        'water_level': round(random.uniform(1.5, 2.5), 2),
-                        'dissolved_oxygen': round(max(3.0, base_do), 1),
-                        'ph': round(max(6.5, min(9.0, base_ph)), 1),
-                        'cod': round(random.uniform(10, 30), 1),
-                        'ammonia': round(max(0, base_ammonia), 2),
-                        'heavy_metals': round(random.uniform(0.01, 0.1), 3),
-                        'residual_chlorine': round(random.uniform(0.1, 0.5), 2),
-                        'total_phosphorus': round(random.uniform(0.1, 0.5), 2),
-                        'total_nitrogen': round(random.uniform(0.5, 2.0), 2),
-                        'coliform': round(random.uniform(100, 1000), 0),
-                        'algae': round(random.uniform(1000, 10000), 0),
-                        'biotoxicity': round(random.uniform(5, 20), 1)
-                    })()
-                    water_qualities.append(wq)
-        
-        # 准备数据
-        data = []
-        for wq in water_qualities:
-            data.append({
-                '塘口名称': pond.name,
-                '养殖品种': pond.species,
-                '记录时间': wq.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                '水温(°C)': wq.temperature,
-                '浊度(NTU)': wq.turbidity,
-                '电导率(μS/cm)': wq.conductivity,
-                '水位(m)': wq.water_level,
-                '溶解氧(mg/L)': wq.dissolved_oxygen,
-                'pH值': wq.ph,
-                '化学需氧量(mg/L)': wq.cod,
-                '氨氮(mg/L)': wq.ammonia,
-                '重金属(mg/L)': wq.heavy_metals,
-                '余氯(mg/L)': wq.residual_chlorine,
-                '总磷(mg/L)': wq.total_phosphorus,
-                '总氮(mg/L)': wq.total_nitrogen,
-                '大肠杆菌群(CFU/L)': wq.coliform,
-                '藻类密度(个/L)': wq.algae,
-                '生物毒性(%)': wq.biotoxicity
-            })
-        
+        ponds = [pond]
         filename = f"{pond.name}_水质数据_{start_time.strftime('%Y%m%d')}_{now.strftime('%Y%m%d')}"
     else:
         # 导出所有塘口的数据
         ponds = Pond.query.all()
-        data = []
-        
-        for pond in ponds:
-            pond_water_qualities = WaterQuality.query.filter_by(pond_id=pond.id).filter(
-                WaterQuality.timestamp >= start_time
-            ).order_by(WaterQuality.timestamp.asc()).all()
-            
-            # 如果没有真实数据，生成模拟数据
-            if not pond_water_qualities:
-                pond_water_qualities = []
-                if days <= 7:
-                    # 7天及以内，按小时生成数据
-                    hours = days * 24
-                    for i in range(hours):
-                        time_point = now - timedelta(hours=hours-i)
-                        
-                        # 根据塘口类型模拟不同的基础数据
-                        if pond.species == "南美白对虾":
-                            base_temp = 28 + random.uniform(-2, 2)
-                            base_do = 6.5 + random.uniform(-1.0, 1.0)
-                            base_ph = 8.0 + random.uniform(-0.3, 0.3)
-                            base_ammonia = 0.15 + random.uniform(-0.05, 0.1)
-                        else:  # 草鱼
-                            base_temp = 24 + random.uniform(-2, 2)
-                            base_do = 7.0 + random.uniform(-1.0, 1.5)
-                            base_ph = 7.5 + random.uniform(-0.5, 0.5)
-                            base_ammonia = 0.2 + random.uniform(-0.1, 0.2)
-                        
-                        # 模拟夜间溶解氧下降
-                        if time_point.hour >= 0 and time_point.hour <= 6:
-                            base_do -= random.uniform(0.8, 1.8)
-                        
-                        # 模拟午后温度升高
-                        if time_point.hour >= 12 and time_point.hour <= 15:
-                            base_temp += random.uniform(1, 3)
-                        
-                        # 模拟投喂后氨氮升高
-                        if time_point.hour in [9, 10] or time_point.hour in [18, 19]:
-                            base_ammonia += random.uniform(0.1, 0.3)
-                        
-                        # 创建模拟数据对象
-                        wq = type('WaterQuality', (), {
-                            'timestamp': time_point,
-                            'temperature': round(base_temp, 1),
-                            'turbidity': round(random.uniform(5, 25), 1),
-                            'conductivity': round(random.uniform(300, 800), 0),
-                            'water_level': round(random.uniform(1.5, 2.5), 2),
-                            'dissolved_oxygen': round(max(3.0, base_do), 1),
-                            'ph': round(max(6.5, min(9.0, base_ph)), 1),
-                            'cod': round(random.uniform(10, 30), 1),
-                            'ammonia': round(max(0, base_ammonia), 2),
-                            'heavy_metals': round(random.uniform(0.01, 0.1), 3),
-                            'residual_chlorine': round(random.uniform(0.1, 0.5), 2),
-                            'total_phosphorus': round(random.uniform(0.1, 0.5), 2),
-                            'total_nitrogen': round(random.uniform(0.5, 2.0), 2),
-                            'coliform': round(random.uniform(100, 1000), 0),
-                            'algae': round(random.uniform(1000, 10000), 0),
-                            'biotoxicity': round(random.uniform(5, 20), 1)
-                        })()
-                        pond_water_qualities.append(wq)
-                else:
-                    # 超过7天，按天生成数据（每天取中午12点的数据）
-                    for i in range(days):
-                        time_point = now - timedelta(days=days-i)
-                        time_point = time_point.replace(hour=12, minute=0, second=0, microsecond=0)
-                        
-                        # 根据塘口类型模拟不同的基础数据
-                        if pond.species == "南美白对虾":
-                            base_temp = 28 + random.uniform(-2, 2)
-                            base_do = 6.5 + random.uniform(-1.0, 1.0)
-                            base_ph = 8.0 + random.uniform(-0.3, 0.3)
-                            base_ammonia = 0.15 + random.uniform(-0.05, 0.1)
-                        else:  # 草鱼
-                            base_temp = 24 + random.uniform(-2, 2)
-                            base_do = 7.0 + random.uniform(-1.0, 1.5)
-                            base_ph = 7.5 + random.uniform(-0.5, 0.5)
-                            base_ammonia = 0.2 + random.uniform(-0.1, 0.2)
-                        
-                        # 模拟一些天的水质异常情况
-                        if random.random() < 0.05:
-                            if random.random() < 0.5:
-                                base_do -= random.uniform(1.5, 2.5)
-                            else:
-                                base_ph += random.uniform(0.8, 1.2)
-                        
-                        # 创建模拟数据对象
-                        wq = type('WaterQuality', (), {
-                            'timestamp': time_point,
-                            'temperature': round(base_temp, 1),
-                            'turbidity': round(random.uniform(5, 25), 1),
-                            'conductivity': round(random.uniform(300, 800), 0),
-                            'water_level': round(random.uniform(1.5, 2.5), 2),
-                            'dissolved_oxygen': round(max(3.0, base_do), 1),
-                            'ph': round(max(6.5, min(9.0, base_ph)), 1),
-                            'cod': round(random.uniform(10, 30), 1),
-                            'ammonia': round(max(0, base_ammonia), 2),
-                            'heavy_metals': round(random.uniform(0.01, 0.1), 3),
-                            'residual_chlorine': round(random.uniform(0.1, 0.5), 2),
-                            'total_phosphorus': round(random.uniform(0.1, 0.5), 2),
-                            'total_nitrogen': round(random.uniform(0.5, 2.0), 2),
-                            'coliform': round(random.uniform(100, 1000), 0),
-                            'algae': round(random.uniform(1000, 10000), 0),
-                            'biotoxicity': round(random.uniform(5, 20), 1)
-                        })()
-                        pond_water_qualities.append(wq)
-            
-            for wq in pond_water_qualities:
-                data.append({
-                    '塘口名称': pond.name,
-                    '养殖品种': pond.species,
-                    '记录时间': wq.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                    '水温(°C)': wq.temperature,
-                    '浊度(NTU)': wq.turbidity,
-                    '电导率(μS/cm)': wq.conductivity,
-                    '水位(m)': wq.water_level,
-                    '溶解氧(mg/L)': wq.dissolved_oxygen,
-                    'pH值': wq.ph,
-                    '化学需氧量(mg/L)': wq.cod,
-                    '氨氮(mg/L)': wq.ammonia,
-                    '重金属(mg/L)': wq.heavy_metals,
-                    '余氯(mg/L)': wq.residual_chlorine,
-                    '总磷(mg/L)': wq.total_phosphorus,
-                    '总氮(mg/L)': wq.total_nitrogen,
-                    '大肠杆菌群(CFU/L)': wq.coliform,
-                    '藻类密度(个/L)': wq.algae,
-                    '生物毒性(%)': wq.biotoxicity
-                })
-        
         filename = f"所有塘口_水质数据_{start_time.strftime('%Y%m%d')}_{now.strftime('%Y%m%d')}"
     
+    def iter_rows():
+        for pond in ponds:
+            for wq in iter_export_water_qualities(pond, fields, start_time, now, days, granularity):
+                yield export_row(pond, wq, fields)
+    
+    # 导出多个塘口时按塘口分片，由导出进程池并行生成各塘口的分块文件，再按塘口顺序合并
+    parallel = not pond_id and export_format != 'columnar' and export_pool.parallel(len(ponds))
+    
+    def iter_chunks(chunk_format):
+        return export_pool.chunks(ponds, fields, start_time, now, days, granularity, chunk_format)
+    
     # 根据格式导出数据
     if export_format == 'csv':
-        # 创建CSV文件
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=data[0].keys() if data else [])
-        writer.writeheader()
-        writer.writerows(data)
-        
-        # 将StringIO转换为BytesIO以支持二进制下载
-        csv_bytes = io.BytesIO()
-        csv_bytes.write(output.getvalue().encode('utf-8-sig'))  # 使用utf-8-sig以支持Excel正确打开CSV
-        csv_bytes.seek(0)
-        
-        # 创建响应
-        return send_file(
-            csv_bytes,
-            as_attachment=True,
-            download_name=f'{filename}.csv',
-            mimetype='text/csv'
+        # 流式输出CSV，内存占用与导出范围无关
+        columns = export_column_labels(fields)
+        if parallel:
+            content = stream_chunk_files(iter_chunks('csv'), csv_header(columns))
+        else:
+            content = stream_csv(iter_rows(), columns)
+        return Response(
+            stream_with_context(content),
+            mimetype='text/csv',
+            headers=attachment_headers(f'{filename}.csv')
         )
     
-    elif export_format == 'excel':
-        # 创建Excel文件
-        df = pd.DataFrame(data)
-        
-        # 创建内存中的Excel文件
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='水质数据')
-        
-        output.seek(0)
-        
-        # 创建响应
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=f'{filename}.xlsx',
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    elif export_format == 'ndjson':
+        # 流式输出NDJSON，每行一条记录
+        content = stream_chunk_files(iter_chunks('ndjson')) if parallel else stream_ndjson(iter_rows())
+        return Response(
+            stream_with_context(content),
+            mimetype='application/x-ndjson',
+            headers=attachment_headers(f'{filename}.ndjson')
         )
     
     elif export_format == 'json':
-        # 创建JSON数据
-        import json
-        
         # 如果是单个塘口，添加塘口信息
+        header = {}
         if pond_id:
-            json_data = {
-                'pond_info': {
-                    'name': pond.name,
-                    'species': pond.species,
-                    'area': pond.area
-                },
-                'export_info': {
-                    'time_range': f"{start_time.strftime('%Y-%m-%d')} 至 {now.strftime('%Y-%m-%d')}",
-                    'total_records': len(data)
-                },
-                'water_quality_data': data
+            header['pond_info'] = {
+                'name': pond.name,
+                'species': pond.species,
+                'area': pond.area
             }
+        
+        if parallel:
+            rows = iter_chunk_lines(iter_chunks('ndjson'))
         else:
-            # 多个塘口的数据
-            json_data = {
-                'export_info': {
-                    'time_range': f"{start_time.strftime('%Y-%m-%d')} 至 {now.strftime('%Y-%m-%d')}",
-                    'total_records': len(data)
-                },
-                'water_quality_data': data
+            rows = (json.dumps(row, ensure_ascii=False) for row in iter_rows())
+        return Response(
+            stream_with_context(stream_json_export(rows, header, time_range)),
+            mimetype='application/json',
+            headers=attachment_headers(f'{filename}.json')
+        )
+    
+    elif export_format == 'columnar':
+        # 按列输出，每个列名只出现一次
+        columns = export_column_labels(fields)
+        water_quality_data = {column: [] for column in columns}
+        total_records = 0
+        for row in iter_rows():
+            for column in columns:
+                water_quality_data[column].append(row[column])
+            total_records += 1
+        
+        json_data = {
+            'export_info': {
+                'time_range': time_range,
+                'total_records': total_records
+            },
+            'water_quality_data': water_quality_data
+        }
+        if pond_id:
+            json_data['pond_info'] = {
+                'name': pond.name,
+                'species': pond.species,
+                'area': pond.area
             }
         
-        # 创建响应
-        response = Response(
-            json.dumps(json_data, ensure_ascii=False, indent=2),
+        return Response(
+            json.dumps(json_data, ensure_ascii=False),
             mimetype='application/json',
-            headers={'Content-Disposition': f'attachment; filename={filename}.json'}
+            headers=attachment_headers(f'{filename}.json')
+        )
+    
+    elif export_format == 'zip':
+        # 每个塘口一个CSV文件，打包为ZIP（不使用进程池时在当前线程中依次生成）
+        output = write_zip_export(iter_chunks('csv_file'))
+        
+        return send_file(
+            output,
+            as_attachment=True,
+            download_name=f'{filename}.zip',
+            mimetype='application/zip'
         )
-        return response
     
     else:
-        return jsonify({'error': '不支持的导出格式'}), 400
+        # 以只写模式逐批写入Excel，每个塘口一个工作表
+        if parallel:
+            pond_rows = ((pond, map(json.loads, chunk_lines(path))) for pond, path, _ in iter_chunks('ndjson'))
+        else:
+            pond_rows = (
+                (pond, (export_row(pond, wq, fields)
+                        for wq in iter_export_water_qualities(pond, fields, start_time, now, days, granularity)))
+                for pond in ponds
+            )
+        output = write_excel_export(pond_rows, fields)
+        
+        # 创建响应（临时文件在响应发送完毕后关闭并删除）
+        return send_file(
+            output,
+            as_attachment=True,
+            download_name=f'{filename}.xlsx',
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
 
 
 @data_bp.route('/api/latest_water_quality')
+@conditional(lambda: water_quality_validators())
 def get_latest_water_quality():
     """获取最新水质数据API"""
     # 获取所有塘口
     ponds = Pond.query.all()
     latest_data = {}
+    latest_snapshot = latest_water_quality_by_pond()
     
     for pond in ponds:
         # 获取每个塘口的最新水质数据
-        latest_record = WaterQuality.query.filter_by(pond_id=pond.id).order_by(WaterQuality.timestamp.desc()).first()
+        latest_record = latest_snapshot.get(pond.id)
         if latest_record:
             latest_data[pond.id] = {
                 'temperature': latest_record.temperature,
@@ -771,4 +807,98 @@ def get_latest_water_quality():
                 'timestamp': datetime.now().isoformat()
             }
     
-    return jsonify(latest_data)
\ No newline at end of file
+    return jsonify(latest_data)
+
+@data_bp.route('/api/ingest', methods=['POST'])
+def ingest_readings():
+    """批量写入传感器读数API（JSON数组或NDJSON，可包含多个塘口的读数）"""
+    try:
+        items, rejects = parse_ingest_payload(request.get_data(), request.content_type)
+    except IngestPayloadError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if len(items) > MAX_INGEST_BATCH:
+        return jsonify({'success': False, 'error': f'单次最多提交{MAX_INGEST_BATCH}条读数'}), 413
+    
+    # 校验读数，不合格的行单独返回，不影响其余行写入
+    rows, invalid = validate_readings(items, known_pond_ids())
+    rejects = sorted(rejects + invalid, key=lambda reject: reject['index'])
+    
+    # 默认进入写入队列由后台线程合并提交；sync=1 时在请求内直接写入
+    if request.args.get('sync') in ('1', 'true'):
+        accepted = insert_readings(rows)
+        status = 200
+    else:
+        try:
+            accepted = ingest_queue.submit(rows)
+        except IngestQueueFull as e:
+            response = jsonify({'success': False, 'error': '写入队列已满，请稍后重试'})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
+        status = 202
+    
+    return jsonify({
+        'success': True,
+        'accepted': accepted,
+        'rejected': len(rejects),
+        'rejects': rejects
+    }), status
+
+@data_bp.route('/stream')
+def live_stream():
+    """实时推送API（Server-Sent Events）：推送新写入的读数和新产生的预警
+
+    ponds 为订阅的塘口ID（逗号分隔，不指定时订阅全部塘口），
+    types 为订阅的事件类型（reading、alert，逗号分隔，不指定时订阅全部）。
+    """
+    try:
+        pond_ids = [int(value) for value in request.args.get('ponds', '').split(',') if value.strip()]
+    except ValueError:
+        return jsonify({'error': '塘口ID格式错误'}), 400
+    
+    types = [value.strip() for value in request.args.get('types', '').split(',') if value.strip()]
+    if any(value not in STREAM_EVENT_TYPES for value in types):
+        return jsonify({'error': '不支持的事件类型'}), 400
+    
+    # 浏览器断线重连时会带上最后收到的事件ID；页面切换订阅重新连接时通过 last_event_id 参数传递
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get('last_event_id', type=int)
+    
+    try:
+        subscription = event_broker.subscribe(pond_ids or None, types or STREAM_EVENT_TYPES, last_event_id)
+    except StreamFull:
+        response = jsonify({'error': '实时推送连接数已满，请稍后重试'})
+        response.headers['Retry-After'] = str(event_broker.heartbeat)
+        return response, 503
+    
+    # 不使用 stream_with_context：长连接不占用请求上下文和数据库会话
+    return Response(
+        event_broker.stream(subscription),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@data_bp.route('/api/ingest/metrics')
+def ingest_metrics():
+    """写入队列运行指标API（队列深度、提交延迟等）"""
+    return jsonify(ingest_queue.metrics())
+
+@data_bp.route('/api/storage/partitions')
+def storage_partitions():
+    """水质原始数据月分区状态API"""
+    from models import WaterQualityPartition
+    from services.scheduler import scheduler
+    
+    partitions = WaterQualityPartition.query.order_by(WaterQualityPartition.start_time.asc()).all()
+    return jsonify({
+        'partitions': [{
+            'month': partition.month,
+            'status': partition.status,
+            'row_count': partition.row_count,
+            'retention_days': partition.retention_days,
+            'archived_at': partition.archived_at.isoformat() if partition.archived_at else None,
+            'dropped_at': partition.dropped_at.isoformat() if partition.dropped_at else None
+        } for partition in partitions],
+        'jobs': scheduler.status()
+    })
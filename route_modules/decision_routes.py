@@ -2,6 +2,13 @@ from flask import Blueprint, render_template, jsonify, request
 from datetime import datetime, timedelta
 import random
 from models import db, Pond, WaterQuality, FeedingRecord, FeedingDecision
+from services.cache import cached
+from services.water_quality import latest_rows_by_pond
+from services.feeding_engine import (calculate_feeding_amount, generate_feeding_reasoning,
+                                     load_feeding_state, load_day_feedings, feeding_recommendations,
+                                     mock_water_quality)
+from services.feeding_plans import feeding_planner, current_slot, plan_water_quality
+from services.aggregation import daily_feeding_totals, daily_decision_stats, decisions_with_feedings
 
 decision_bp = Blueprint('decision', __name__)
 
@@ -77,50 +84,25 @@ def get_pond_status(pond_id):
     })
 
 @decision_bp.route('/api/decisions')
+@cached(pond_arg='pond_id')
 def get_decisions():
     """获取投喂决策API"""
     # 获取查询参数
     pond_id = request.args.get('pond_id', type=int)
     
-    # 获取所有塘口或指定塘口
-    if pond_id:
-        ponds = Pond.query.filter_by(id=pond_id).all()
-    else:
-        ponds = Pond.query.all()
-    
     decisions = []
+    now = datetime.now()
     
-    for pond in ponds:
-        # 获取最新水质数据
-        latest_water_quality = WaterQuality.query.filter_by(pond_id=pond.id).order_by(WaterQuality.timestamp.desc()).first()
-        
-        # 获取最近的投喂记录
-        latest_feeding = FeedingRecord.query.filter_by(pond_id=pond.id).order_by(FeedingRecord.time.desc()).first()
-        
+    # 批量读取所有塘口或指定塘口的最新水质、投喂记录和投喂决策，并一次计算全部推荐投喂量
+    state = load_feeding_state([pond_id] if pond_id else None)
+    recommendations = feeding_recommendations(state, mock_water_quality, now)
+    
+    for pond, water_quality, latest_feeding, recommended_amount in recommendations:
         # 获取最近的投喂决策
-        latest_decision = FeedingDecision.query.filter_by(pond_id=pond.id).order_by(FeedingDecision.created_at.desc()).first()
-        
-        # 如果没有最新水质数据，使用模拟数据
-        if not latest_water_quality:
-            water_quality = {
-                'temperature': round(random.uniform(20, 30), 1),
-                'dissolved_oxygen': round(random.uniform(4, 8), 1),
-                'ph': round(random.uniform(6.5, 8.5), 1),
-                'ammonia': round(random.uniform(0.1, 0.5), 2)
-            }
-        else:
-            water_quality = {
-                'temperature': latest_water_quality.temperature,
-                'dissolved_oxygen': latest_water_quality.dissolved_oxygen,
-                'ph': latest_water_quality.ph,
-                'ammonia': latest_water_quality.ammonia
-            }
-        
-        # 计算推荐投喂量
-        recommended_amount = calculate_feeding_amount(pond, water_quality, latest_feeding)
+        latest_decision = state['latest_decision'].get(pond.id)
         
         # 生成决策依据
-        reasoning = generate_feeding_reasoning(pond, water_quality, recommended_amount, latest_feeding)
+        reasoning = generate_feeding_reasoning(pond, water_quality, recommended_amount, latest_feeding, now)
         
         # 创建决策对象
         decision = {
@@ -133,7 +115,7 @@ def get_decisions():
             'water_quality': water_quality,
             'last_feeding': latest_feeding.time.strftime('%Y-%m-%d %H:%M:%S') if latest_feeding else None,
             'last_amount': latest_feeding.amount if latest_feeding else None,
-            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'created_at': now.strftime('%Y-%m-%d %H:%M:%S'),
             'applied': latest_decision.applied if latest_decision else False
         }
         
@@ -145,39 +127,18 @@ def get_decisions():
 def get_decision_analysis(pond_id):
     """获取决策分析API"""
     try:
-        # 获取最近30天的投喂记录
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        
-        feeding_records = FeedingRecord.query.filter(
-            FeedingRecord.pond_id == pond_id,
-            FeedingRecord.time >= thirty_days_ago
-        ).order_by(FeedingRecord.time.desc()).all()
-        
-        # 获取最近30天的决策记录
-        decisions = FeedingDecision.query.filter(
-            FeedingDecision.pond_id == pond_id,
-            FeedingDecision.created_at >= thirty_days_ago
-        ).order_by(FeedingDecision.created_at.desc()).all()
-        
-        # 计算投喂趋势
-        daily_feeding = {}
-        daily_recommended = {}
-        for record in feeding_records:
-            date = record.time.strftime('%Y-%m-%d')
-            if date not in daily_feeding:
-                daily_feeding[date] = 0
-            daily_feeding[date] += record.amount
+        # 最近30天每天的投喂量和投喂决策统计（各一条 GROUP BY 查询）
+        now = datetime.now()
+        thirty_days_ago = now - timedelta(days=30)
+        tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
         
-        # 计算每日推荐投喂量
-        for decision in decisions:
-            date = decision.created_at.strftime('%Y-%m-%d')
-            if date not in daily_recommended:
-                daily_recommended[date] = 0
-            daily_recommended[date] += decision.recommended_amount
+        daily_feeding = {
+            date: totals['amount'] for date, totals in daily_feeding_totals(thirty_days_ago, tomorrow, [pond_id]).items()
+        }
+        daily_decisions = daily_decision_stats(thirty_days_ago, tomorrow, [pond_id])
         
         # 获取最近7天的日期
         dates = []
-        now = datetime.now()
         for i in range(6, -1, -1):
             date = (now - timedelta(days=i)).strftime('%Y-%m-%d')
             dates.append(date)
@@ -185,7 +146,7 @@ def get_decision_analysis(pond_id):
         # 准备投喂效率数据
         efficiency_data = {
             'labels': dates,
-            'recommended': [daily_recommended.get(date, 0) for date in dates],
+            'recommended': [daily_decisions[date]['recommended'] if date in daily_decisions else 0 for date in dates],
             'actual': [daily_feeding.get(date, 0) for date in dates]
         }
         
@@ -197,23 +158,22 @@ def get_decision_analysis(pond_id):
         
         # 计算每日决策准确率
         for date in dates:
-            day_decisions = [d for d in decisions if d.created_at.strftime('%Y-%m-%d') == date]
-            if day_decisions:
-                applied_count = sum(1 for d in day_decisions if d.applied)
-                accuracy = (applied_count / len(day_decisions)) * 100
+            day_stats = daily_decisions.get(date)
+            if day_stats:
+                accuracy = round(day_stats['applied'] / day_stats['decisions'] * 100, 1)
             else:
                 # 如果没有决策，生成随机准确率
                 accuracy = round(random.uniform(70, 95), 1)
             accuracy_data['values'].append(accuracy)
         
-        # 计算决策应用率
-        total_decisions = len(decisions)
-        applied_decisions = sum(1 for d in decisions if d.applied)
+        # 计算决策应用率（每日方案计一条决策，部分时段已应用时按比例计）
+        total_decisions = sum(stats['decisions'] for stats in daily_decisions.values())
+        applied_decisions = sum(stats['applied'] for stats in daily_decisions.values())
         application_rate = (applied_decisions / total_decisions * 100) if total_decisions > 0 else 0
         
         # 计算饲料节省
-        total_recommended = sum(d.recommended_amount for d in decisions)
-        total_actual = sum(r.amount for r in feeding_records if r.time >= thirty_days_ago)
+        total_recommended = sum(stats['recommended'] for stats in daily_decisions.values())
+        total_actual = sum(daily_feeding.values())
         feed_saving = ((total_recommended - total_actual) / total_recommended * 100) if total_recommended > 0 else 0
         
         # 计算平均投喂量
@@ -226,7 +186,7 @@ def get_decision_analysis(pond_id):
             'feed_saving': round(feed_saving, 1),
             'avg_daily_feeding': round(avg_daily_feeding, 1),
             'total_decisions': total_decisions,
-            'applied_decisions': applied_decisions
+            'applied_decisions': round(applied_decisions, 1)
         })
     except Exception as e:
         # 如果表结构不匹配或其他错误，返回空结果
@@ -273,20 +233,9 @@ def get_historical_decisions(pond_id):
         # 获取最近30天的决策记录
         thirty_days_ago = datetime.now() - timedelta(days=30)
         
-        decisions = FeedingDecision.query.filter(
-            FeedingDecision.pond_id == pond_id,
-            FeedingDecision.created_at >= thirty_days_ago
-        ).order_by(FeedingDecision.created_at.desc()).all()
-        
+        # 决策及各自对应的投喂记录（决策后24小时内的第一条）一次查询取出
         result = []
-        for decision in decisions:
-            # 获取对应的投喂记录
-            feeding_record = FeedingRecord.query.filter(
-                FeedingRecord.pond_id == pond_id,
-                FeedingRecord.time >= decision.created_at,
-                FeedingRecord.time <= decision.created_at + timedelta(hours=24)
-            ).first()
-            
+        for decision, feeding_record in decisions_with_feedings(pond_id, thirty_days_ago):
             result.append({
                 'id': decision.id,
                 'pond_name': pond.name,
@@ -327,8 +276,9 @@ def apply_decision(pond_id):
         if decision:
             decision.applied = True
     else:
-        # 如果没有提供decision_id，使用最新的决策
-        latest_decision = FeedingDecision.query.filter_by(pond_id=pond_id).order_by(FeedingDecision.created_at.desc()).first()
+        # 如果没有提供decision_id，使用今日方案中当前的时段，没有方案时使用最新的决策
+        plan = FeedingDecision.query.filter_by(pond_id=pond_id, plan_date=datetime.now().date()).order_by(FeedingDecision.slot).all()
+        latest_decision = current_slot(plan) if plan else FeedingDecision.query.filter_by(pond_id=pond_id).order_by(FeedingDecision.created_at.desc()).first()
         if latest_decision:
             latest_decision.applied = True
     
@@ -345,59 +295,28 @@ def get_feeding_decision(pond_id):
     # 获取塘口信息
     pond = Pond.query.get_or_404(pond_id)
     
-    # 获取最新水质数据
-    latest_water_quality = WaterQuality.query.filter_by(pond_id=pond_id).order_by(WaterQuality.timestamp.desc()).first()
+    # 读取后台预计算的今日方案，取当前应执行的时段
+    plans = feeding_planner.today_plans([pond_id])
+    feeding_decision = current_slot(plans[pond_id])
+    recommended_amount = feeding_decision.recommended_amount  # 当前时段的份额
+    daily_amount = round(sum(decision.recommended_amount for decision in plans[pond_id]), 1)
+    reasoning = feeding_decision.reasoning
+    water_quality = plan_water_quality(feeding_decision)
     
     # 获取最近的投喂记录
     latest_feeding = FeedingRecord.query.filter_by(pond_id=pond_id).order_by(FeedingRecord.time.desc()).first()
     
-    # 如果没有最新水质数据，使用模拟数据
-    if not latest_water_quality:
-        water_quality = {
-            'temperature': round(random.uniform(20, 30), 1),
-            'dissolved_oxygen': round(random.uniform(4, 8), 1),
-            'ph': round(random.uniform(6.5, 8.5), 1),
-            'ammonia': round(random.uniform(0.1, 0.5), 2)
-        }
-    else:
-        water_quality = {
-            'temperature': latest_water_quality.temperature,
-            'dissolved_oxygen': latest_water_quality.dissolved_oxygen,
-            'ph': latest_water_quality.ph,
-            'ammonia': latest_water_quality.ammonia
-        }
-    
-    # 计算推荐投喂量
-    recommended_amount = calculate_feeding_amount(pond, water_quality, latest_feeding)
-    
-    # 生成决策依据
-    reasoning = generate_feeding_reasoning(pond, water_quality, recommended_amount, latest_feeding)
-    
-    # 保存决策到数据库
-    feeding_decision = FeedingDecision(
-        pond_id=pond_id,
-        recommended_amount=recommended_amount,
-        reasoning=reasoning,
-        created_at=datetime.now()
-    )
-    
-    db.session.add(feeding_decision)
-    db.session.commit()
-    
     # 计算预期效果
     feed_saving = round(random.uniform(5, 15), 1)  # 饲料节省百分比
     expected_growth = round(random.uniform(0.8, 1.5), 2)  # 预期日增长
     
-    # 生成投喂时间建议
-    feeding_times = []
-    base_time = 8  # 早上8点开始
-    for i in range(3):  # 一天3次投喂
-        hour = base_time + i * 6
-        feeding_times.append(f"{hour}:00")
+    # 投喂时间为方案各时段的计划时间
+    feeding_times = [f"{decision.slot_time.hour}:{decision.slot_time.minute:02d}" for decision in plans[pond_id]]
     
     return jsonify({
         'decision_id': feeding_decision.id,
         'recommended_amount': recommended_amount,
+        'daily_amount': daily_amount,
         'feed_saving': f"{feed_saving}%",
         'expected_growth': f"{expected_growth}g/天",
         'feeding_times': feeding_times,
@@ -410,7 +329,7 @@ def get_feeding_decision(pond_id):
             'species': pond.species
         },
         'last_feeding': latest_feeding.time.strftime('%Y-%m-%d %H:%M:%S') if latest_feeding else None,
-        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        'created_at': feeding_decision.created_at.strftime('%Y-%m-%d %H:%M:%S')
     })
 
 @decision_bp.route('/api/decision_detail/<int:pond_id>')
@@ -454,22 +373,17 @@ def get_decision_detail(pond_id):
     now = datetime.now()
     feeding_history = []
     
+    today_start = datetime.combine(now.date(), datetime.min.time())
+    daily_feeding = daily_feeding_totals(today_start - timedelta(days=6), today_start + timedelta(days=1), [pond_id])
+    
     for i in range(7):
-        day_start = now - timedelta(days=i, hours=now.hour, minutes=now.minute, seconds=now.second)
-        day_end = day_start + timedelta(days=1)
-        
-        day_feedings = FeedingRecord.query.filter(
-            FeedingRecord.pond_id == pond_id,
-            FeedingRecord.time >= day_start,
-            FeedingRecord.time < day_end
-        ).all()
-        
-        day_total = sum(feeding.amount for feeding in day_feedings)
+        date = (today_start - timedelta(days=i)).strftime('%Y-%m-%d')
+        day_totals = daily_feeding.get(date, {'amount': 0, 'count': 0})
         
         feeding_history.append({
-            'date': day_start.strftime('%Y-%m-%d'),
-            'amount': day_total,
-            'count': len(day_feedings)
+            'date': date,
+            'amount': day_totals['amount'],
+            'count': day_totals['count']
         })
     
     # 反转历史数据，使时间从早到晚
@@ -492,171 +406,31 @@ def get_decision_detail(pond_id):
         'applied': latest_decision.applied if latest_decision else False
     })
 
-def calculate_feeding_amount(pond, water_quality, latest_feeding):
-    """计算推荐投喂量"""
-    # 基础投喂量（根据塘口面积和养殖品种）
-    base_amount = pond.area * 2.0  # 基础投喂量：2kg/亩
-    
-    # 根据水质条件调整
-    # 溶解氧影响
-    do_factor = 1.0
-    if water_quality['dissolved_oxygen'] < 4.0:
-        do_factor = 0.7  # 溶解氧低，减少投喂
-    elif water_quality['dissolved_oxygen'] > 7.0:
-        do_factor = 1.2  # 溶解氧高，增加投喂
-    
-    # 温度影响
-    temp_factor = 1.0
-    if water_quality['temperature'] < 20:
-        temp_factor = 0.8  # 温度低，减少投喂
-    elif water_quality['temperature'] > 28:
-        temp_factor = 0.9  # 温度高，减少投喂
-    
-    # pH影响
-    ph_factor = 1.0
-    if water_quality['ph'] < 7.0 or water_quality['ph'] > 8.5:
-        ph_factor = 0.9  # pH不适宜，减少投喂
-    
-    # 氨氮影响
-    ammonia_factor = 1.0
-    if water_quality['ammonia'] > 0.4:
-        ammonia_factor = 0.8  # 氨氮高，减少投喂
-    
-    # 综合调整系数
-    total_factor = do_factor * temp_factor * ph_factor * ammonia_factor
-    
-    # 考虑上次投喂量和时间
-    time_factor = 1.0
-    if latest_feeding:
-        hours_since_last_feeding = (datetime.now() - latest_feeding.time).total_seconds() / 3600
-        if hours_since_last_feeding < 6:
-            time_factor = 0.5  # 距离上次投喂时间短，减少投喂
-        elif hours_since_last_feeding > 24:
-            time_factor = 1.2  # 距离上次投喂时间长，增加投喂
-    
-    # 计算最终推荐投喂量
-    recommended_amount = base_amount * total_factor * time_factor
-    
-    # 限制在合理范围内
-    recommended_amount = max(0.5, min(recommended_amount, pond.area * 5.0))
-    
-    return round(recommended_amount, 1)
-
-def generate_feeding_reasoning(pond, water_quality, recommended_amount, latest_feeding):
-    """生成投喂决策依据"""
-    reasoning = f"基于{pond.name}（面积：{pond.area}亩，品种：{pond.species}）的当前水质条件分析：\n\n"
-    
-    # 分析溶解氧
-    if water_quality['dissolved_oxygen'] < 4.0:
-        reasoning += f"• 溶解氧偏低（{water_quality['dissolved_oxygen']}mg/L），鱼类代谢减慢，建议减少投喂量30%\n"
-    elif water_quality['dissolved_oxygen'] > 7.0:
-        reasoning += f"• 溶解氧充足（{water_quality['dissolved_oxygen']}mg/L），鱼类代谢活跃，可适当增加投喂量20%\n"
-    else:
-        reasoning += f"• 溶解氧适宜（{water_quality['dissolved_oxygen']}mg/L），鱼类代谢正常\n"
-    
-    # 分析温度
-    if water_quality['temperature'] < 20:
-        reasoning += f"• 水温偏低（{water_quality['temperature']}℃），鱼类食欲下降，建议减少投喂量20%\n"
-    elif water_quality['temperature'] > 28:
-        reasoning += f"• 水温偏高（{water_quality['temperature']}℃），鱼类应激增加，建议减少投喂量10%\n"
-    else:
-        reasoning += f"• 水温适宜（{water_quality['temperature']}℃），鱼类食欲正常\n"
-    
-    # 分析pH
-    if water_quality['ph'] < 7.0 or water_quality['ph'] > 8.5:
-        reasoning += f"• pH值不适宜（{water_quality['ph']}），鱼类消化受影响，建议减少投喂量10%\n"
-    else:
-        reasoning += f"• pH值适宜（{water_quality['ph']}），鱼类消化正常\n"
-    
-    # 分析氨氮
-    if water_quality['ammonia'] > 0.4:
-        reasoning += f"• 氨氮偏高（{water_quality['ammonia']}mg/L），水质较差，建议减少投喂量20%\n"
-    else:
-        reasoning += f"• 氨氮正常（{water_quality['ammonia']}mg/L），水质良好\n"
-    
-    # 分析上次投喂
-    if latest_feeding:
-        hours_since_last_feeding = (datetime.now() - latest_feeding.time).total_seconds() / 3600
-        if hours_since_last_feeding < 6:
-            reasoning += f"• 距离上次投喂仅{hours_since_last_feeding:.1f}小时，塘内仍有残饵，建议大幅减少投喂量\n"
-        elif hours_since_last_feeding > 24:
-            reasoning += f"• 距离上次投喂已超过{hours_since_last_feeding:.1f}小时，鱼类可能饥饿，可适当增加投喂量\n"
-        else:
-            reasoning += f"• 距离上次投喂{hours_since_last_feeding:.1f}小时，投喂间隔适宜\n"
-    else:
-        reasoning += "• 无最近投喂记录，按照标准投喂量计算\n"
-    
-    reasoning += f"\n综合以上因素，推荐投喂量为{recommended_amount}kg。"
-    
-    return reasoning
-
 @decision_bp.route('/api/today_feeding_plan')
 def today_feeding_plan():
     """获取今日投喂方案API"""
     try:
-        # 获取所有塘口
-        ponds = Pond.query.all()
-        
         today_feeding_plans = []
+        now = datetime.now()
+        
+        # 读取后台预计算的今日方案，以及今日投喂记录和各塘口最近一次投喂
+        plans = feeding_planner.today_plans(now=now)
+        today_feedings = load_day_feedings(now.date())
+        latest_feedings = latest_rows_by_pond(FeedingRecord, FeedingRecord.time, columns=[FeedingRecord.time])
+        ponds = db.session.execute(db.select(Pond.id, Pond.name, Pond.area, Pond.species).order_by(Pond.id)).all()
         
         for pond in ponds:
-            # 获取最新水质数据
-            latest_water_quality = WaterQuality.query.filter_by(pond_id=pond.id).order_by(WaterQuality.timestamp.desc()).first()
-            
-            # 获取今日已投喂记录
-            today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            today_end = today_start + timedelta(days=1)
-            
-            today_feedings = FeedingRecord.query.filter(
-                FeedingRecord.pond_id == pond.id,
-                FeedingRecord.time >= today_start,
-                FeedingRecord.time < today_end
-            ).all()
-            
-            # 获取今日投喂决策
-            today_decision = FeedingDecision.query.filter(
-                FeedingDecision.pond_id == pond.id,
-                FeedingDecision.created_at >= today_start,
-                FeedingDecision.created_at < today_end
-            ).order_by(FeedingDecision.created_at.desc()).first()
-            
-            # 如果没有最新水质数据，使用模拟数据
-            if not latest_water_quality:
-                water_quality = {
-                    'temperature': round(random.uniform(20, 30), 1),
-                    'dissolved_oxygen': round(random.uniform(4, 8), 1),
-                    'ph': round(random.uniform(6.5, 8.5), 1),
-                    'ammonia': round(random.uniform(0.1, 0.5), 2)
-                }
-            else:
-                water_quality = {
-                    'temperature': latest_water_quality.temperature,
-                    'dissolved_oxygen': latest_water_quality.dissolved_oxygen,
-                    'ph': latest_water_quality.ph,
-                    'ammonia': latest_water_quality.ammonia
-                }
-            
-            # 获取最近的投喂记录（用于计算推荐量）
-            latest_feeding = FeedingRecord.query.filter_by(pond_id=pond.id).order_by(FeedingRecord.time.desc()).first()
-            
-            # 计算推荐投喂量
-            recommended_amount = calculate_feeding_amount(pond, water_quality, latest_feeding)
+            pond_plan = plans[pond.id]
+            decision = current_slot(pond_plan)
+            feedings = today_feedings.get(pond.id, [])
+            latest_feeding = latest_feedings.get(pond.id)
             
             # 计算今日已投喂量
-            total_today_amount = sum(feeding.amount for feeding in today_feedings)
-            
-            # 计算剩余可投喂量
-            remaining_amount = max(0, recommended_amount - total_today_amount)
-            
-            # 生成投喂时间建议
-            feeding_times = []
-            base_time = 8  # 早上8点开始
-            for i in range(3):  # 一天3次投喂
-                hour = base_time + i * 6
-                feeding_times.append(f"{hour}:00")
+            total_today_amount = sum(feeding.amount for feeding in feedings)
             
-            # 生成决策依据
-            reasoning = generate_feeding_reasoning(pond, water_quality, recommended_amount, latest_feeding)
+            # 当日推荐总量为各时段份额之和，剩余可投喂量按当日总量计算
+            daily_amount = round(sum(item.recommended_amount for item in pond_plan), 1)
+            remaining_amount = max(0, round(daily_amount - total_today_amount, 1))
             
             # 创建今日投喂方案
             feeding_plan = {
@@ -664,20 +438,29 @@ def today_feeding_plan():
                 'pond_name': pond.name,
                 'pond_area': pond.area,
                 'species': pond.species,
-                'water_quality': water_quality,
-                'recommended_amount': recommended_amount,
+                'water_quality': plan_water_quality(decision),
+                'recommended_amount': daily_amount,
                 'today_amount': total_today_amount,
                 'remaining_amount': remaining_amount,
-                'feeding_times': feeding_times,
-                'reasoning': reasoning,
-                'decision_id': today_decision.id if today_decision else None,
-                'decision_applied': today_decision.applied if today_decision else False,
+                'feeding_times': [f"{item.slot_time.hour}:{item.slot_time.minute:02d}" for item in pond_plan],
+                'reasoning': decision.reasoning,
+                'decision_id': decision.id,
+                'decision_applied': decision.applied,
+                'slots': [
+                    {
+                        'slot': item.slot,
+                        'time': item.slot_time.strftime('%Y-%m-%d %H:%M:%S'),
+                        'recommended_amount': item.recommended_amount,
+                        'decision_id': item.id,
+                        'applied': item.applied
+                    } for item in pond_plan
+                ],
                 'last_feeding': latest_feeding.time.strftime('%Y-%m-%d %H:%M:%S') if latest_feeding else None,
                 'today_feedings': [
                     {
                         'time': feeding.time.strftime('%Y-%m-%d %H:%M:%S'),
                         'amount': feeding.amount
-                    } for feeding in today_feedings
+                    } for feeding in feedings
                 ]
             }
             
@@ -685,7 +468,7 @@ def today_feeding_plan():
         
         return jsonify({
             'success': True,
-            'date': datetime.now().strftime('%Y-%m-%d'),
+            'date': now.strftime('%Y-%m-%d'),
             'feeding_plans': today_feeding_plans
         })
     except Exception as e:
@@ -2,6 +2,10 @@ from flask import Blueprint, render_template, jsonify, request, redirect, url_fo
 from datetime import datetime, timedelta
 import random
 from models import db, User, Pond, WaterQuality, FeedingRecord, Alert, FeedingDecision
+from services.water_quality import latest_water_quality_by_pond, hourly_series
+from services.aggregation import daily_feeding_totals
+from services.reports import recent_weeks, report_engine, report_response
+from services.cache import cached
 
 main_bp = Blueprint('main', __name__)
 
@@ -14,9 +18,10 @@ def index():
     # 获取每个塘口的最新水质数据
     pond_data = []
     latest_water_quality = {}
+    latest_snapshot = latest_water_quality_by_pond()
     
     for pond in ponds:
-        latest_wq = WaterQuality.query.filter_by(pond_id=pond.id).order_by(WaterQuality.timestamp.desc()).first()
+        latest_wq = latest_snapshot.get(pond.id)
         
         if latest_wq:
             pond_info = {
@@ -91,6 +96,7 @@ def index():
     return render_template('dashboard.html', ponds=pond_data, active_alerts=active_alerts, today_feeding=today_feeding, latest_water_quality=latest_water_quality, weather=weather)
 
 @main_bp.route('/pond/<int:pond_id>')
+@cached(pond_arg='pond_id', vary_locale=True)
 def pond_detail(pond_id):
     """塘口详情页"""
     # 获取塘口信息
@@ -103,22 +109,17 @@ def pond_detail(pond_id):
     now = datetime.now()
     feeding_history = []
     
+    today_start = datetime.combine(now.date(), datetime.min.time())
+    daily_feeding = daily_feeding_totals(today_start - timedelta(days=6), today_start + timedelta(days=1), [pond_id])
+    
     for i in range(7):
-        day_start = now - timedelta(days=i, hours=now.hour, minutes=now.minute, seconds=now.second)
-        day_end = day_start + timedelta(days=1)
-        
-        day_feedings = FeedingRecord.query.filter(
-            FeedingRecord.pond_id == pond_id,
-            FeedingRecord.time >= day_start,
-            FeedingRecord.time < day_end
-        ).all()
-        
-        day_total = sum(feeding.amount for feeding in day_feedings)
+        date = (today_start - timedelta(days=i)).strftime('%Y-%m-%d')
+        day_totals = daily_feeding.get(date, {'amount': 0, 'count': 0})
         
         feeding_history.append({
-            'date': day_start.strftime('%Y-%m-%d'),
-            'amount': day_total,
-            'count': len(day_feedings)
+            'date': date,
+            'amount': day_totals['amount'],
+            'count': day_totals['count']
         })
     
     # 反转历史数据，使时间从早到晚
@@ -127,60 +128,12 @@ def pond_detail(pond_id):
     # 获取预警历史（最近10条）
     alert_history = Alert.query.filter_by(pond_id=pond_id).order_by(Alert.timestamp.desc()).limit(10).all()
     
-    # 获取24小时水质数据
-    water_quality_history = []
-    for i in range(24):
-        time_point = now - timedelta(hours=i)
-        water_quality = WaterQuality.query.filter_by(pond_id=pond_id).filter(
-            WaterQuality.timestamp <= time_point,
-            WaterQuality.timestamp > time_point - timedelta(hours=1)
-        ).first()
-        
-        if water_quality:
-            water_quality_history.append({
-                'timestamp': water_quality.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                'temperature': water_quality.temperature,
-                'dissolved_oxygen': water_quality.dissolved_oxygen,
-                'ph': water_quality.ph,
-                'ammonia': water_quality.ammonia,
-                'turbidity': water_quality.turbidity or 0,
-                'conductivity': water_quality.conductivity or 0,
-                'water_level': water_quality.water_level or 0,
-                'cod': water_quality.cod or 0
-            })
-        else:
-            # 如果没有数据，生成模拟数据
-            base_temp = 25 + random.uniform(-2, 2)
-            base_do = 6.0 + random.uniform(-1.5, 1.5)
-            base_ph = 7.5 + random.uniform(-0.5, 0.5)
-            base_ammonia = 0.2 + random.uniform(-0.1, 0.2)
-            base_turbidity = 5 + random.uniform(-2, 2)  # 浊度基准值
-            base_conductivity = 500 + random.uniform(-100, 100)  # 电导率基准值
-            base_water_level = 1.5 + random.uniform(-0.3, 0.3)  # 液位基准值
-            base_cod = 15 + random.uniform(-5, 5)  # 化学需氧量基准值
-            
-            # 模拟夜间溶解氧下降
-            if time_point.hour >= 0 and time_point.hour <= 6:
-                base_do -= random.uniform(0.5, 1.5)
-            
-            # 模拟午后温度升高
-            if time_point.hour >= 12 and time_point.hour <= 15:
-                base_temp += random.uniform(1, 3)
-            
-            water_quality_history.append({
-                'timestamp': time_point.strftime('%Y-%m-%d %H:%M:%S'),
-                'temperature': round(base_temp, 1),
-                'dissolved_oxygen': round(max(3.0, base_do), 1),
-                'ph': round(max(6.5, min(8.5, base_ph)), 1),
-                'ammonia': round(max(0, base_ammonia), 2),
-                'turbidity': round(max(0, base_turbidity), 1),
-                'conductivity': round(max(0, base_conductivity), 0),
-                'water_level': round(max(0, base_water_level), 2),
-                'cod': round(max(0, base_cod), 1)
-            })
-    
-    # 反转历史数据，使时间从早到晚
-    water_quality_history.reverse()
+    # 获取24小时水质数据（逐小时聚合，没有数据的小时标记为 has_data=False）
+    water_quality_history = hourly_series(
+        pond_id,
+        hours=24,
+        metrics=['temperature', 'dissolved_oxygen', 'ph', 'ammonia', 'turbidity', 'conductivity', 'water_level', 'cod']
+    )
     
     return render_template('pond_detail.html', 
                           pond=pond, 
@@ -221,14 +174,23 @@ def weekly_report():
     ponds = Pond.query.all()
     
     # 获取最近4周的时间范围
-    weeks = []
-    for i in range(4):
-        week_end = datetime.now().date() - timedelta(days=i*7)
-        week_start = week_end - timedelta(days=6)
-        weeks.append({
-            'id': i+1,
-            'start_date': week_start.strftime('%Y-%m-%d'),
-            'end_date': week_end.strftime('%Y-%m-%d')
-        })
+    weeks = recent_weeks()
     
-    return render_template('weekly_report.html', ponds=ponds, weeks=weeks, selected_week_id=1)
\ No newline at end of file
+    return render_template('weekly_report.html', ponds=ponds, weeks=weeks, selected_week_id=1)
+
+@main_bp.route('/weekly_report/data')
+def weekly_report_data():
+    """周报数据API：读取预生成的周报（按天统计投喂量、水质日均值、预警次数和决策应用情况）"""
+    week_id = request.args.get('week_id', 1, type=int)
+    pond_id = request.args.get('pond_id', type=int)
+    
+    weeks = recent_weeks()
+    if week_id < 1 or week_id > len(weeks):
+        return jsonify({'error': '无效的周报编号'}), 400
+    week = weeks[week_id - 1]
+    
+    if pond_id:
+        Pond.query.get_or_404(pond_id)
+    
+    payload, _ = report_engine.report(week)
+    return jsonify(report_response(payload, week, pond_id))
@@ -0,0 +1 @@
+# Services package for Fish Intelligence Hub
\ No newline at end of file
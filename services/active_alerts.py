@@ -0,0 +1,111 @@
+import threading
+import time
+from sqlalchemy import event
+from models import db, Pond, Alert
+from services.alert_engine import METRIC_LABELS
+
+
+def alert_type(metric, title):
+    """预警对应的指标：阈值引擎生成的预警直接取 metric，其他预警按标题中的指标名称推断"""
+    if metric:
+        return metric
+    for name, (label, _) in METRIC_LABELS.items():
+        if label in title or label.rstrip('值') in title:
+            return name
+    return 'other'
+
+
+class ActiveAlertIndex:
+    """未解决预警的进程内索引（按塘口分组）
+
+    数据以 Alert 表为准：本进程提交的预警变更立即使索引失效，其他工作进程的
+    变更在 ACTIVE_ALERT_INDEX_TTL 秒内可见。页面和轮询接口都从索引读取，
+    不再把预警列表保存在会话中。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.ttl = 5
+        self._by_pond = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.ttl = app.config.get('ACTIVE_ALERT_INDEX_TTL', 5)
+        app.extensions['active_alert_index'] = self
+
+        event.listen(db.session, 'after_flush', _collect_alert_changes)
+        event.listen(db.session, 'after_commit', self._invalidate_committed)
+        event.listen(db.session, 'after_rollback', _discard_alert_changes)
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _snapshot(self):
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+                self._by_pond = self._load()
+                self._loaded_at = time.monotonic()
+            return self._by_pond
+
+    def _load(self):
+        rows = db.session.execute(
+            db.select(Alert.id, Alert.pond_id, Pond.name, Alert.metric, Alert.title, Alert.message,
+                      Alert.level, Alert.status, Alert.timestamp, Alert.value, Alert.threshold)
+            .join(Pond, Pond.id == Alert.pond_id)
+            .where(Alert.status == 'active')
+            .order_by(Alert.timestamp.desc(), Alert.id.desc())
+        ).all()
+
+        by_pond = {}
+        for alert_id, pond_id, pond_name, metric, title, message, level, status, timestamp, value, threshold in rows:
+            by_pond.setdefault(pond_id, []).append({
+                'id': alert_id,
+                'pond_id': pond_id,
+                'pond_name': pond_name,
+                'type': alert_type(metric, title),
+                'title': title,
+                'message': message,
+                'level': level,
+                'status': status,
+                'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S') if timestamp else None,
+                'value': value,
+                'threshold': threshold
+            })
+        return by_pond
+
+    def all(self):
+        """全部未解决预警，按时间倒序"""
+        alerts = [alert for pond_alerts in self._snapshot().values() for alert in pond_alerts]
+        alerts.sort(key=lambda alert: (alert['timestamp'] or '', alert['id']), reverse=True)
+        return alerts
+
+    def for_pond(self, pond_id):
+        return list(self._snapshot().get(pond_id, ()))
+
+    def newer_than(self, cursor):
+        """ID大于游标的未解决预警（预警ID递增，游标为客户端已见过的最大ID）"""
+        return [alert for alert in self.all() if cursor is None or alert['id'] > cursor]
+
+    def _invalidate_committed(self, session):
+        if session.info.pop('active_alerts_changed', False):
+            self.invalidate()
+
+
+def _collect_alert_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Alert):
+            session.info['active_alerts_changed'] = True
+            return
+
+
+def _discard_alert_changes(session):
+    session.info.pop('active_alerts_changed', None)
+
+
+# 全局未解决预警索引，在app.py中通过 init_app 绑定应用
+active_alert_index = ActiveAlertIndex()
@@ -0,0 +1,114 @@
+from collections import namedtuple
+from datetime import timedelta
+from models import db, FeedingRecord, FeedingDecision, Alert
+
+# 与投喂决策对应的投喂记录
+MatchedFeeding = namedtuple('MatchedFeeding', ['id', 'time', 'amount'])
+
+
+def daily_aggregates(model, time_column, aggregates, start_time, end_time, pond_ids=None, by_pond=False):
+    """按天分组聚合，一条 GROUP BY 语句完成
+
+    aggregates 为 {名称: 聚合表达式}，返回 {日期: {名称: 值}}；by_pond 为 True 时
+    键为 (pond_id, 日期)。日期为 'YYYY-MM-DD' 字符串（SQLite date() 的结果），
+    区间为 [start_time, end_time)，没有数据的天不出现在结果中。
+    """
+    day = db.func.date(time_column)
+    keys = [model.pond_id, day] if by_pond else [day]
+    query = db.session.query(*keys, *[expression.label(name) for name, expression in aggregates.items()]).filter(
+        time_column >= start_time,
+        time_column < end_time
+    )
+    if pond_ids is not None:
+        query = query.filter(model.pond_id.in_(list(pond_ids)))
+
+    result = {}
+    for row in query.group_by(*keys).all():
+        key = (row[0], row[1]) if by_pond else row[0]
+        result[key] = {name: getattr(row, name) for name in aggregates}
+    return result
+
+
+def daily_feeding_totals(start_time, end_time, pond_ids=None, by_pond=False):
+    """每天的投喂量和投喂次数 {日期: {'amount': 投喂量, 'count': 次数}}"""
+    return daily_aggregates(FeedingRecord, FeedingRecord.time, {
+        'amount': db.func.sum(FeedingRecord.amount),
+        'count': db.func.count(FeedingRecord.id)
+    }, start_time, end_time, pond_ids, by_pond)
+
+
+def daily_decision_stats(start_time, end_time, pond_ids=None, by_pond=False):
+    """每天的投喂决策数、已应用数和推荐投喂量合计 {日期: {'decisions', 'applied', 'recommended'}}
+
+    每日方案的各时段记录合为一条决策（日期取方案日期），推荐投喂量为各时段
+    份额之和，已应用数按已应用时段所占比例计；没有方案日期的旧决策每条计一次。
+    """
+    decision_key = db.case((FeedingDecision.plan_date.is_(None), FeedingDecision.id), else_=0)
+    decisions = db.session.query(
+        FeedingDecision.pond_id.label('pond_id'),
+        # 与 daily_aggregates 相同，日期以 'YYYY-MM-DD' 字符串返回
+        db.func.coalesce(FeedingDecision.plan_date, db.func.date(FeedingDecision.created_at), type_=db.String).label('day'),
+        db.func.count(FeedingDecision.id).label('slots'),
+        db.func.sum(db.case((FeedingDecision.applied.is_(True), 1), else_=0)).label('applied_slots'),
+        db.func.sum(FeedingDecision.recommended_amount).label('recommended')
+    ).filter(
+        FeedingDecision.created_at >= start_time,
+        FeedingDecision.created_at < end_time
+    )
+    if pond_ids is not None:
+        decisions = decisions.filter(FeedingDecision.pond_id.in_(list(pond_ids)))
+    decisions = decisions.group_by(
+        FeedingDecision.pond_id, FeedingDecision.plan_date, decision_key
+    ).subquery()
+
+    keys = [decisions.c.pond_id, decisions.c.day] if by_pond else [decisions.c.day]
+    query = db.session.query(
+        *keys,
+        db.func.count().label('decisions'),
+        db.func.sum(decisions.c.applied_slots * 1.0 / decisions.c.slots).label('applied'),
+        db.func.sum(decisions.c.recommended).label('recommended')
+    ).group_by(*keys)
+
+    result = {}
+    for row in query.all():
+        key = (row[0], row[1]) if by_pond else row[0]
+        result[key] = {'decisions': row.decisions, 'applied': row.applied, 'recommended': row.recommended}
+    return result
+
+
+def daily_alert_counts(start_time, end_time, pond_ids=None, by_pond=False):
+    """每天的预警次数 {日期: {'count': 次数}}"""
+    return daily_aggregates(Alert, Alert.timestamp, {
+        'count': db.func.count(Alert.id)
+    }, start_time, end_time, pond_ids, by_pond)
+
+
+def decisions_with_feedings(pond_id, start_time, window=timedelta(hours=24)):
+    """塘口在 start_time 之后的投喂决策及各自对应的投喂记录，按决策时间倒序
+
+    对应的投喂记录为决策之后 window 内最早的一条。用关联子查询为每条决策
+    在 (pond_id, time) 索引上定位一次，整个列表只需一次查询。返回
+    [(FeedingDecision, MatchedFeeding或None)]。
+    """
+    matched_id = db.session.query(FeedingRecord.id).filter(
+        FeedingRecord.pond_id == FeedingDecision.pond_id,
+        FeedingRecord.time >= FeedingDecision.created_at
+    ).order_by(FeedingRecord.time.asc(), FeedingRecord.id.asc()).limit(1).correlate(FeedingDecision).scalar_subquery()
+
+    rows = db.session.query(
+        FeedingDecision, FeedingRecord.id, FeedingRecord.time, FeedingRecord.amount
+    ).outerjoin(
+        FeedingRecord, FeedingRecord.id == matched_id
+    ).filter(
+        FeedingDecision.pond_id == pond_id,
+        FeedingDecision.created_at >= start_time
+    ).order_by(FeedingDecision.created_at.desc(), FeedingDecision.id.desc()).all()
+
+    result = []
+    for decision, record_id, record_time, amount in rows:
+        # 决策之后的第一条投喂记录超出时间窗口时视为没有对应记录
+        if record_id is None or record_time > decision.created_at + window:
+            result.append((decision, None))
+        else:
+            result.append((decision, MatchedFeeding(record_id, record_time, amount)))
+    return result
@@ -0,0 +1,507 @@
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from itertools import chain
+from operator import itemgetter
+from sqlalchemy.exc import IntegrityError
+from models import db, Pond, Alert, AlertThreshold
+from services.ingest import on_readings_inserted
+from services.water_quality import METRIC_FIELDS
+
+# numpy为可选依赖，未安装时逐条读数评估（结果相同，速度较慢）
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 预警级别，下标即严重程度（0 为正常）
+LEVELS = ('normal', 'warning', 'danger')
+LEVEL_RANK = {level: rank for rank, level in enumerate(LEVELS)}
+
+# 各指标的名称和单位，用于生成预警标题和内容
+METRIC_LABELS = {
+    'temperature': ('水温', '°C'),
+    'turbidity': ('浊度', 'NTU'),
+    'conductivity': ('电导率', 'μS/cm'),
+    'water_level': ('液位', 'm'),
+    'ph': ('pH值', ''),
+    'dissolved_oxygen': ('溶解氧', 'mg/L'),
+    'cod': ('化学需氧量', 'mg/L'),
+    'ammonia': ('氨氮', 'mg/L'),
+    'heavy_metals': ('重金属', 'μg/L'),
+    'residual_chlorine': ('余氯', 'mg/L'),
+    'total_phosphorus': ('总磷', 'mg/L'),
+    'total_nitrogen': ('总氮', 'mg/L'),
+    'coliform': ('总大肠菌群', '个/L'),
+    'algae': ('藻类密度', '个/mL'),
+    'biotoxicity': ('生物毒性', '%'),
+}
+
+THRESHOLD_FIELDS = ('warning_min', 'warning_max', 'danger_min', 'danger_max', 'hysteresis')
+
+# 全局默认阈值（首次启动时写入 AlertThreshold 表），None 表示不检查该下限/上限
+DEFAULT_THRESHOLDS = {
+    'temperature': (18, 32, 15, 35, 0.5),
+    'turbidity': (None, 25, None, 40, 2),
+    'conductivity': (None, 800, None, 1200, 20),
+    'water_level': (1.2, None, 0.8, None, 0.05),
+    'ph': (6.5, 8.5, 6.0, 9.0, 0.1),
+    'dissolved_oxygen': (3.5, None, 3.0, None, 0.3),
+    'cod': (None, 30, None, 50, 2),
+    'ammonia': (None, 0.6, None, 1.0, 0.05),
+    'heavy_metals': (None, 0.1, None, 0.2, 0.01),
+    'residual_chlorine': (None, 0.5, None, 0.8, 0.05),
+    'total_phosphorus': (None, 0.5, None, 1.0, 0.05),
+    'total_nitrogen': (None, 2.0, None, 3.0, 0.1),
+    'coliform': (None, 1000, None, 2000, 50),
+    'algae': (None, 10000, None, 20000, 500),
+    'biotoxicity': (None, 20, None, 30, 1),
+}
+
+# 未配置或已停用的规则：永不触发
+_NO_BOUNDS = (float('-inf'), float('inf'), float('-inf'), float('inf'), 0.0)
+
+_metric_values = itemgetter(*METRIC_FIELDS)
+
+
+def ensure_default_thresholds():
+    """为缺少全局规则的指标写入默认阈值，返回写入的条数"""
+    existing = {metric for (metric,) in db.session.query(AlertThreshold.metric).filter(
+        AlertThreshold.pond_id.is_(None), AlertThreshold.species.is_(None)
+    ).all()}
+    missing = [metric for metric in METRIC_FIELDS if metric not in existing]
+    for metric in missing:
+        db.session.add(AlertThreshold(metric=metric, **dict(zip(THRESHOLD_FIELDS, DEFAULT_THRESHOLDS[metric]))))
+    if missing:
+        db.session.commit()
+    return len(missing)
+
+
+def _rule_index(rules):
+    """按作用范围索引阈值规则：(pond_id, species, metric) -> 规则"""
+    return {(rule.pond_id, rule.species, rule.metric): rule for rule in rules}
+
+
+def _pick_rule(index, pond_id, species, metric):
+    return (index.get((pond_id, None, metric))
+            or index.get((None, species, metric))
+            or index.get((None, None, metric)))
+
+
+def effective_thresholds(pond=None):
+    """塘口各指标实际生效的阈值规则（塘口 > 品种 > 全局），未给出塘口时为全局规则"""
+    index = _rule_index(AlertThreshold.query.all())
+    if pond is None:
+        return {metric: index.get((None, None, metric)) for metric in METRIC_FIELDS}
+    return {metric: _pick_rule(index, pond.id, pond.species, metric) for metric in METRIC_FIELDS}
+
+
+def save_threshold(metric, updates, pond_id=None, species=None):
+    """保存一条阈值规则并通知预警引擎重新加载
+
+    updates 为要修改的字段（THRESHOLD_FIELDS 中的项）。指定范围的规则不存在时，
+    以该范围当前生效的规则为模板新建。
+    """
+    rule = AlertThreshold.query.filter_by(pond_id=pond_id, species=species, metric=metric).first()
+    if rule is None:
+        if pond_id is not None:
+            template = effective_thresholds(db.session.get(Pond, pond_id))[metric]
+        elif species is not None:
+            template = _rule_index(AlertThreshold.query.all()).get((None, None, metric))
+        else:
+            template = None
+        if template is not None:
+            fields = {field: getattr(template, field) for field in THRESHOLD_FIELDS}
+        else:
+            fields = dict(zip(THRESHOLD_FIELDS, DEFAULT_THRESHOLDS[metric]))
+        rule = AlertThreshold(pond_id=pond_id, species=species, metric=metric, **fields)
+        db.session.add(rule)
+
+    for field, value in updates.items():
+        setattr(rule, field, value)
+    rule.enabled = True
+    db.session.commit()
+    alert_engine.invalidate_thresholds()
+    return rule
+
+
+def threshold_to_dict(rule):
+    return {
+        'id': rule.id,
+        'pond_id': rule.pond_id,
+        'species': rule.species,
+        'metric': rule.metric,
+        'warning_min': rule.warning_min,
+        'warning_max': rule.warning_max,
+        'danger_min': rule.danger_min,
+        'danger_max': rule.danger_max,
+        'hysteresis': rule.hysteresis,
+        'enabled': rule.enabled,
+    }
+
+
+def resolve_alert(alert):
+    """手动解除预警；阈值预警同时锁存当前级别，指标恢复正常前不会再次触发"""
+    if alert.status == 'active' and alert.metric is not None:
+        alert.latched = True
+    alert.status = 'resolved'
+
+
+def _bounds(rule):
+    if rule is None or not rule.enabled:
+        return _NO_BOUNDS
+    return (
+        float('-inf') if rule.warning_min is None else rule.warning_min,
+        float('inf') if rule.warning_max is None else rule.warning_max,
+        float('-inf') if rule.danger_min is None else rule.danger_min,
+        float('inf') if rule.danger_max is None else rule.danger_max,
+        rule.hysteresis or 0.0,
+    )
+
+
+def _next_level(level, value, bounds):
+    """单个读数后的级别：越过阈值立即升级；读数回到阈值内侧超过回差才降级"""
+    warning_min, warning_max, danger_min, danger_max, hysteresis = bounds
+    if value < danger_min or value > danger_max:
+        return 2
+    if level == 2 and (value < danger_min + hysteresis or value > danger_max - hysteresis):
+        return 2
+    if value < warning_min or value > warning_max:
+        return 1
+    if level >= 1 and (value < warning_min + hysteresis or value > warning_max - hysteresis
+                       or value < danger_min + hysteresis or value > danger_max - hysteresis):
+        return 1
+    return 0
+
+
+class AlertEngine:
+    """基于阈值的水质预警引擎
+
+    每批读数写入后评估一次。有numpy时对整批读数、全部指标向量化计算，
+    否则逐条计算，两者结果相同。同一塘口同一指标从正常转为超限时新建一条
+    预警，持续超限期间不再新建（升级为危险时更新该条记录），读数回到阈值
+    内侧超过回差后自动标记为已解决。
+
+    各指标的当前级别保存在进程内存中，由未解决的预警记录恢复，并与阈值一同
+    每 ALERT_THRESHOLD_RELOAD_SECONDS 秒重新加载，使各工作进程的状态一致。
+    指标仍超限时被手动解除的预警（latched）同样恢复级别，但不再视为未解决，
+    读数恢复正常（超过回差）后解除锁存，之后再次超限时新建预警。
+    新建预警前先查找该指标未解决的预警（可能已由其他工作进程建立），
+    未解决的阈值预警上的部分唯一索引保证每个塘口每项指标只有一条。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.reload_seconds = 60
+        self._thresholds = {}  # pond_id -> 各指标的阈值元组
+        self._loaded_at = None
+        self._levels = {}  # pond_id -> 各指标当前级别
+        self._open = {}  # (pond_id, 指标下标) -> 未解决的预警ID
+        self._last_seen = {}  # pond_id -> 已评估的最新读数时间
+        self._state_loaded = False
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('ALERT_ENGINE_ENABLED', True)
+        self.reload_seconds = app.config.get('ALERT_THRESHOLD_RELOAD_SECONDS', 60)
+        app.extensions['alert_engine'] = self
+
+        if self.enabled:
+            on_readings_inserted(self.evaluate)
+
+    def invalidate_thresholds(self):
+        """阈值规则或塘口品种变更后调用，下一批读数评估前重新加载"""
+        self._loaded_at = None
+
+    # ------------------------------------------------------------------
+    # 加载
+    # ------------------------------------------------------------------
+
+    def ensure_loaded(self, pond_ids=()):
+        expired = self._loaded_at is None or time.monotonic() - self._loaded_at > self.reload_seconds
+        if expired or any(pond_id not in self._thresholds for pond_id in pond_ids):
+            self._load_thresholds()
+        if expired or not self._state_loaded:
+            self._load_state()
+
+    def _load_thresholds(self):
+        index = _rule_index(AlertThreshold.query.all())
+        thresholds = {}
+        for pond_id, pond_species in db.session.query(Pond.id, Pond.species).all():
+            thresholds[pond_id] = [_bounds(_pick_rule(index, pond_id, pond_species, metric)) for metric in METRIC_FIELDS]
+        self._thresholds = thresholds
+        self._loaded_at = time.monotonic()
+
+    def _load_state(self):
+        # 由未解决和手动解除后锁存的阈值预警恢复各指标级别（同一指标有多条时取最新的一条），
+        # 其他工作进程新建或解除的预警在这里同步到本进程
+        metric_index = {metric: i for i, metric in enumerate(METRIC_FIELDS)}
+        active = db.session.query(Alert.id, Alert.pond_id, Alert.metric, Alert.level, Alert.status).filter(
+            db.or_(Alert.status == 'active', Alert.latched.is_(True)), Alert.metric.isnot(None)
+        ).order_by(Alert.timestamp, Alert.id).all()
+        levels = {}
+        opened = {}
+        for alert_id, pond_id, metric, level, status in active:
+            if metric not in metric_index:
+                continue
+            pond_levels = levels.setdefault(pond_id, [0] * len(METRIC_FIELDS))
+            pond_levels[metric_index[metric]] = LEVEL_RANK.get(level, 1) or 1
+            if status == 'active':
+                opened[(pond_id, metric_index[metric])] = alert_id
+            else:
+                opened.pop((pond_id, metric_index[metric]), None)
+        self._levels = levels
+        self._open = opened
+        self._state_loaded = True
+
+    # ------------------------------------------------------------------
+    # 评估
+    # ------------------------------------------------------------------
+
+    def evaluate(self, rows):
+        """读数写入后的回调：评估本批读数，写入新预警、升级或解除已有预警"""
+        if not rows:
+            return 0
+        with self._lock:
+            self.ensure_loaded({row['pond_id'] for row in rows})
+            transitions, levels, last_seen = self.scan(rows)
+            if transitions:
+                try:
+                    self._apply(transitions)
+                except IntegrityError:
+                    # 其他工作进程同时为同一指标新建了预警，按数据库中已有的预警重新写入
+                    self._apply(transitions)
+            # 预警写入成功后才更新内存中的级别
+            self._levels.update(levels)
+            self._last_seen.update(last_seen)
+        return len(transitions)
+
+    def scan(self, rows, use_numpy=None):
+        """计算一批读数引起的级别变化，不修改引擎状态
+
+        读数按塘口、时间排序后依次评估，早于该塘口已评估读数的迟到数据不参与评估。
+        返回 (变化列表, 各塘口评估后的级别, 各塘口最新读数时间)，变化为
+        (pond_id, 指标下标, 原级别, 新级别, 读数时间, 读数值)，按时间先后排列。
+        """
+        if use_numpy is None:
+            use_numpy = np is not None
+        rows = [row for row in rows if row['pond_id'] in self._thresholds]
+        if not rows:
+            return [], {}, {}
+        return self._scan_numpy(rows) if use_numpy else self._scan_python(rows)
+
+    def _initial_levels(self, pond_id):
+        return self._levels.get(pond_id) or [0] * len(METRIC_FIELDS)
+
+    def _scan_python(self, rows):
+        transitions = []
+        levels = {}
+        last_seen = {}
+        for row in sorted(rows, key=itemgetter('pond_id', 'timestamp')):
+            pond_id = row['pond_id']
+            if pond_id not in levels:
+                levels[pond_id] = list(self._initial_levels(pond_id))
+                last_seen[pond_id] = self._last_seen.get(pond_id, datetime.min)
+            timestamp = row['timestamp']
+            if timestamp < last_seen[pond_id]:
+                continue
+            last_seen[pond_id] = timestamp
+
+            pond_levels = levels[pond_id]
+            bounds = self._thresholds[pond_id]
+            for i, value in enumerate(_metric_values(row)):
+                if value is None:
+                    continue
+                level = _next_level(pond_levels[i], value, bounds[i])
+                if level != pond_levels[i]:
+                    transitions.append((pond_id, i, pond_levels[i], level, timestamp, value))
+                    pond_levels[i] = level
+
+        return transitions, levels, last_seen
+
+    def _scan_numpy(self, rows):
+        count = len(rows)
+        stamps = [row['timestamp'] for row in rows]
+        # 先按时间排序（读数通常按时间先后到达，排序接近线性），再按塘口稳定排序
+        order = np.array(sorted(range(count), key=stamps.__getitem__), dtype=np.int64)
+        ponds = np.fromiter((row['pond_id'] for row in rows), dtype=np.int64, count=count)[order]
+        by_pond = np.argsort(ponds, kind='stable')
+        order = order[by_pond]
+        ponds = ponds[by_pond]
+
+        # 丢弃早于该塘口已评估读数的迟到数据（塘口内已按时间排序，二分查找第一条需要评估的读数）
+        starts = np.flatnonzero(np.r_[True, ponds[1:] != ponds[:-1]])
+        ends = np.r_[starts[1:], count]
+        segments = []
+        for pond_id, start, end in zip(ponds[starts].tolist(), starts.tolist(), ends.tolist()):
+            seen = self._last_seen.get(pond_id)
+            if seen is not None:
+                start = bisect_left(order, seen, start, end, key=stamps.__getitem__)
+            if start < end:
+                segments.append((start, end))
+        if len(segments) != len(starts) or any(start != s for (start, _), s in zip(segments, starts.tolist())):
+            if not segments:
+                return [], {}, {}
+            order = np.concatenate([order[start:end] for start, end in segments])
+            ponds = ponds[np.concatenate([np.arange(start, end) for start, end in segments])]
+            count = len(order)
+            starts = np.flatnonzero(np.r_[True, ponds[1:] != ponds[:-1]])
+            ends = np.r_[starts[1:], count]
+
+        group_ponds = ponds[starts].tolist()
+        group = np.repeat(np.arange(len(starts)), ends - starts)
+        metrics = len(METRIC_FIELDS)
+
+        # 读数矩阵，转置为每行一项指标，使下面沿时间方向的累积运算访问连续内存；空值为NaN
+        # （按读数原有顺序读取再重排，顺序访问各读数字典更快）
+        values = np.fromiter(chain.from_iterable(map(_metric_values, rows)),
+                             dtype=float, count=len(rows) * metrics).reshape(len(rows), metrics)
+        values = values[order].T.copy()
+        valid = ~np.isnan(values)
+
+        # 各读数是否越过危险/警告阈值（tripped），是否仍在阈值回差内（held）；
+        # 越过危险阈值（或在其回差内）时同样视为越过警告阈值（或在其回差内）。
+        # 读数已按塘口排序，逐个塘口与该塘口的阈值比较
+        bounds = np.array([self._thresholds[pond_id] for pond_id in group_ponds])
+        tripped = {rank: np.zeros((metrics, count), dtype=bool) for rank in (1, 2)}
+        held = {rank: np.zeros((metrics, count), dtype=bool) for rank in (1, 2)}
+        with np.errstate(invalid='ignore'):
+            for g, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+                block = values[:, start:end]
+                warning_min, warning_max, danger_min, danger_max, hysteresis = bounds[g].T[:, :, None]
+                tripped[2][:, start:end] = (block < danger_min) | (block > danger_max)
+                held[2][:, start:end] = (block < danger_min + hysteresis) | (block > danger_max - hysteresis)
+                tripped[1][:, start:end] = tripped[2][:, start:end] | (block < warning_min) | (block > warning_max)
+                held[1][:, start:end] = (held[2][:, start:end] | (block < warning_min + hysteresis)
+                                         | (block > warning_max - hysteresis))
+
+        initial = np.array([self._initial_levels(pond_id) for pond_id in group_ponds], dtype=np.int8).T
+        group_start = starts[group].astype(np.int32)
+        positions = np.arange(count, dtype=np.int32)
+        offsets = (np.arange(metrics, dtype=np.int32) * count)[:, None]
+
+        # 级别 >= L 相当于一个置位/复位锁存器：读数越过L级阈值时置位，回到阈值内侧
+        # 超过回差时复位，其余读数（包括空值）保持。每个读数取本塘口内最近一次置位/复位事件，
+        # 塘口内还没有事件时取评估前的级别。
+        level = np.zeros((metrics, count), dtype=np.int8)
+        for rank in (1, 2):
+            events = valid & (tripped[rank] | ~held[rank])
+            last_event = np.maximum.accumulate(np.where(events, positions, np.int32(-1)), axis=1)
+            latched = np.where(last_event >= group_start,
+                               tripped[rank].ravel()[np.maximum(last_event, 0) + offsets],
+                               (initial >= rank)[:, group])
+            level += latched
+
+        previous = np.empty_like(level)
+        previous[:, 1:] = level[:, :-1]
+        previous[:, starts] = initial
+        changed_columns, changed_rows = np.nonzero(level != previous)
+        # 按读数先后排列（同一读数内按指标顺序）
+        by_row = np.lexsort((changed_columns, changed_rows))
+        changed_columns = changed_columns[by_row]
+        changed_rows = changed_rows[by_row]
+
+        transitions = []
+        if len(changed_rows):
+            old_levels = previous[changed_columns, changed_rows].tolist()
+            new_levels = level[changed_columns, changed_rows].tolist()
+            changed_values = values[changed_columns, changed_rows].tolist()
+            for r, c, old, new, value in zip(changed_rows.tolist(), changed_columns.tolist(),
+                                             old_levels, new_levels, changed_values):
+                row = rows[order[r]]
+                transitions.append((row['pond_id'], c, old, new, row['timestamp'], value))
+
+        levels = {}
+        last_seen = {}
+        for pond_id, end in zip(group_ponds, (ends - 1).tolist()):
+            levels[pond_id] = level[:, end].tolist()
+            last_seen[pond_id] = rows[order[end]]['timestamp']
+        return transitions, levels, last_seen
+
+    # ------------------------------------------------------------------
+    # 写入预警
+    # ------------------------------------------------------------------
+
+    def _apply(self, transitions):
+        pond_ids = {transition[0] for transition in transitions}
+        names = dict(db.session.query(Pond.id, Pond.name).filter(Pond.id.in_(pond_ids)).all())
+        opened = {}
+        closed = set()
+
+        try:
+            for pond_id, index, old, new, timestamp, value in transitions:
+                key = (pond_id, index)
+                alert = opened.get(key)
+                if alert is None and key not in closed:
+                    if key in self._open:
+                        alert = db.session.get(Alert, self._open[key])
+                    if alert is None or alert.status != 'active':
+                        alert = self._active_alert(pond_id, index)
+
+                if new == 0:
+                    # 恢复正常：解除该指标未解决的预警和手动解除后的锁存
+                    if alert is not None and alert.status == 'active':
+                        alert.status = 'resolved'
+                    for latched in self._latched_alerts(pond_id, index):
+                        latched.latched = None
+                    opened.pop(key, None)
+                    closed.add(key)
+                    continue
+
+                if alert is None or alert.status != 'active':
+                    if new < old:
+                        # 预警已被手动解除，级别降低时不再新建
+                        continue
+                    alert = Alert(pond_id=pond_id, status='active', timestamp=timestamp, metric=METRIC_FIELDS[index])
+                    db.session.add(alert)
+                elif new <= LEVEL_RANK.get(alert.level, 0):
+                    # 危险降为警告时保留预警的最高级别，等恢复正常后再解除
+                    continue
+                self._fill_alert(alert, names.get(pond_id, ''), index, new, value)
+                opened[key] = alert
+                closed.discard(key)
+
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        for key in closed:
+            self._open.pop(key, None)
+        for key, alert in opened.items():
+            self._open[key] = alert.id
+
+    def _latched_alerts(self, pond_id, index):
+        return Alert.query.filter_by(pond_id=pond_id, metric=METRIC_FIELDS[index], latched=True).all()
+
+    def _active_alert(self, pond_id, index):
+        """数据库中该塘口该指标未解决的预警（可能由其他工作进程建立），没有时返回 None"""
+        return Alert.query.filter_by(
+            pond_id=pond_id, metric=METRIC_FIELDS[index], status='active'
+        ).order_by(Alert.timestamp.desc(), Alert.id.desc()).first()
+
+    def _fill_alert(self, alert, pond_name, index, level, value):
+        metric = METRIC_FIELDS[index]
+        label, unit = METRIC_LABELS[metric]
+        warning_min, warning_max, danger_min, danger_max, _ = self._thresholds[alert.pond_id][index]
+        low, high = (danger_min, danger_max) if level == 2 else (warning_min, warning_max)
+        is_low = value < low
+        threshold = low if is_low else high
+        level_name = '危险' if level == 2 else '警告'
+
+        alert.level = LEVELS[level]
+        alert.title = f'{label}过低' if is_low else f'{label}过高'
+        alert.message = (f'{pond_name}{label}为{value:g}{unit}，'
+                         f'{"低于" if is_low else "高于"}{level_name}阈值{threshold:g}{unit}')
+        alert.value = value
+        alert.threshold = threshold
+
+
+# 全局预警引擎，在app.py中通过 init_app 绑定应用
+alert_engine = AlertEngine()
@@ -0,0 +1,274 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from itertools import chain
+from flask import Response, request, make_response
+from flask_babel import get_locale
+from sqlalchemy import event
+from models import db, Pond, WaterQuality, FeedingRecord, FeedingDecision, Alert
+from services.ingest import on_readings_inserted
+
+# 写入后需要使对应塘口缓存失效的模型（塘口本身按 id，其余按 pond_id）
+INVALIDATING_MODELS = (WaterQuality, FeedingRecord, FeedingDecision, Alert)
+
+# 不针对单个塘口的缓存项（如全部塘口列表）使用的代次名，任一塘口有写入时都会递增
+ALL_PONDS = '*'
+
+
+class MemoryCacheBackend:
+    """进程内LRU缓存，各工作进程独立缓存和失效（其他进程的写入在TTL内可能不可见）"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generation(self, name):
+        with self._lock:
+            return self._generations.get(name, 0)
+
+    def bump(self, name):
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileCacheBackend:
+    """基于目录的共享缓存，多个工作进程指向同一目录即可共享缓存项和失效状态
+
+    目录可放在 /dev/shm 等内存文件系统上。缓存项按最近访问时间淘汰，
+    代次文件每次失效时写入新的随机值，多个进程同时失效也不会丢失更新。
+    """
+
+    # 每写入多少项检查一次缓存项数量
+    PRUNE_EVERY = 64
+
+    def __init__(self, directory, max_entries=1024):
+        self.max_entries = max_entries
+        self.entry_dir = os.path.join(directory, 'entries')
+        self.generation_dir = os.path.join(directory, 'generations')
+        os.makedirs(self.entry_dir, exist_ok=True)
+        os.makedirs(self.generation_dir, exist_ok=True)
+        self._writes = 0
+
+    def _entry_path(self, key):
+        return os.path.join(self.entry_dir, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _generation_path(self, name):
+        return os.path.join(self.generation_dir, 'all' if name == ALL_PONDS else name.replace(':', '_'))
+
+    def get(self, key):
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at < time.time():
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value, ttl):
+        path = self._entry_path(key)
+        self._write(path, pickle.dumps((time.time() + ttl, value), pickle.HIGHEST_PROTOCOL))
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune()
+
+    def generation(self, name):
+        try:
+            with open(self._generation_path(name), 'r') as f:
+                return f.read()
+        except OSError:
+            return '0'
+
+    def bump(self, name):
+        self._write(self._generation_path(name), uuid.uuid4().hex.encode('ascii'))
+
+    def clear(self):
+        for name in os.listdir(self.entry_dir):
+            self._remove(os.path.join(self.entry_dir, name))
+
+    def _write(self, path, data):
+        # 先写临时文件再改名，其他进程不会读到写了一半的文件
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _prune(self):
+        entries = []
+        for name in os.listdir(self.entry_dir):
+            path = os.path.join(self.entry_dir, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ResponseCache:
+    """读接口的响应缓存
+
+    缓存键由端点、查询参数、塘口的缓存代次（以及可选的界面语言）组成。
+    塘口有新读数、投喂记录、投喂决策或预警写入时递增其代次，旧缓存项
+    不再被命中，随LRU/TTL淘汰。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.backend = None
+        self.default_ttl = 60
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        backend = app.config.get('RESPONSE_CACHE_BACKEND', 'memory')
+        max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1024)
+        if backend == 'memory':
+            self.backend = MemoryCacheBackend(max_entries)
+        elif backend == 'file':
+            directory = app.config.get('RESPONSE_CACHE_DIR') or os.path.join(app.instance_path, 'response_cache')
+            self.backend = FileCacheBackend(directory, max_entries)
+        elif backend is None:
+            self.backend = None
+        else:
+            raise ValueError(f'未知的缓存后端: {backend}')
+        self.default_ttl = app.config.get('RESPONSE_CACHE_TTL', 60)
+        app.extensions['response_cache'] = self
+
+        if self.backend is not None:
+            on_readings_inserted(lambda rows: self.invalidate({row['pond_id'] for row in rows}))
+            event.listen(db.session, 'after_flush', _collect_dirty_ponds)
+            event.listen(db.session, 'after_commit', self._invalidate_committed)
+            event.listen(db.session, 'after_rollback', _discard_dirty_ponds)
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def invalidate(self, pond_ids):
+        """使指定塘口（以及不区分塘口）的缓存项失效"""
+        if self.backend is None:
+            return
+        pond_ids = set(pond_ids)
+        for pond_id in pond_ids:
+            self.backend.bump(f'pond:{pond_id}')
+        if pond_ids:
+            self.backend.bump(ALL_PONDS)
+
+    def make_key(self, endpoint, args, pond_id=None, locale=None):
+        scope = ALL_PONDS if pond_id is None else f'pond:{pond_id}'
+        params = '&'.join(f'{name}={value}' for name, value in sorted(args.items(multi=True)))
+        return f'{endpoint}|{params}|{scope}@{self.backend.generation(scope)}|{locale or ""}'
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl or self.default_ttl)
+
+    def _invalidate_committed(self, session):
+        self.invalidate(session.info.pop('cache_dirty_ponds', ()))
+
+
+def _collect_dirty_ponds(session, flush_context):
+    # after_flush 时 new/dirty/deleted 仍是本次刷新前的状态，新对象的主键已生成
+    pond_ids = session.info.setdefault('cache_dirty_ponds', set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Pond):
+            pond_ids.add(obj.id)
+        elif isinstance(obj, INVALIDATING_MODELS) and obj.pond_id is not None:
+            pond_ids.add(obj.pond_id)
+
+
+def _discard_dirty_ponds(session):
+    session.info.pop('cache_dirty_ponds', None)
+
+
+def cached(pond_arg=None, ttl=None, vary_locale=False):
+    """缓存GET接口的200响应
+
+    pond_arg 为路由参数或查询参数中的塘口ID名称，给出时缓存项只随该塘口的写入失效，
+    未给出（或请求中没有该参数）时随任一塘口的写入失效。
+    vary_locale 为 True 时按界面语言分别缓存（用于渲染模板的页面）。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not response_cache.enabled or request.method != 'GET':
+                return view(*args, **kwargs)
+
+            pond_id = None
+            if pond_arg:
+                pond_id = kwargs.get(pond_arg)
+                if pond_id is None:
+                    pond_id = request.args.get(pond_arg, type=int)
+            locale = str(get_locale()) if vary_locale else None
+            # 先取代次再执行视图，执行期间发生的写入会使本次结果在下次请求时失效
+            key = response_cache.make_key(request.endpoint, request.args, pond_id, locale)
+
+            entry = response_cache.get(key)
+            if entry is not None:
+                body, status, content_type = entry
+                response = Response(body, status=status, content_type=content_type)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough and not response.is_streamed:
+                response_cache.set(key, (response.get_data(), response.status_code, response.content_type), ttl)
+                response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+# 全局响应缓存，在app.py中通过 init_app 绑定应用
+response_cache = ResponseCache()
@@ -0,0 +1,246 @@
+import os
+from datetime import datetime, timedelta
+from flask import current_app
+from models import db, WaterQualityDaily, WaterQualityDayArchive
+from services.storage import iter_water_quality
+from services.water_quality import METRIC_FIELDS, point_type
+
+# pyarrow为可选依赖，未安装时不生成列式归档，读取全部走SQLite
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = None
+
+if pa is not None:
+    ARCHIVE_SCHEMA = pa.schema(
+        [('timestamp', pa.timestamp('us'))] + [(metric, pa.float64()) for metric in METRIC_FIELDS]
+    )
+
+
+def columnar_available():
+    return pa is not None and current_app.config.get('COLUMNAR_ARCHIVE_ENABLED', True)
+
+
+def archive_dir():
+    path = current_app.config['COLUMNAR_ARCHIVE_DIR']
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _day_start(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+# ---------------------------------------------------------------------------
+# 归档任务
+# ---------------------------------------------------------------------------
+
+def archive_closed_days(now=None):
+    """将已结束的天按塘口写成压缩的Arrow IPC文件（由定时任务调用）
+
+    需要归档的天来自天汇总表：没有登记过的天，以及汇总计数与登记的记录数不一致
+    （写出后又有迟到读数）的天会被（重新）写出。原始数据已删除、无法写出的天登记为
+    unrecoverable，之后只有汇总计数再次变化时才重新尝试。返回写出的文件数。
+    """
+    if not columnar_available():
+        return 0
+
+    today = (now or datetime.now()).date()
+    # 温度为必填指标，其天汇总样本数即当天的原始记录数
+    pending = db.session.query(
+        WaterQualityDaily.pond_id, WaterQualityDaily.bucket_start, WaterQualityDaily.sample_count
+    ).outerjoin(
+        WaterQualityDayArchive,
+        db.and_(
+            WaterQualityDayArchive.pond_id == WaterQualityDaily.pond_id,
+            WaterQualityDayArchive.day == db.func.date(WaterQualityDaily.bucket_start)
+        )
+    ).filter(
+        WaterQualityDaily.metric == 'temperature',
+        WaterQualityDaily.bucket_start < _day_start(today),
+        db.or_(
+            WaterQualityDayArchive.pond_id.is_(None),
+            WaterQualityDayArchive.row_count != WaterQualityDaily.sample_count
+        )
+    ).all()
+
+    written = 0
+    for pond_id, bucket_start, count in pending:
+        day = bucket_start.date()
+        if write_day_archive(pond_id, day):
+            written += 1
+        else:
+            _mark_unrecoverable(pond_id, day, count)
+    return written
+
+
+def _mark_unrecoverable(pond_id, day, count):
+    """登记原始数据已删除的天（已有的归档文件保留，但不再用于读取）"""
+    archive = db.session.get(WaterQualityDayArchive, (pond_id, day))
+    if archive is None:
+        archive = WaterQualityDayArchive(
+            pond_id=pond_id, day=day, file_name=_archive_file_name(pond_id, day), row_count=count
+        )
+        db.session.add(archive)
+    archive.row_count = count
+    archive.unrecoverable = True
+    db.session.commit()
+
+
+def _archive_file_name(pond_id, day):
+    return os.path.join(f'pond_{pond_id}', f'{day.isoformat()}.arrow')
+
+
+def write_day_archive(pond_id, day):
+    """写出一个塘口一天的列式归档文件，返回写出的记录数（当天在SQLite中无数据时返回0）"""
+    start = _day_start(day)
+    columns = ['timestamp'] + METRIC_FIELDS
+    values = {column: [] for column in columns}
+    for row in iter_water_quality(columns, start, start + timedelta(days=1), [pond_id]):
+        for column, value in zip(columns, row):
+            values[column].append(value)
+
+    row_count = len(values['timestamp'])
+    if not row_count:
+        # 原始数据已按保留策略删除，保留已有的归档文件
+        return 0
+
+    table = pa.table(values, schema=ARCHIVE_SCHEMA)
+    file_name = _archive_file_name(pond_id, day)
+    path = os.path.join(archive_dir(), file_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # 先写临时文件再改名，正在读取旧文件的请求不受影响
+    temp_path = path + '.tmp'
+    options = ipc.IpcWriteOptions(compression=current_app.config.get('COLUMNAR_ARCHIVE_COMPRESSION', 'zstd'))
+    with pa.OSFile(temp_path, 'wb') as sink:
+        with ipc.new_file(sink, ARCHIVE_SCHEMA, options=options) as writer:
+            writer.write_table(table)
+    os.replace(temp_path, path)
+
+    archive = db.session.get(WaterQualityDayArchive, (pond_id, day))
+    if archive is None:
+        archive = WaterQualityDayArchive(pond_id=pond_id, day=day, file_name=file_name, row_count=row_count)
+        db.session.add(archive)
+    else:
+        archive.row_count = row_count
+        archive.unrecoverable = None
+        archive.created_at = datetime.now()
+    db.session.commit()
+    return row_count
+
+
+# ---------------------------------------------------------------------------
+# 读取：归档天走内存映射的列式文件，其余时间段走SQLite，按时间顺序拼接
+# ---------------------------------------------------------------------------
+
+def iter_pond_history(pond_id, columns, start_time, end_time=None):
+    """按时间顺序读取塘口的原始水质记录 (columns...)
+
+    已归档且与天汇总计数一致的天从列式文件读取，其余时间段（近期数据、
+    有迟到读数的天）从SQLite读取。columns 须以 timestamp 开头。
+    """
+    columns = list(columns)
+    make_row = point_type(columns)
+    for file_name, segment_start, segment_end in _history_segments(pond_id, start_time, end_time):
+        if file_name is None:
+            yield from iter_water_quality(columns, segment_start, segment_end, [pond_id])
+        else:
+            values = [column.to_pylist() for column in _read_archive_columns(file_name, columns, segment_start, segment_end)]
+            for row in zip(*values):
+                yield make_row(*row)
+
+
+def load_pond_history_columns(pond_id, columns, start_time, end_time=None):
+    """按列读取塘口的原始水质记录，返回 {列名: 值列表}（数据源与 iter_pond_history 相同）
+
+    归档天的列整列从Arrow转换后拼接，不逐行组装记录，供按列输出的接口使用。
+    """
+    columns = list(columns)
+    values = {column: [] for column in columns}
+    for file_name, segment_start, segment_end in _history_segments(pond_id, start_time, end_time):
+        if file_name is None:
+            rows = list(iter_water_quality(columns, segment_start, segment_end, [pond_id]))
+            for column, column_values in zip(columns, zip(*rows)):
+                values[column].extend(column_values)
+        else:
+            archive_columns = _read_archive_columns(file_name, columns, segment_start, segment_end)
+            for column, column_values in zip(columns, archive_columns):
+                values[column].extend(column_values.to_pylist())
+    return values
+
+
+def _history_segments(pond_id, start_time, end_time):
+    """把时间范围拆成按时间顺序的读取段，返回 [(归档文件或None, 开始, 结束)]，None 表示从SQLite读取"""
+    if end_time is not None and start_time >= end_time:
+        return []
+
+    days = {}
+    if columnar_available():
+        days = _current_archived_days(pond_id, start_time, end_time or datetime.now())
+
+    segments = []
+    cursor = start_time
+    for day in sorted(days):
+        day_start = max(_day_start(day), start_time)
+        day_end = _day_start(day) + timedelta(days=1)
+        if end_time is not None:
+            day_end = min(day_end, end_time)
+        if cursor < day_start:
+            segments.append((None, cursor, day_start))
+        segments.append((days[day], day_start, day_end))
+        cursor = day_end
+
+    if end_time is None or cursor < end_time:
+        segments.append((None, cursor, end_time))
+    return segments
+
+
+def _current_archived_days(pond_id, start_time, end_time):
+    """时间范围内归档文件仍然完整（记录数与天汇总一致）的天，返回 {day: 文件相对路径}"""
+    first_day = start_time.date()
+    last_day = end_time.date()
+
+    archives = db.session.query(
+        WaterQualityDayArchive.day, WaterQualityDayArchive.file_name, WaterQualityDayArchive.row_count
+    ).filter(
+        WaterQualityDayArchive.pond_id == pond_id,
+        WaterQualityDayArchive.unrecoverable.isnot(True),
+        WaterQualityDayArchive.day >= first_day,
+        WaterQualityDayArchive.day <= last_day
+    ).all()
+    if not archives:
+        return {}
+
+    counts = {
+        bucket_start.date(): count
+        for bucket_start, count in db.session.query(
+            WaterQualityDaily.bucket_start, WaterQualityDaily.sample_count
+        ).filter(
+            WaterQualityDaily.pond_id == pond_id,
+            WaterQualityDaily.metric == 'temperature',
+            WaterQualityDaily.bucket_start >= _day_start(first_day),
+            WaterQualityDaily.bucket_start <= _day_start(last_day)
+        )
+    }
+    return {
+        day: file_name
+        for day, file_name, row_count in archives
+        if counts.get(day) == row_count
+    }
+
+
+def _read_archive_columns(file_name, columns, start_time, end_time):
+    """以内存映射方式读取归档文件，按时间范围过滤并投影列，返回各列的Arrow数组"""
+    path = os.path.join(archive_dir(), file_name)
+    with pa.memory_map(path, 'r') as source:
+        table = ipc.open_file(source).read_all().select(columns)
+        timestamps = table.column('timestamp')
+        mask = pc.and_(
+            pc.greater_equal(timestamps, pa.scalar(start_time, type=pa.timestamp('us'))),
+            pc.less(timestamps, pa.scalar(end_time, type=pa.timestamp('us')))
+        )
+        # 过滤结果为新分配的内存，映射关闭后仍可使用
+        return table.filter(mask).columns
@@ -0,0 +1,84 @@
+import hashlib
+from datetime import timezone
+from functools import wraps
+from flask import Response, request, make_response
+from models import db, Pond, WaterQuality
+
+
+def latest_reading_markers(pond_ids=None):
+    """各塘口最新读数的 (id, timestamp)，没有读数的塘口为 (None, None)
+
+    与 latest_rows_by_pond 相同的关联子查询，但只取ID和时间，
+    每个塘口只需在 (pond_id, timestamp) 索引上定位一次。
+    """
+    latest_id = db.session.query(WaterQuality.id).filter(
+        WaterQuality.pond_id == Pond.id
+    ).order_by(WaterQuality.timestamp.desc(), WaterQuality.id.desc()).limit(1).correlate(Pond).scalar_subquery()
+
+    query = db.session.query(Pond.id, WaterQuality.id, WaterQuality.timestamp).outerjoin(
+        WaterQuality, WaterQuality.id == latest_id
+    )
+    if pond_ids is not None:
+        query = query.filter(Pond.id.in_(list(pond_ids)))
+
+    return {pond_id: (reading_id, timestamp) for pond_id, reading_id, timestamp in query.all()}
+
+
+def water_quality_validators(pond_ids=None, window_start=None):
+    """根据各塘口最新读数生成 (ETag, Last-Modified)
+
+    有新读数写入时最新读数的ID随之变化。时间早于塘口最新读数的迟到记录
+    不改变验证器，在该塘口下一条新读数到达时一并生效。
+
+    window_start 为随当前时间滑动的查询窗口起点（调用方按响应分辨率取整），
+    窗口前移后即使没有新读数，验证器也会变化。
+    """
+    markers = latest_reading_markers(pond_ids)
+    key = repr((sorted(markers.items()), window_start))
+    etag = hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+    timestamps = [timestamp for _, timestamp in markers.values() if timestamp is not None]
+    if window_start is not None:
+        timestamps.append(window_start)
+    last_modified = None
+    if timestamps:
+        # 读数时间为服务器本地时间，HTTP日期需要UTC
+        last_modified = max(timestamps).astimezone(timezone.utc).replace(microsecond=0)
+    return etag, last_modified
+
+
+def is_not_modified(etag, last_modified):
+    """请求头中的验证器是否与当前数据一致（有 If-None-Match 时以它为准）"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def conditional(validators):
+    """为GET接口添加 ETag/Last-Modified 条件请求支持
+
+    validators 以视图参数调用，返回 (etag, last_modified)；与请求头匹配时
+    直接返回304，不执行视图。ETag为弱验证器：数据相同时响应中的模拟数据等
+    细节可能不同。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, last_modified = validators(*args, **kwargs)
+            if is_not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # 允许浏览器保存响应，但每次使用前都需要向服务器验证
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,110 @@
+import math
+
+# 单条序列允许返回的最大点数，保证长时间范围的响应体积有上限
+MAX_SERIES_POINTS = 2000
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+
+def lttb_indices(xs, ys, threshold):
+    """最大三角形三桶算法（Largest-Triangle-Three-Buckets）
+
+    在保持曲线形状的前提下，从 (xs, ys) 中选出 threshold 个点，返回所选点的下标。
+    """
+    length = len(xs)
+    if threshold >= length or threshold < 3:
+        return list(range(length))
+
+    selected = [0]
+    bucket_size = (length - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # 下一个桶的平均点
+        avg_start = int(math.floor((i + 1) * bucket_size)) + 1
+        avg_end = min(int(math.floor((i + 2) * bucket_size)) + 1, length)
+        avg_count = avg_end - avg_start
+        avg_x = sum(xs[avg_start:avg_end]) / avg_count
+        avg_y = sum(ys[avg_start:avg_end]) / avg_count
+
+        # 当前桶中与上一个选中点、下一个桶平均点组成最大三角形的点
+        range_start = int(math.floor(i * bucket_size)) + 1
+        range_end = int(math.floor((i + 1) * bucket_size)) + 1
+        point_ax = xs[a]
+        point_ay = ys[a]
+
+        max_area = -1.0
+        max_index = range_start
+        for j in range(range_start, range_end):
+            area = abs(
+                (point_ax - avg_x) * (ys[j] - point_ay) -
+                (point_ax - xs[j]) * (avg_y - point_ay)
+            )
+            if area > max_area:
+                max_area = area
+                max_index = j
+
+        selected.append(max_index)
+        a = max_index
+
+    selected.append(length - 1)
+    return selected
+
+
+def minmax_indices(xs, ys, threshold):
+    """按桶保留最小值和最大值点，返回所选点的下标（约 threshold 个）"""
+    length = len(xs)
+    if threshold >= length or threshold < 4:
+        return list(range(length))
+
+    bucket_count = threshold // 2
+    bucket_size = length / bucket_count
+    selected = []
+
+    for i in range(bucket_count):
+        start = int(i * bucket_size)
+        end = min(int((i + 1) * bucket_size), length)
+        if start >= end:
+            continue
+        min_index = min(range(start, end), key=ys.__getitem__)
+        max_index = max(range(start, end), key=ys.__getitem__)
+        selected.extend(sorted({min_index, max_index}))
+
+    return selected
+
+
+def downsample_indices(xs, series, threshold, method='lttb'):
+    """对多项指标分别降采样，返回所有指标选中点下标的并集（升序）
+
+    xs 为时间轴数值（如时间戳秒数），series 为 {指标名: 数值列表}，
+    数值为 None 的点不参与该指标的降采样。点数预算在各指标间平分，
+    指标较多时每项至少保留算法所需的最少点数，并集超出 threshold 时
+    再均匀抽稀，因此返回的总点数不超过 threshold。
+    """
+    if len(xs) <= threshold or not series:
+        return list(range(len(xs)))
+
+    pick = minmax_indices if method == 'minmax' else lttb_indices
+    min_points = 4 if method == 'minmax' else 3
+    per_metric = max(threshold // len(series), min_points)
+    selected = set()
+
+    for values in series.values():
+        valid = [i for i, value in enumerate(values) if value is not None]
+        if not valid:
+            continue
+        picked = pick([xs[i] for i in valid], [values[i] for i in valid], per_metric)
+        selected.update(valid[i] for i in picked)
+
+    return _thin(sorted(selected), threshold)
+
+
+def _thin(indices, threshold):
+    """从升序下标中均匀保留 threshold 个（含首尾）"""
+    if len(indices) <= threshold:
+        return indices
+    if threshold <= 1:
+        return indices[:max(threshold, 0)]
+
+    step = (len(indices) - 1) / (threshold - 1)
+    return [indices[round(i * step)] for i in range(threshold)]
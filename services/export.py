@@ -0,0 +1,364 @@
+import atexit
+import csv
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from flask import Flask
+from models import db
+from services.water_quality import point_type
+from services.rollups import iter_rollup_points
+from services.columnar_archive import iter_pond_history
+from services.sqlite_tuning import profile_pragmas, init_sqlite_tuning
+
+# 导出任务中传给工作进程的塘口信息
+ExportPond = namedtuple('ExportPond', ['id', 'name', 'species'])
+
+# 工作进程需要的应用配置（数据库连接另行按只读方式传入）
+WORKER_CONFIG_PREFIXES = ('WATER_QUALITY_', 'COLUMNAR_ARCHIVE_')
+
+# 合并分块文件时每次读取的字符数
+CHUNK_BLOCK_SIZE = 64 * 1024
+
+
+# 导出文件的列名与水质指标字段对应关系
+EXPORT_METRIC_LABELS = {
+    'temperature': '水温(°C)',
+    'turbidity': '浊度(NTU)',
+    'conductivity': '电导率(μS/cm)',
+    'water_level': '水位(m)',
+    'dissolved_oxygen': '溶解氧(mg/L)',
+    'ph': 'pH值',
+    'cod': '化学需氧量(mg/L)',
+    'ammonia': '氨氮(mg/L)',
+    'heavy_metals': '重金属(mg/L)',
+    'residual_chlorine': '余氯(mg/L)',
+    'total_phosphorus': '总磷(mg/L)',
+    'total_nitrogen': '总氮(mg/L)',
+    'coliform': '大肠杆菌群(CFU/L)',
+    'algae': '藻类密度(个/L)',
+    'biotoxicity': '生物毒性(%)'
+}
+
+
+def export_column_labels(fields):
+    """导出文件的列名（按 fields 投影）"""
+    return ['塘口名称', '养殖品种', '记录时间'] + [EXPORT_METRIC_LABELS[field] for field in fields]
+
+
+def export_row(pond, wq, fields):
+    """将一条 (timestamp, 指标...) 记录转换为导出行"""
+    row = {
+        '塘口名称': pond.name,
+        '养殖品种': pond.species,
+        '记录时间': wq[0].strftime('%Y-%m-%d %H:%M:%S')
+    }
+    for index, field in enumerate(fields, start=1):
+        row[EXPORT_METRIC_LABELS[field]] = wq[index]
+    return row
+
+
+def iter_export_water_qualities(pond, fields, start_time, now, days, granularity=None):
+    """逐批读取塘口的水质记录（列式归档 + SQLite服务端游标），没有真实数据时生成模拟数据
+
+    granularity 为 hour/day 时导出对应汇总表的桶均值。
+    """
+    if granularity:
+        query = iter_rollup_points(pond.id, start_time, now, granularity, fields)
+    else:
+        query = iter_pond_history(pond.id, ['timestamp'] + fields, start_time)
+    
+    has_data = False
+    for row in query:
+        has_data = True
+        yield row
+    
+    # 如果没有真实数据，生成模拟数据
+    if not has_data:
+        yield from _mock_export_water_qualities(pond, now, days, fields)
+
+
+def _mock_export_water_qualities(pond, now, days, fields):
+    """生成导出用的模拟水质数据，行结构与真实查询结果一致 (timestamp, 指标...)"""
+    make_row = point_type(['timestamp'] + fields)
+    if days <= 7:
+        # 7天及以内，按小时生成数据
+        hours = days * 24
+        time_points = [now - timedelta(hours=hours-i) for i in range(hours)]
+    else:
+        # 超过7天，按天生成数据（每天取中午12点的数据）
+        time_points = [
+            (now - timedelta(days=days-i)).replace(hour=12, minute=0, second=0, microsecond=0)
+            for i in range(days)
+        ]
+    
+    for time_point in time_points:
+        # 根据塘口类型模拟不同的基础数据
+        if pond.species == "南美白对虾":
+            base_temp = 28 + random.uniform(-2, 2)
+            base_do = 6.5 + random.uniform(-1.0, 1.0)
+            base_ph = 8.0 + random.uniform(-0.3, 0.3)
+            base_ammonia = 0.15 + random.uniform(-0.05, 0.1)
+        else:  # 草鱼
+            base_temp = 24 + random.uniform(-2, 2)
+            base_do = 7.0 + random.uniform(-1.0, 1.5)
+            base_ph = 7.5 + random.uniform(-0.5, 0.5)
+            base_ammonia = 0.2 + random.uniform(-0.1, 0.2)
+        
+        if days <= 7:
+            # 模拟夜间溶解氧下降
+            if time_point.hour >= 0 and time_point.hour <= 6:
+                base_do -= random.uniform(0.8, 1.8)
+            
+            # 模拟午后温度升高
+            if time_point.hour >= 12 and time_point.hour <= 15:
+                base_temp += random.uniform(1, 3)
+            
+            # 模拟投喂后氨氮升高
+            if time_point.hour in [9, 10] or time_point.hour in [18, 19]:
+                base_ammonia += random.uniform(0.1, 0.3)
+        elif random.random() < 0.05:
+            # 模拟一些天的水质异常情况
+            if random.random() < 0.5:
+                base_do -= random.uniform(1.5, 2.5)
+            else:
+                base_ph += random.uniform(0.8, 1.2)
+        
+        values = {
+            'temperature': round(base_temp, 1),
+            'turbidity': round(random.uniform(5, 25), 1),
+            'conductivity': round(random.uniform(300, 800), 0),
+            'water_level': round(random.uniform(1.5, 2.5), 2),
+            'dissolved_oxygen': round(max(3.0, base_do), 1),
+            'ph': round(max(6.5, min(9.0, base_ph)), 1),
+            'cod': round(random.uniform(10, 30), 1),
+            'ammonia': round(max(0, base_ammonia), 2),
+            'heavy_metals': round(random.uniform(0.01, 0.1), 3),
+            'residual_chlorine': round(random.uniform(0.1, 0.5), 2),
+            'total_phosphorus': round(random.uniform(0.1, 0.5), 2),
+            'total_nitrogen': round(random.uniform(0.5, 2.0), 2),
+            'coliform': round(random.uniform(100, 1000), 0),
+            'algae': round(random.uniform(1000, 10000), 0),
+            'biotoxicity': round(random.uniform(5, 20), 1)
+        }
+        yield make_row(time_point, *[values[field] for field in fields])
+
+
+def write_chunk(task):
+    """导出一个塘口的全部记录到分块文件，返回 (文件路径, 记录数)
+
+    task 为 (ExportPond, fields, start_time, now, days, granularity, 分块格式, 目录)，分块格式：
+    csv 为不含表头的CSV行，csv_file 为含BOM和表头的完整CSV文件，ndjson 为每行一个JSON对象。
+    在工作进程中通过其只读连接读取，也可以在请求线程中直接调用。
+    """
+    pond, fields, start_time, now, days, granularity, chunk_format, directory = task
+    path = os.path.join(directory, f'{pond.id}.{"ndjson" if chunk_format == "ndjson" else "csv"}')
+    count = 0
+
+    with open(path, 'w', encoding='utf-8', newline='') as output:
+        if chunk_format == 'ndjson':
+            for wq in iter_export_water_qualities(pond, fields, start_time, now, days, granularity):
+                output.write(json.dumps(export_row(pond, wq, fields), ensure_ascii=False))
+                output.write('\n')
+                count += 1
+        else:
+            writer = csv.DictWriter(output, fieldnames=export_column_labels(fields))
+            if chunk_format == 'csv_file':
+                output.write('\ufeff')
+                writer.writeheader()
+            for wq in iter_export_water_qualities(pond, fields, start_time, now, days, granularity):
+                writer.writerow(export_row(pond, wq, fields))
+                count += 1
+
+    return path, count
+
+
+def chunk_lines(path):
+    """逐行读取分块文件（不含行尾换行符）"""
+    with open(path, encoding='utf-8', newline='') as chunk:
+        for line in chunk:
+            yield line.rstrip('\n')
+
+
+def chunk_blocks(path, block_size=CHUNK_BLOCK_SIZE):
+    """按块读取分块文件，用于直接拼接到流式响应中"""
+    with open(path, encoding='utf-8', newline='') as chunk:
+        while True:
+            block = chunk.read(block_size)
+            if not block:
+                break
+            yield block
+
+
+_worker_context = None
+
+
+def _init_worker(config):
+    # 工作进程只创建最小的应用：只读数据库连接和导出读取所需的配置，不执行建表和演示数据初始化
+    global _worker_context
+    app = Flask(__name__)
+    app.config.update(config)
+    db.init_app(app)
+    init_sqlite_tuning(app, db)
+    _worker_context = app.app_context()
+    _worker_context.push()
+
+
+def _ping():
+    # 预启动进程池时提交的空任务，确保工作进程完成导入和初始化
+    return os.getpid()
+
+
+def _remove_when_done(directory, futures):
+    """等仍在运行的分块任务结束后再删除临时目录"""
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_future):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        shutil.rmtree(directory, ignore_errors=True)
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+class ExportPool:
+    """多塘口导出的进程池
+
+    按塘口分片：每个工作进程用自己的只读SQLite连接读取一个塘口的记录，写成
+    临时目录中的分块文件，请求线程按塘口顺序合并分块。同一时间最多提交与进程数
+    相同数量的塘口，客户端断开时取消尚未开始的任务。进程池在第一次使用时创建
+    （打开数据页面时可由 start 在后台预先启动，导入应用时不启动）并常驻，默认
+    使用 spawn 方式启动，避免复制请求进程中其他线程持有的锁。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.processes = 1
+        self.start_method = 'spawn'
+        self.prestart = True
+        self._executor = None
+        self._starting = False
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.processes = app.config.get('EXPORT_PROCESSES') or min(4, os.cpu_count() or 1)
+        self.start_method = app.config.get('EXPORT_START_METHOD', 'spawn')
+        self.prestart = app.config.get('EXPORT_PRESTART', True)
+        app.extensions['export_pool'] = self
+        atexit.register(self.shutdown)
+
+    def parallel(self, pond_count):
+        """是否使用进程池：多个塘口、配置了多个进程且数据库为文件（内存数据库无法跨进程共享）"""
+        database = db.engine.url.database
+        return self.processes > 1 and pond_count > 1 and bool(database) and database != ':memory:'
+
+    def _worker_config(self):
+        config = {
+            key: value for key, value in self.app.config.items()
+            if key.startswith(WORKER_CONFIG_PREFIXES)
+        }
+        path = os.path.abspath(db.engine.url.database)
+        config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///file:{path}?mode=ro&uri=true'
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = self.app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+        # 与主进程相同的SQLite调优参数（busy_timeout、页缓存等）；只读连接不能切换日志模式，
+        # WAL模式已由主进程写入数据库文件
+        pragmas = profile_pragmas(self.app.config.get('SQLITE_PROFILE', 'default'), self.app.config.get('SQLITE_PRAGMAS'))
+        pragmas.pop('journal_mode', None)
+        config['SQLITE_PROFILE'] = 'default'
+        config['SQLITE_PRAGMAS'] = pragmas
+        return config
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                    initargs=(self._worker_config(),)
+                )
+            return self._executor
+
+    def start(self):
+        """在后台线程中启动工作进程，避免第一次并行导出的请求等待进程启动（重复调用无副作用）"""
+        with self._lock:
+            if not self.prestart or self.processes <= 1 or self._executor is not None or self._starting:
+                return
+            self._starting = True
+        thread = threading.Thread(target=self._prestart, name='export-pool-start', daemon=True)
+        thread.start()
+
+    def _prestart(self):
+        try:
+            with self.app.app_context():
+                if not self.parallel(2):
+                    return
+                executor = self._get_executor()
+            executor.submit(_ping).result()
+        except Exception as e:
+            print(f"预启动导出进程池出错: {str(e)}")
+        finally:
+            self._starting = False
+
+    def chunks(self, ponds, fields, start_time, now, days, granularity, chunk_format):
+        """按塘口顺序生成 (塘口, 分块文件路径, 记录数)，生成器结束或关闭时删除临时目录
+
+        使用进程池时各塘口并行导出，否则在当前线程中依次导出。
+        """
+        directory = tempfile.mkdtemp(prefix='export_')
+        tasks = [
+            (ExportPond(pond.id, pond.name, pond.species), fields, start_time, now, days, granularity,
+             chunk_format, directory)
+            for pond in ponds
+        ]
+        if not self.parallel(len(tasks)):
+            try:
+                for task in tasks:
+                    path, count = write_chunk(task)
+                    yield task[0], path, count
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            return
+
+        executor = self._get_executor()
+        pending = deque()
+        next_task = 0
+        try:
+            while pending or next_task < len(tasks):
+                # 最多保持与进程数相同的在途任务，消费一个再补交一个
+                while next_task < len(tasks) and len(pending) < self.processes:
+                    task = tasks[next_task]
+                    pending.append((task[0], executor.submit(write_chunk, task)))
+                    next_task += 1
+                pond, future = pending.popleft()
+                path, count = future.result()
+                yield pond, path, count
+        finally:
+            running = [future for _, future in pending if not future.cancel()]
+            if running:
+                _remove_when_done(directory, running)
+            else:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 全局导出进程池，在app.py中通过 init_app 绑定应用
+export_pool = ExportPool()
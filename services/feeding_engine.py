@@ -0,0 +1,238 @@
+import random
+from datetime import datetime, timedelta
+from models import db, Pond, FeedingRecord, FeedingDecision
+from services.water_quality import latest_rows_by_pond, latest_water_quality_by_pond
+
+# numpy为可选依赖，未安装时逐个塘口调用 calculate_feeding_amount（结果相同）
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 投喂决策使用的水质指标
+FEEDING_METRICS = ('temperature', 'dissolved_oxygen', 'ph', 'ammonia')
+
+
+def mock_water_quality():
+    """没有水质数据的塘口使用的模拟水质"""
+    return {
+        'temperature': round(random.uniform(20, 30), 1),
+        'dissolved_oxygen': round(random.uniform(4, 8), 1),
+        'ph': round(random.uniform(6.5, 8.5), 1),
+        'ammonia': round(random.uniform(0.1, 0.5), 2)
+    }
+
+
+def calculate_feeding_amount(pond, water_quality, latest_feeding, now=None):
+    """计算推荐投喂量（单个塘口；批量计算见 recommend_feeding_amounts，两者结果相同）"""
+    # 基础投喂量（根据塘口面积和养殖品种）
+    base_amount = pond.area * 2.0  # 基础投喂量：2kg/亩
+    
+    # 根据水质条件调整
+    # 溶解氧影响
+    do_factor = 1.0
+    if water_quality['dissolved_oxygen'] < 4.0:
+        do_factor = 0.7  # 溶解氧低，减少投喂
+    elif water_quality['dissolved_oxygen'] > 7.0:
+        do_factor = 1.2  # 溶解氧高，增加投喂
+    
+    # 温度影响
+    temp_factor = 1.0
+    if water_quality['temperature'] < 20:
+        temp_factor = 0.8  # 温度低，减少投喂
+    elif water_quality['temperature'] > 28:
+        temp_factor = 0.9  # 温度高，减少投喂
+    
+    # pH影响
+    ph_factor = 1.0
+    if water_quality['ph'] < 7.0 or water_quality['ph'] > 8.5:
+        ph_factor = 0.9  # pH不适宜，减少投喂
+    
+    # 氨氮影响
+    ammonia_factor = 1.0
+    if water_quality['ammonia'] > 0.4:
+        ammonia_factor = 0.8  # 氨氮高，减少投喂
+    
+    # 综合调整系数
+    total_factor = do_factor * temp_factor * ph_factor * ammonia_factor
+    
+    # 考虑上次投喂量和时间
+    time_factor = 1.0
+    if latest_feeding:
+        hours_since_last_feeding = ((now or datetime.now()) - latest_feeding.time).total_seconds() / 3600
+        if hours_since_last_feeding < 6:
+            time_factor = 0.5  # 距离上次投喂时间短，减少投喂
+        elif hours_since_last_feeding > 24:
+            time_factor = 1.2  # 距离上次投喂时间长，增加投喂
+    
+    # 计算最终推荐投喂量
+    recommended_amount = base_amount * total_factor * time_factor
+    
+    # 限制在合理范围内
+    recommended_amount = max(0.5, min(recommended_amount, pond.area * 5.0))
+    
+    return round(recommended_amount, 1)
+
+def generate_feeding_reasoning(pond, water_quality, recommended_amount, latest_feeding, now=None):
+    """生成投喂决策依据"""
+    reasoning = f"基于{pond.name}（面积：{pond.area}亩，品种：{pond.species}）的当前水质条件分析：\n\n"
+    
+    # 分析溶解氧
+    if water_quality['dissolved_oxygen'] < 4.0:
+        reasoning += f"• 溶解氧偏低（{water_quality['dissolved_oxygen']}mg/L），鱼类代谢减慢，建议减少投喂量30%\n"
+    elif water_quality['dissolved_oxygen'] > 7.0:
+        reasoning += f"• 溶解氧充足（{water_quality['dissolved_oxygen']}mg/L），鱼类代谢活跃，可适当增加投喂量20%\n"
+    else:
+        reasoning += f"• 溶解氧适宜（{water_quality['dissolved_oxygen']}mg/L），鱼类代谢正常\n"
+    
+    # 分析温度
+    if water_quality['temperature'] < 20:
+        reasoning += f"• 水温偏低（{water_quality['temperature']}℃），鱼类食欲下降，建议减少投喂量20%\n"
+    elif water_quality['temperature'] > 28:
+        reasoning += f"• 水温偏高（{water_quality['temperature']}℃），鱼类应激增加，建议减少投喂量10%\n"
+    else:
+        reasoning += f"• 水温适宜（{water_quality['temperature']}℃），鱼类食欲正常\n"
+    
+    # 分析pH
+    if water_quality['ph'] < 7.0 or water_quality['ph'] > 8.5:
+        reasoning += f"• pH值不适宜（{water_quality['ph']}），鱼类消化受影响，建议减少投喂量10%\n"
+    else:
+        reasoning += f"• pH值适宜（{water_quality['ph']}），鱼类消化正常\n"
+    
+    # 分析氨氮
+    if water_quality['ammonia'] > 0.4:
+        reasoning += f"• 氨氮偏高（{water_quality['ammonia']}mg/L），水质较差，建议减少投喂量20%\n"
+    else:
+        reasoning += f"• 氨氮正常（{water_quality['ammonia']}mg/L），水质良好\n"
+    
+    # 分析上次投喂
+    if latest_feeding:
+        hours_since_last_feeding = ((now or datetime.now()) - latest_feeding.time).total_seconds() / 3600
+        if hours_since_last_feeding < 6:
+            reasoning += f"• 距离上次投喂仅{hours_since_last_feeding:.1f}小时，塘内仍有残饵，建议大幅减少投喂量\n"
+        elif hours_since_last_feeding > 24:
+            reasoning += f"• 距离上次投喂已超过{hours_since_last_feeding:.1f}小时，鱼类可能饥饿，可适当增加投喂量\n"
+        else:
+            reasoning += f"• 距离上次投喂{hours_since_last_feeding:.1f}小时，投喂间隔适宜\n"
+    else:
+        reasoning += "• 无最近投喂记录，按照标准投喂量计算\n"
+    
+    reasoning += f"\n综合以上因素，推荐投喂量为{recommended_amount}kg。"
+    
+    return reasoning
+
+
+def load_feeding_state(pond_ids=None):
+    """以少量集合查询读取各塘口计算投喂决策所需的最新状态
+
+    返回 {'ponds': [塘口行], 'water_quality': {pond_id: 行}, 'latest_feeding': {pond_id: 行},
+    'latest_decision': {pond_id: 行}}，各行为只含所需列的行元组。
+    """
+    query = db.select(Pond.id, Pond.name, Pond.area, Pond.species).order_by(Pond.id)
+    if pond_ids is not None:
+        pond_ids = list(pond_ids)
+        query = query.where(Pond.id.in_(pond_ids))
+
+    return {
+        'ponds': db.session.execute(query).all(),
+        'water_quality': latest_water_quality_by_pond(pond_ids, columns=FEEDING_METRICS),
+        'latest_feeding': latest_rows_by_pond(
+            FeedingRecord, FeedingRecord.time, pond_ids,
+            columns=[FeedingRecord.time, FeedingRecord.amount]),
+        'latest_decision': latest_rows_by_pond(
+            FeedingDecision, FeedingDecision.created_at, pond_ids,
+            columns=[FeedingDecision.id, FeedingDecision.applied, FeedingDecision.created_at]),
+    }
+
+
+def load_day_feedings(day, pond_ids=None):
+    """指定日期各塘口的投喂记录 {pond_id: [(pond_id, time, amount) 行，按时间升序]}，一次范围查询"""
+    day_start = datetime.combine(day, datetime.min.time())
+    query = db.select(FeedingRecord.pond_id, FeedingRecord.time, FeedingRecord.amount).where(
+        FeedingRecord.time >= day_start, FeedingRecord.time < day_start + timedelta(days=1)
+    ).order_by(FeedingRecord.pond_id, FeedingRecord.time)
+    if pond_ids is not None:
+        query = query.where(FeedingRecord.pond_id.in_(list(pond_ids)))
+
+    feedings = {}
+    for row in db.session.execute(query):
+        feedings.setdefault(row.pond_id, []).append(row)
+    return feedings
+
+
+def recommend_feeding_amounts(area, temperature, dissolved_oxygen, ph, ammonia, hours_since_feeding):
+    """批量计算推荐投喂量，参数为各塘口对应的数组（距上次投喂的小时数，无投喂记录为NaN）
+
+    各系数的取值和乘法顺序与 calculate_feeding_amount 完全一致，最后按相同方式
+    保留一位小数，返回推荐投喂量列表。
+    """
+    area = np.asarray(area, dtype=float)
+    dissolved_oxygen = np.asarray(dissolved_oxygen, dtype=float)
+    temperature = np.asarray(temperature, dtype=float)
+    ph = np.asarray(ph, dtype=float)
+    ammonia = np.asarray(ammonia, dtype=float)
+    hours = np.asarray(hours_since_feeding, dtype=float)
+
+    base_amount = area * 2.0
+    do_factor = np.where(dissolved_oxygen < 4.0, 0.7, np.where(dissolved_oxygen > 7.0, 1.2, 1.0))
+    temp_factor = np.where(temperature < 20, 0.8, np.where(temperature > 28, 0.9, 1.0))
+    ph_factor = np.where((ph < 7.0) | (ph > 8.5), 0.9, 1.0)
+    ammonia_factor = np.where(ammonia > 0.4, 0.8, 1.0)
+    total_factor = do_factor * temp_factor * ph_factor * ammonia_factor
+
+    # NaN（无投喂记录）与任何数比较都为False，时间系数为1.0
+    with np.errstate(invalid='ignore'):
+        time_factor = np.where(hours < 6, 0.5, np.where(hours > 24, 1.2, 1.0))
+
+    recommended = base_amount * total_factor * time_factor
+    recommended = np.maximum(0.5, np.minimum(recommended, area * 5.0))
+
+    return round_amounts(recommended)
+
+
+def round_amounts(amounts):
+    """按Python round(x, 1)的规则保留一位小数，返回列表
+
+    np.round 先乘10再取整，只在 x*10 非常接近 .5 时可能与十进制正确舍入的
+    round 不同，这些位置改用 round 重新计算，其余位置两者结果相同。
+    """
+    scaled = amounts * 10
+    rounded = (np.rint(scaled) / 10).tolist()
+    for i in np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6).tolist():
+        rounded[i] = round(float(amounts[i]), 1)
+    return rounded
+
+
+def feeding_recommendations(state, default_water_quality, now=None):
+    """为 state 中的全部塘口计算推荐投喂量
+
+    default_water_quality 为没有水质数据的塘口提供水质字典的函数。返回与
+    state['ponds'] 顺序一致的列表，每项为 (塘口行, 水质字典, 最近投喂行或None, 推荐投喂量)。
+    """
+    now = now or datetime.now()
+    ponds = state['ponds']
+    latest_water_quality = state['water_quality']
+    latest_feeding = state['latest_feeding']
+
+    water_quality = []
+    feedings = [latest_feeding.get(pond.id) for pond in ponds]
+    for pond in ponds:
+        latest = latest_water_quality.get(pond.id)
+        # 行元组为 (pond_id, *FEEDING_METRICS)
+        water_quality.append(default_water_quality() if latest is None else dict(zip(FEEDING_METRICS, latest[1:])))
+
+    if np is None or not ponds:
+        amounts = [calculate_feeding_amount(pond, quality, feeding, now)
+                   for pond, quality, feeding in zip(ponds, water_quality, feedings)]
+    else:
+        count = len(ponds)
+        amounts = recommend_feeding_amounts(
+            np.fromiter((pond.area for pond in ponds), dtype=float, count=count),
+            *(np.fromiter((quality[metric] for quality in water_quality), dtype=float, count=count)
+              for metric in FEEDING_METRICS),
+            # 与 calculate_feeding_amount 相同的计算方式，无投喂记录为NaN
+            np.fromiter(((now - feeding.time).total_seconds() / 3600 if feeding else np.nan
+                         for feeding in feedings), dtype=float, count=count)
+        )
+
+    return list(zip(ponds, water_quality, feedings, amounts))
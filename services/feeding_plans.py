@@ -0,0 +1,244 @@
+import json
+import threading
+from datetime import datetime, time
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, Pond, FeedingRecord, FeedingDecision
+from services.ingest import on_readings_inserted
+from services.cache import response_cache
+from services.feeding_engine import (FEEDING_METRICS, load_feeding_state, feeding_recommendations,
+                                     generate_feeding_reasoning, mock_water_quality)
+
+# 每天的投喂时段（小时），与原投喂方案的 8:00、14:00、20:00 一致
+DEFAULT_SLOT_HOURS = (8, 14, 20)
+
+# 各水质指标变化超过多少时重新计算方案（即使推荐投喂量变化在容差内）
+DEFAULT_INPUT_TOLERANCES = {
+    'temperature': 0.5,
+    'dissolved_oxygen': 0.3,
+    'ph': 0.1,
+    'ammonia': 0.05
+}
+
+
+class FeedingPlanner:
+    """每日投喂方案的后台预计算
+
+    每个塘口每天每个投喂时段一条 FeedingDecision 记录，推荐投喂量为该时段
+    分摊的份额（当日推荐总量按时段数平均分配）。读数写入、投喂记录或
+    塘口变更后把塘口标记为待更新，定时任务只为这些塘口（换日后为全部塘口）
+    批量计算方案；推荐投喂量的相对变化超过 FEEDING_PLAN_TOLERANCE、或水质
+    变化超过各指标容差时才更新尚未到时间且未应用的时段。查询接口只读取
+    已保存的方案。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.slot_hours = DEFAULT_SLOT_HOURS
+        self.tolerance = 0.05
+        self.input_tolerances = dict(DEFAULT_INPUT_TOLERANCES)
+        self._dirty = set()
+        self._planned_date = None  # 已为全部塘口计算过方案的日期
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('FEEDING_PLAN_ENABLED', True)
+        self.slot_hours = tuple(app.config.get('FEEDING_PLAN_SLOTS', DEFAULT_SLOT_HOURS))
+        self.tolerance = app.config.get('FEEDING_PLAN_TOLERANCE', 0.05)
+        self.input_tolerances.update(app.config.get('FEEDING_PLAN_INPUT_TOLERANCES') or {})
+        app.extensions['feeding_planner'] = self
+
+        on_readings_inserted(self.mark_readings)
+        event.listen(db.session, 'after_flush', _collect_plan_inputs)
+        event.listen(db.session, 'after_commit', self._mark_committed)
+        event.listen(db.session, 'after_rollback', _discard_plan_inputs)
+
+    # ------------------------------------------------------------------
+    # 待更新塘口
+    # ------------------------------------------------------------------
+
+    def mark_dirty(self, pond_ids):
+        with self._lock:
+            self._dirty.update(pond_ids)
+
+    def mark_readings(self, rows):
+        """读数写入后的回调"""
+        self.mark_dirty({row['pond_id'] for row in rows})
+
+    def _mark_committed(self, session):
+        pond_ids = session.info.pop('feeding_plan_ponds', None)
+        if pond_ids:
+            self.mark_dirty(pond_ids)
+
+    # ------------------------------------------------------------------
+    # 计算
+    # ------------------------------------------------------------------
+
+    def slot_times(self, day):
+        return [datetime.combine(day, time(hour)) for hour in self.slot_hours]
+
+    def slot_amount(self, daily_amount):
+        """当日推荐总量中每个时段的份额"""
+        return round(daily_amount / len(self.slot_hours), 1)
+
+    def refresh(self, now=None):
+        """定时任务：为待更新的塘口计算今日方案，换日后第一次执行时计算全部塘口"""
+        now = now or datetime.now()
+        today = now.date()
+        with self._lock:
+            if self._planned_date == today:
+                if not self._dirty:
+                    return {'ponds': 0, 'created': 0, 'updated': 0}
+                pond_ids = self._dirty
+            else:
+                pond_ids = None
+            self._dirty = set()
+
+        try:
+            result = self.plan(pond_ids, now)
+        except Exception:
+            if pond_ids is not None:
+                self.mark_dirty(pond_ids)
+            raise
+
+        if pond_ids is None:
+            self._planned_date = today
+        return result
+
+    def plan(self, pond_ids=None, now=None):
+        """计算并保存指定塘口（默认全部塘口）今天各时段的方案，返回新建和更新的条数"""
+        now = now or datetime.now()
+        today = now.date()
+        state = load_feeding_state(pond_ids)
+
+        # 没有水质数据的塘口使用模拟水质，同一次计算的各时段使用同一份
+        for pond in state['ponds']:
+            if pond.id not in state['water_quality']:
+                quality = mock_water_quality()
+                state['water_quality'][pond.id] = (pond.id, *(quality[metric] for metric in FEEDING_METRICS))
+
+        query = FeedingDecision.query.filter(FeedingDecision.plan_date == today)
+        if pond_ids is not None:
+            query = query.filter(FeedingDecision.pond_id.in_(list(pond_ids)))
+        existing = {(decision.pond_id, decision.slot): decision for decision in query}
+
+        new_rows = []
+        updated = 0
+        for slot, slot_time in enumerate(self.slot_times(today)):
+            # 未到时间的时段按计划投喂时间计算距上次投喂的间隔
+            at = max(now, slot_time)
+            for pond, water_quality, latest_feeding, daily_amount in feeding_recommendations(state, mock_water_quality, at):
+                amount = self.slot_amount(daily_amount)
+                decision = existing.get((pond.id, slot))
+                if decision is None:
+                    new_rows.append({
+                        'pond_id': pond.id,
+                        'plan_date': today,
+                        'slot': slot,
+                        'slot_time': slot_time,
+                        'recommended_amount': amount,
+                        'reasoning': generate_feeding_reasoning(pond, water_quality, amount, latest_feeding, at),
+                        'water_quality': json.dumps(water_quality),
+                        'created_at': now
+                    })
+                    continue
+                if decision.applied or slot_time <= now or not self._changed(decision, water_quality, amount):
+                    continue
+
+                updated += 1
+                decision.recommended_amount = amount
+                decision.reasoning = generate_feeding_reasoning(pond, water_quality, amount, latest_feeding, at)
+                decision.water_quality = json.dumps(water_quality)
+                decision.created_at = now
+
+        created = 0
+        if new_rows:
+            # 定时任务和查询接口（或其他工作进程）可能同时为同一塘口生成方案，
+            # 已有的 (方案日期, 塘口, 时段) 由唯一索引跳过，保留先写入的一条
+            statement = sqlite_insert(FeedingDecision).on_conflict_do_nothing(
+                index_elements=['plan_date', 'pond_id', 'slot']
+            )
+            created = db.session.connection().execute(statement, new_rows).rowcount
+
+        db.session.commit()
+        if created:
+            # Core 插入不经过ORM刷新事件，需要直接使这些塘口的响应缓存失效
+            response_cache.invalidate({row['pond_id'] for row in new_rows})
+        return {'ponds': len(state['ponds']), 'created': created, 'updated': updated}
+
+    def _changed(self, decision, water_quality, amount):
+        if abs(amount - decision.recommended_amount) > self.tolerance * decision.recommended_amount:
+            return True
+        previous = json.loads(decision.water_quality) if decision.water_quality else {}
+        for metric in FEEDING_METRICS:
+            if previous.get(metric) is None or abs(water_quality[metric] - previous[metric]) > self.input_tolerances[metric]:
+                return True
+        return False
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def today_plans(self, pond_ids=None, now=None):
+        """今天的方案 {pond_id: [各时段的 FeedingDecision]}
+
+        按 (plan_date, pond_id, slot) 索引读取；定时任务尚未计算的塘口
+        （刚启动或未启用调度器）在这里先计算一次。
+        """
+        now = now or datetime.now()
+        today = now.date()
+
+        plans = self._load_plans(today, pond_ids)
+        if pond_ids is None:
+            pond_ids = [pond_id for pond_id, in db.session.query(Pond.id).all()]
+        missing = [pond_id for pond_id in pond_ids if pond_id not in plans]
+        if missing:
+            self.plan(missing, now)
+            plans.update(self._load_plans(today, missing))
+        return plans
+
+    def _load_plans(self, day, pond_ids=None):
+        query = FeedingDecision.query.filter(FeedingDecision.plan_date == day)
+        if pond_ids is not None:
+            query = query.filter(FeedingDecision.pond_id.in_(list(pond_ids)))
+        plans = {}
+        for decision in query.order_by(FeedingDecision.pond_id, FeedingDecision.slot):
+            plans.setdefault(decision.pond_id, []).append(decision)
+        return plans
+
+
+def current_slot(decisions):
+    """方案中当前应执行的时段：第一个未应用的时段，全部已应用时为最后一个"""
+    for decision in decisions:
+        if not decision.applied:
+            return decision
+    return decisions[-1]
+
+
+def plan_water_quality(decision):
+    return json.loads(decision.water_quality) if decision.water_quality else None
+
+
+def _collect_plan_inputs(session, flush_context):
+    # 投喂记录和塘口信息是方案的输入，变更的塘口在事务提交后标记为待更新
+    pond_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, FeedingRecord):
+            pond_ids.add(obj.pond_id)
+        elif isinstance(obj, Pond):
+            pond_ids.add(obj.id)
+    if pond_ids:
+        session.info.setdefault('feeding_plan_ponds', set()).update(pond_ids)
+
+
+def _discard_plan_inputs(session):
+    session.info.pop('feeding_plan_ponds', None)
+
+
+# 全局投喂方案计算器，在app.py中通过 init_app 绑定应用
+feeding_planner = FeedingPlanner()
@@ -0,0 +1,185 @@
+import json
+from math import isfinite
+from datetime import datetime
+from models import db, Pond, WaterQuality
+from services.water_quality import METRIC_FIELDS
+from services.rollups import upsert_rollups
+
+# 有orjson时用它解析上传的读数，否则使用标准库json
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# 不允许为空的水质指标（与 WaterQuality 模型的 nullable=False 字段一致）
+REQUIRED_METRICS = ('temperature', 'ph', 'dissolved_oxygen', 'ammonia')
+
+# 单次请求允许提交的最大读数条数
+MAX_INGEST_BATCH = 100000
+
+INGEST_FIELDS = frozenset(['pond_id', 'timestamp'] + METRIC_FIELDS)
+
+# 批量插入语句（列顺序与 insert_readings 中的参数元组一致）
+_INSERT_COLUMNS = ['pond_id', 'timestamp'] + METRIC_FIELDS
+_INSERT_SQL = (
+    f"INSERT INTO {WaterQuality.__tablename__} ({', '.join(_INSERT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in _INSERT_COLUMNS)})"
+)
+
+
+# 读数写入（事务提交）后依次调用的回调，参数为本批写入的读数行
+_insert_listeners = []
+
+
+def on_readings_inserted(listener):
+    """注册读数写入后的回调（用于缓存失效等），可作为装饰器使用"""
+    _insert_listeners.append(listener)
+    return listener
+
+
+class IngestPayloadError(ValueError):
+    """请求体无法解析为读数批次"""
+
+
+def parse_ingest_payload(body, content_type):
+    """解析上传的读数批次，支持JSON数组和NDJSON（每行一个JSON对象）
+
+    返回 (读数列表, 解析失败的行)；NDJSON中无法解析的行作为拒绝项返回，
+    其下标与读数列表中的位置一致（该位置填 None）。
+    """
+    if isinstance(body, bytes) and body.startswith(b'\xef\xbb\xbf'):
+        body = body[3:]
+    mimetype = (content_type or '').split(';')[0].strip().lower()
+
+    if mimetype in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        items = []
+        rejects = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(_json_loads(line))
+            except ValueError as e:
+                rejects.append({'index': len(items), 'error': f'JSON解析失败: {e}'})
+                items.append(None)
+        return items, rejects
+
+    try:
+        payload = _json_loads(body)
+    except ValueError as e:
+        raise IngestPayloadError(f'JSON解析失败: {e}')
+
+    # 兼容 {"readings": [...]} 形式和单条读数
+    if isinstance(payload, dict):
+        payload = payload.get('readings', [payload])
+    if not isinstance(payload, list):
+        raise IngestPayloadError('请求体必须是读数数组')
+    return payload, []
+
+
+def validate_readings(items, pond_ids, now=None):
+    """按 WaterQuality 字段校验读数，返回 (可写入的行, 拒绝项)
+
+    可写入的行包含全部列（缺省指标为None），可直接用于批量插入；
+    拒绝项为 {'index': 下标, 'error': 原因}。
+    """
+    now = now or datetime.now()
+    rows = []
+    rejects = []
+
+    for index, item in enumerate(items):
+        if item is None:
+            continue
+        try:
+            rows.append(_validate_reading(item, pond_ids, now))
+        except ValueError as e:
+            rejects.append({'index': index, 'error': str(e)})
+
+    return rows, rejects
+
+
+def _validate_reading(item, pond_ids, now):
+    if not isinstance(item, dict):
+        raise ValueError('读数必须是JSON对象')
+
+    unknown = set(item) - INGEST_FIELDS
+    if unknown:
+        raise ValueError(f'未知字段: {", ".join(sorted(unknown))}')
+
+    pond_id = item.get('pond_id')
+    if isinstance(pond_id, bool) or not isinstance(pond_id, int):
+        raise ValueError('pond_id 必须是整数')
+    if pond_id not in pond_ids:
+        raise ValueError(f'塘口不存在: {pond_id}')
+
+    timestamp = item.get('timestamp')
+    if timestamp is None:
+        timestamp = now
+    elif isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f'时间格式错误: {timestamp}')
+        if timestamp.tzinfo is not None:
+            # 统一转换为服务器本地时间存储
+            timestamp = timestamp.astimezone().replace(tzinfo=None)
+    else:
+        raise ValueError('timestamp 必须是ISO 8601字符串')
+
+    row = {'pond_id': pond_id, 'timestamp': timestamp}
+    get = item.get
+    for metric in METRIC_FIELDS:
+        value = get(metric)
+        if value.__class__ is float and isfinite(value):
+            # 常见情况：JSON中的小数直接通过
+            row[metric] = value
+        elif value is None:
+            if metric in REQUIRED_METRICS:
+                raise ValueError(f'缺少必填指标: {metric}')
+            row[metric] = None
+        elif value.__class__ is int:
+            row[metric] = float(value)
+        else:
+            raise ValueError(f'指标 {metric} 必须是有限数值')
+
+    return row
+
+
+def insert_readings(rows):
+    """在一个事务中以 executemany 方式批量写入水质读数，并同步更新小时/天汇总
+
+    直接使用DBAPI游标的 executemany，时间戳预先格式化为与SQLAlchemy
+    SQLite DateTime 相同的存储格式，避免逐行的ORM/类型处理开销。
+    """
+    if not rows:
+        return 0
+
+    params = [
+        (row['pond_id'], row['timestamp'].isoformat(sep=' ', timespec='microseconds'),
+         *[row[metric] for metric in METRIC_FIELDS])
+        for row in rows
+    ]
+
+    try:
+        connection = db.session.connection()
+        connection.exec_driver_sql(_INSERT_SQL, params)
+        upsert_rollups(connection, rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # 回调出错不影响已提交的写入
+    for listener in _insert_listeners:
+        try:
+            listener(rows)
+        except Exception as e:
+            print(f"读数写入回调出错: {str(e)}")
+
+    return len(rows)
+
+
+def known_pond_ids():
+    """当前存在的塘口ID集合"""
+    return {pond_id for (pond_id,) in db.session.query(Pond.id).all()}
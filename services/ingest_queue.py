@@ -0,0 +1,269 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from sqlalchemy.exc import DBAPIError, DataError, IntegrityError
+from services.ingest import insert_readings
+
+# SQLite 的 SQLITE_BUSY、SQLITE_LOCKED 主错误码：其他连接正在写入，稍后重试即可成功
+_BUSY_ERROR_CODES = (5, 6)
+
+# 只与个别读数有关的错误：拆分批次找出无效读数，其余读数照常写入
+_ROW_ERRORS = (IntegrityError, DataError, sqlite3.IntegrityError, sqlite3.DataError,
+               ValueError, TypeError, KeyError, AttributeError)
+
+
+class IngestQueueFull(Exception):
+    """写入队列已满，调用方应稍后重试"""
+
+    def __init__(self, retry_after):
+        super().__init__('写入队列已满')
+        self.retry_after = retry_after
+
+
+class IngestQueue:
+    """有界的读数写入队列
+
+    请求线程只负责入队，由单个后台写线程取出读数并合并提交：
+    累计满 batch_size 条或距第一条待写读数超过 flush_interval_ms 毫秒即提交一次。
+    SQLite同一时间只允许一个写者，合并提交避免了并发上传互相等待锁。
+
+    入队的读数已向客户端返回202，写入失败时不能直接丢弃：数据库被锁或忙时
+    按指数退避重试，直到写入成功；其他错误先重试 max_retries 次。仍失败时，
+    约束、数据类型等与个别读数有关的错误把批次对半拆分分别写入，只把无法写入
+    的单条读数转入死信文件；表不存在、SQL错误等与读数无关的错误整批转入死信
+    文件，写线程继续处理后面的读数。每次写入最多 batch_size 条（较大的上传
+    批次拆开写入）。写线程已取出但尚未写入的读数（含正在重试的）计入队列深度
+    和容量。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.max_rows = 200000
+        self.batch_size = 5000
+        self.flush_interval = 0.2
+        self.max_retries = 3
+        self.retry_backoff = 0.1
+        self.max_retry_backoff = 5.0
+        self.dead_letter_path = None
+
+        self._pending = deque()
+        self._pending_rows = 0
+        self._writing_rows = 0  # 写线程已取出、尚未写入（含正在重试）的读数
+        self._oldest_enqueued_at = None
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+        # 运行指标
+        self._enqueued_rows = 0
+        self._committed_rows = 0
+        self._failed_rows = 0
+        self._retries = 0
+        self._rejected_batches = 0
+        self._commits = 0
+        self._last_commit_latency = None
+        self._total_commit_latency = 0.0
+        self._max_commit_latency = 0.0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_rows = app.config.get('INGEST_QUEUE_MAX_ROWS', self.max_rows)
+        self.batch_size = app.config.get('INGEST_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('INGEST_FLUSH_INTERVAL_MS', self.flush_interval * 1000) / 1000
+        self.max_retries = app.config.get('INGEST_MAX_RETRIES', self.max_retries)
+        self.retry_backoff = app.config.get('INGEST_RETRY_BACKOFF_MS', self.retry_backoff * 1000) / 1000
+        self.max_retry_backoff = app.config.get('INGEST_RETRY_MAX_BACKOFF_MS', self.max_retry_backoff * 1000) / 1000
+        self.dead_letter_path = app.config.get('INGEST_DEAD_LETTER_PATH')
+        app.extensions['ingest_queue'] = self
+        atexit.register(self.stop)
+
+    def submit(self, rows):
+        """读数入队；队列容量不足时抛出 IngestQueueFull"""
+        if not rows:
+            return 0
+
+        with self._condition:
+            if self._pending_rows + self._writing_rows + len(rows) > self.max_rows:
+                self._rejected_batches += 1
+                raise IngestQueueFull(self._estimate_retry_after())
+
+            self._pending.append(rows)
+            self._pending_rows += len(rows)
+            self._enqueued_rows += len(rows)
+            if self._oldest_enqueued_at is None:
+                self._oldest_enqueued_at = time.monotonic()
+            self._ensure_writer()
+            self._condition.notify()
+
+        return len(rows)
+
+    def metrics(self):
+        """队列深度和提交延迟等运行指标"""
+        with self._condition:
+            return {
+                'depth': self._pending_rows + self._writing_rows,
+                'writing_rows': self._writing_rows,
+                'capacity': self.max_rows,
+                'batch_size': self.batch_size,
+                'flush_interval_ms': int(self.flush_interval * 1000),
+                'enqueued_rows': self._enqueued_rows,
+                'committed_rows': self._committed_rows,
+                'failed_rows': self._failed_rows,
+                'retries': self._retries,
+                'rejected_batches': self._rejected_batches,
+                'commits': self._commits,
+                'last_commit_latency_ms': _to_ms(self._last_commit_latency),
+                'avg_commit_latency_ms': _to_ms(self._total_commit_latency / self._commits) if self._commits else None,
+                'max_commit_latency_ms': _to_ms(self._max_commit_latency),
+                'writer_alive': bool(self._thread and self._thread.is_alive())
+            }
+
+    def stop(self, timeout=10):
+        """停止写线程，退出前写完队列中剩余的读数"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _ensure_writer(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='ingest-writer', daemon=True)
+            self._thread.start()
+
+    def _estimate_retry_after(self):
+        # 按当前平均提交速度估算清空队列所需的秒数，至少1秒
+        if self._commits and self._committed_rows:
+            seconds_per_row = self._total_commit_latency / self._committed_rows
+            return max(1, int((self._pending_rows + self._writing_rows) * seconds_per_row + self.flush_interval) + 1)
+        return 1
+
+    def _next_batch(self):
+        """等待直到满足提交条件，取出本次要提交的读数"""
+        with self._condition:
+            while True:
+                if self._pending_rows >= self.batch_size or (self._stopping and self._pending_rows):
+                    break
+                if self._pending_rows:
+                    wait = self.flush_interval - (time.monotonic() - self._oldest_enqueued_at)
+                    if wait <= 0:
+                        break
+                elif self._stopping:
+                    return None
+                else:
+                    wait = None
+                self._condition.wait(wait)
+
+            rows = []
+            while self._pending and len(rows) < self.batch_size:
+                chunk = self._pending.popleft()
+                room = self.batch_size - len(rows)
+                if len(chunk) > room:
+                    # 超出本次提交条数的部分放回队首，下一次先写
+                    self._pending.appendleft(chunk[room:])
+                    chunk = chunk[:room]
+                rows.extend(chunk)
+            self._pending_rows -= len(rows)
+            self._writing_rows += len(rows)
+            self._oldest_enqueued_at = time.monotonic() if self._pending_rows else None
+            return rows
+
+    def _run(self):
+        while True:
+            rows = self._next_batch()
+            if rows is None:
+                return
+            self._write(rows)
+
+    def _write(self, rows, retries=None):
+        """写入一批读数，写入成功或读数转入死信文件之前不返回（先于后入队的读数写入）
+
+        retries 为非临时错误的重试次数，拆分出的子批次不再重试，直接继续拆分。
+        """
+        retries = self.max_retries if retries is None else retries
+        attempts = 0
+        while True:
+            started = time.monotonic()
+            try:
+                with self.app.app_context():
+                    insert_readings(rows)
+            except Exception as e:
+                attempts += 1
+                if _is_transient(e) or attempts <= retries:
+                    print(f"写入水质读数时出错（{len(rows)}条，第{attempts}次，稍后重试）: {str(e)}")
+                    with self._condition:
+                        self._retries += 1
+                    time.sleep(min(self.retry_backoff * 2 ** (attempts - 1), self.max_retry_backoff))
+                    continue
+                if len(rows) > 1 and isinstance(e, _ROW_ERRORS):
+                    # 拆分后分别写入，批次中的无效读数不影响其他读数
+                    middle = len(rows) // 2
+                    self._write(rows[:middle], retries=0)
+                    self._write(rows[middle:], retries=0)
+                    return
+                self._dead_letter(rows, e)
+                return
+
+            latency = time.monotonic() - started
+            with self._condition:
+                self._writing_rows -= len(rows)
+                self._commits += 1
+                self._committed_rows += len(rows)
+                self._last_commit_latency = latency
+                self._total_commit_latency += latency
+                self._max_commit_latency = max(self._max_commit_latency, latency)
+            return
+
+
+    def _dead_letter(self, rows, error):
+        """把无法写入的读数追加到死信文件（每行一条JSON），写线程继续处理后面的读数"""
+        if len(rows) == 1:
+            print(f"无法写入的水质读数转入死信文件 {rows[0]}: {str(error)}")
+        else:
+            print(f"写入水质读数出错，{len(rows)}条读数转入死信文件: {str(error)}")
+
+        if self.dead_letter_path:
+            failed_at = datetime.now().isoformat(sep=' ', timespec='seconds')
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.dead_letter_path)), exist_ok=True)
+                with open(self.dead_letter_path, 'a', encoding='utf-8') as output:
+                    for row in rows:
+                        output.write(json.dumps({'failed_at': failed_at, 'error': str(error), 'reading': row},
+                                                ensure_ascii=False, default=str))
+                        output.write('\n')
+            except OSError as e:
+                print(f"写入死信文件出错: {str(e)}")
+
+        with self._condition:
+            self._writing_rows -= len(rows)
+            self._failed_rows += len(rows)
+
+
+def _is_transient(error):
+    # 只有数据库被锁或忙（其他连接正在写入）时稍后重试即可成功；表不存在、SQL错误等一直重试也不会成功
+    if isinstance(error, DBAPIError):
+        error = error.orig
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in _BUSY_ERROR_CODES
+    message = str(error)
+    return 'database is locked' in message or 'database table is locked' in message or 'busy' in message
+
+
+def _to_ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+# 全局写入队列，在app.py中通过 init_app 绑定应用
+ingest_queue = IngestQueue()
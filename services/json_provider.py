@@ -0,0 +1,64 @@
+from datetime import date
+from flask.json.provider import DefaultJSONProvider
+
+# orjson为可选依赖，未安装时回退到标准库json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(o):
+    # 日期时间统一序列化为ISO 8601（与orjson的原生输出一致），其余类型沿用Flask的默认处理
+    if isinstance(o, date):
+        return o.isoformat()
+    return DefaultJSONProvider.default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """API响应的JSON序列化：有orjson时使用orjson，否则使用标准库json
+
+    两种编码器的输出语义一致：键排序、datetime/date 输出为ISO 8601字符串、
+    非字符串的键转换为字符串。调用方传入额外的 dumps 参数（如 indent）时
+    使用标准库json以保证参数生效。
+    """
+
+    default = staticmethod(_default)
+
+    def __init__(self, app, use_orjson=True):
+        super().__init__(app)
+        self.use_orjson = use_orjson and orjson is not None
+
+    def _orjson_option(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if not self.use_orjson or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._orjson_option()).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if not self.use_orjson or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if not self.use_orjson:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        # 与Flask默认行为一致：调试模式下（compact 未设置时）缩进输出
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        body = orjson.dumps(obj, default=self.default, option=self._orjson_option(indent))
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    """为应用安装JSON序列化层（JSON_USE_ORJSON 为 False 时始终使用标准库json）"""
+    app.json = FastJSONProvider(app, use_orjson=app.config.get('JSON_USE_ORJSON', True))
+    return app.json
@@ -0,0 +1,87 @@
+from sqlalchemy import inspect, text
+
+# 已被复合索引前缀覆盖、需要从旧数据库中删除的单列索引
+OBSOLETE_INDEXES = (
+    'ix_water_quality_pond_id',
+    'ix_feeding_record_pond_id',
+    'ix_alert_pond_id',
+    'ix_feeding_decision_pond_id',
+    'ix_feeding_decision_plan_date_pond_id_slot',
+)
+
+# 补建唯一索引前删除已有重复行的语句
+UNIQUE_INDEX_CLEANUP = {
+    # 每个 (方案日期, 塘口, 时段) 保留一条：优先保留已应用的，其次是最早写入的
+    'ux_feeding_decision_plan_date_pond_id_slot': (
+        'DELETE FROM feeding_decision WHERE id IN ('
+        'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+        'PARTITION BY plan_date, pond_id, slot ORDER BY applied DESC, id) AS duplicate '
+        'FROM feeding_decision WHERE plan_date IS NOT NULL) WHERE duplicate > 1)'
+    ),
+    # 同一塘口同一指标有多条未解决的阈值预警时，只保留最新的一条，其余标记为已解决
+    'ux_alert_active_pond_id_metric': (
+        "UPDATE alert SET status = 'resolved' WHERE id IN ("
+        'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+        'PARTITION BY pond_id, metric ORDER BY timestamp DESC, id DESC) AS duplicate '
+        "FROM alert WHERE status = 'active' AND metric IS NOT NULL) WHERE duplicate > 1)"
+    ),
+}
+
+
+def apply_index_migrations(db):
+    """为已有数据库补建模型中定义的索引，并删除多余的旧索引
+
+    db.create_all() 只会为新建的表创建索引，已存在的表需要在这里补建。
+    返回 (新建的索引名列表, 删除的索引名列表)。
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    created = []
+    dropped = []
+
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    if index.name in UNIQUE_INDEX_CLEANUP:
+                        conn.execute(text(UNIQUE_INDEX_CLEANUP[index.name]))
+                    index.create(conn)
+                    created.append(index.name)
+            for name in OBSOLETE_INDEXES:
+                if name in existing:
+                    conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+                    dropped.append(name)
+
+        # 索引变化后更新统计信息，让查询规划器选择新索引
+        if created or dropped:
+            conn.execute(text('ANALYZE'))
+
+    return created, dropped
+
+
+def apply_column_migrations(db):
+    """为已有的表补加模型中新增的可空列
+
+    db.create_all() 不会修改已存在的表。这里只处理可以直接 ADD COLUMN 的
+    可空、无服务器端默认值的列，返回新增的 "表.列" 列表。
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    added = []
+
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable or column.primary_key:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                added.append(f'{table.name}.{column.name}')
+
+    return added
@@ -0,0 +1,321 @@
+import json
+import threading
+import zlib
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from models import db, Pond, WeeklyReport
+from services.rollups import daily_metric_totals
+from services.aggregation import daily_feeding_totals, daily_alert_counts, daily_decision_stats
+
+# 周报统计的水质指标
+WEEKLY_REPORT_METRICS = ['dissolved_oxygen', 'temperature', 'ph', 'ammonia']
+
+# 每个塘口每天一个单元：[投喂量, 预警次数, 决策数, 已应用决策数, [各指标的 [求和, 计数] 或 None]]
+FEEDING, ALERTS, DECISIONS, APPLIED, METRICS = range(5)
+
+# 周报内容的格式版本，统计口径变化时递增，旧版本的周报（包括已结束的周）重新生成
+REPORT_PAYLOAD_VERSION = 2
+
+
+def week_start_of(day):
+    """所在自然周（ISO周）的周一"""
+    return day - timedelta(days=day.weekday())
+
+
+def recent_weeks(count=4, today=None):
+    """最近若干个自然周（周一至周日），第1周为本周（尚未结束）"""
+    today = today or datetime.now().date()
+    current = week_start_of(today)
+    weeks = []
+    for i in range(count):
+        week_start = current - timedelta(days=i*7)
+        week_end = week_start + timedelta(days=6)
+        year, week, _ = week_start.isocalendar()
+        weeks.append({
+            'id': i+1,
+            'key': f'{year}-W{week:02d}',
+            'start_date': week_start.strftime('%Y-%m-%d'),
+            'end_date': week_end.strftime('%Y-%m-%d'),
+            'closed': week_end < today
+        })
+    return weeks
+
+
+def build_cells(first_day, last_day):
+    """计算 [first_day, last_day] 内各塘口每天的统计单元，返回 {塘口ID字符串: {'name', 'days': {日期: 单元}}}
+
+    全部塘口一起计算：水质来自天汇总表，投喂、预警和决策各一条按天分组的查询。
+    """
+    start_time = datetime.combine(first_day, datetime.min.time())
+    end_time = datetime.combine(last_day, datetime.min.time()) + timedelta(days=1)
+    ponds = db.session.query(Pond.id, Pond.name).order_by(Pond.id).all()
+    pond_ids = [pond_id for pond_id, _ in ponds]
+
+    metric_totals = daily_metric_totals(pond_ids, first_day, last_day, WEEKLY_REPORT_METRICS)
+    feeding = daily_feeding_totals(start_time, end_time, pond_ids, by_pond=True)
+    alerts = daily_alert_counts(start_time, end_time, pond_ids, by_pond=True)
+    decisions = daily_decision_stats(start_time, end_time, pond_ids, by_pond=True)
+
+    result = {}
+    for pond_id, name in ponds:
+        days = {}
+        day = first_day
+        while day <= last_day:
+            day_key = day.strftime('%Y-%m-%d')
+            pond_metrics = metric_totals.get((pond_id, day), {})
+            feeding_totals = feeding.get((pond_id, day_key))
+            alert_totals = alerts.get((pond_id, day_key))
+            decision_totals = decisions.get((pond_id, day_key))
+            if pond_metrics or feeding_totals or alert_totals or decision_totals:
+                days[day_key] = [
+                    feeding_totals['amount'] if feeding_totals else 0,
+                    alert_totals['count'] if alert_totals else 0,
+                    decision_totals['decisions'] if decision_totals else 0,
+                    decision_totals['applied'] if decision_totals else 0,
+                    [list(pond_metrics[metric]) if metric in pond_metrics else None for metric in WEEKLY_REPORT_METRICS]
+                ]
+            day += timedelta(days=1)
+        result[str(pond_id)] = {'name': name, 'days': days}
+    return result
+
+
+def encode_payload(payload):
+    return zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+
+def decode_payload(data):
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+class ReportEngine:
+    """周报生成引擎
+
+    每个自然周一份预生成的周报，以压缩JSON保存在 WeeklyReport 表中，内容为各塘口
+    每天的统计单元，查询时按塘口筛选后组装，不再访问明细表。已结束的周只生成一次；
+    本周的周报由定时任务增量更新：只重新计算上次生成当天（含前一天，容纳迟到数据）
+    之后的天。解压后的周报按生成时间缓存在进程内。生成时不持有锁，同一周报
+    正在由其他线程更新时先返回上次的结果。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.weeks = 4
+        self.open_max_age = 300
+        self._cache = {}  # week_start -> (built_at, payload)
+        self._building = set()  # 正在生成的周报（week_start）
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.weeks = app.config.get('WEEKLY_REPORT_WEEKS', 4)
+        self.open_max_age = app.config.get('WEEKLY_REPORT_OPEN_MAX_AGE', 300)
+        app.extensions['report_engine'] = self
+
+    def refresh(self, now=None):
+        """定时任务：补齐最近几周已结束的周报，并增量更新本周周报"""
+        now = now or datetime.now()
+        built = 0
+        for week in recent_weeks(self.weeks, now.date()):
+            if self.report(week, now, max_age=0)[1]:
+                built += 1
+        return {'weeks': self.weeks, 'built': built}
+
+    def report(self, week, now=None, max_age=None):
+        """返回 (周报内容, 是否在本次调用中生成或更新)
+
+        已结束的周有周报时直接返回；本周的周报生成超过 max_age 秒（默认
+        WEEKLY_REPORT_OPEN_MAX_AGE）时先增量更新。
+        """
+        now = now or datetime.now()
+        max_age = self.open_max_age if max_age is None else max_age
+        week_start = datetime.strptime(week['start_date'], '%Y-%m-%d').date()
+        closed = week['closed']
+
+        row = db.session.query(WeeklyReport.built_at, WeeklyReport.closed).filter(
+            WeeklyReport.week_start == week_start
+        ).first()
+        previous = self._payload(week_start, row.built_at) if row is not None else None
+        if previous is not None and previous.get('version') != REPORT_PAYLOAD_VERSION:
+            # 旧版本的周报整周重新生成
+            previous = None
+        elif previous is not None and (row.closed or (not closed and (now - row.built_at).total_seconds() < max_age)):
+            return previous, False
+
+        with self._lock:
+            if week_start in self._building and previous is not None:
+                return previous, False
+            self._building.add(week_start)
+        try:
+            return self._build(week_start, closed, previous, now), True
+        finally:
+            with self._lock:
+                self._building.discard(week_start)
+
+    def _payload(self, week_start, built_at):
+        cached = self._cache.get(week_start)
+        if cached is not None and cached[0] == built_at:
+            return cached[1]
+        data = db.session.query(WeeklyReport.payload).filter(WeeklyReport.week_start == week_start).scalar()
+        payload = decode_payload(data)
+        self._cache[week_start] = (built_at, payload)
+        return payload
+
+    def _build(self, week_start, closed, previous, now):
+        week_end = week_start + timedelta(days=6)
+        last_day = min(week_end, now.date())
+
+        if previous is None or closed:
+            # 新生成或该周刚结束：整周重新计算一次，之后不再更新
+            first_day = week_start
+            ponds = {}
+        else:
+            built_through = datetime.strptime(previous['built_through'], '%Y-%m-%d').date()
+            first_day = max(week_start, built_through - timedelta(days=1))
+            ponds = {key: {'name': pond['name'], 'days': dict(pond['days'])} for key, pond in previous['ponds'].items()}
+
+        for pond_id, fresh in build_cells(first_day, last_day).items():
+            pond = ponds.setdefault(pond_id, {'name': fresh['name'], 'days': {}})
+            pond['name'] = fresh['name']
+            # 重新计算的天整体替换，其中没有数据的天删除
+            for day_key in list(pond['days']):
+                if day_key >= first_day.strftime('%Y-%m-%d'):
+                    del pond['days'][day_key]
+            pond['days'].update(fresh['days'])
+
+        payload = {
+            'version': REPORT_PAYLOAD_VERSION,
+            'week_start': week_start.strftime('%Y-%m-%d'),
+            'metrics': WEEKLY_REPORT_METRICS,
+            'built_through': last_day.strftime('%Y-%m-%d'),
+            'ponds': ponds
+        }
+
+        report = db.session.get(WeeklyReport, week_start)
+        if report is None:
+            report = WeeklyReport(week_start=week_start)
+            db.session.add(report)
+        report.closed = closed
+        report.payload = encode_payload(payload)
+        report.built_at = now
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # 其他工作进程同时生成了该周报，使用本次的结果即可
+            db.session.rollback()
+            return payload
+
+        self._cache[week_start] = (now, payload)
+        return payload
+
+
+def average(totals):
+    """[求和, 计数] 列表的总体均值，没有样本时为 None"""
+    count = sum(sample_count for _, sample_count in totals)
+    return sum(value_sum for value_sum, _ in totals) / count if count else None
+
+
+def report_response(payload, week, pond_id=None):
+    """把周报内容组装为周报数据API的响应（按天统计、汇总、各塘口对比和明细表），pond_id 为空时统计全部塘口"""
+    week_start = datetime.strptime(week['start_date'], '%Y-%m-%d').date()
+    dates = [week_start + timedelta(days=i) for i in range(7)]
+    metric_index = {metric: i for i, metric in enumerate(payload['metrics'])}
+
+    if pond_id is not None:
+        ponds = [payload['ponds'][str(pond_id)]] if str(pond_id) in payload['ponds'] else []
+    else:
+        ponds = [payload['ponds'][key] for key in sorted(payload['ponds'], key=int)]
+
+    daily = {metric: [] for metric in WEEKLY_REPORT_METRICS}
+    daily['feeding'] = []
+    daily['alerts'] = []
+    daily['decisions'] = []
+    daily['applied'] = []
+    table = []
+    week_totals = {metric: [] for metric in WEEKLY_REPORT_METRICS}
+    week_applied = 0
+
+    for day in dates:
+        day_key = day.strftime('%Y-%m-%d')
+        day_totals = {metric: [] for metric in WEEKLY_REPORT_METRICS}
+        day_feeding = 0
+        day_alerts = 0
+        day_decisions = 0
+        day_applied = 0
+        for pond in ponds:
+            cell = pond['days'].get(day_key)
+            row = {
+                'date': day_key,
+                'pond': pond['name'],
+                'feeding': round(cell[FEEDING], 1) if cell else 0,
+                'alerts': cell[ALERTS] if cell else 0,
+                'decisions': cell[DECISIONS] if cell else 0,
+                'applied': round(cell[APPLIED], 1) if cell else 0
+            }
+            for metric in WEEKLY_REPORT_METRICS:
+                totals = cell[METRICS][metric_index[metric]] if cell and metric in metric_index else None
+                if totals:
+                    day_totals[metric].append(totals)
+                value = average([totals]) if totals else None
+                row[metric] = round(value, 2) if value is not None else None
+            table.append(row)
+            if cell:
+                day_feeding += cell[FEEDING]
+                day_alerts += cell[ALERTS]
+                day_decisions += cell[DECISIONS]
+                day_applied += cell[APPLIED]
+
+        daily['feeding'].append(round(day_feeding, 1))
+        daily['alerts'].append(day_alerts)
+        daily['decisions'].append(day_decisions)
+        daily['applied'].append(round(day_applied, 1))
+        week_applied += day_applied
+        for metric in WEEKLY_REPORT_METRICS:
+            value = average(day_totals[metric])
+            daily[metric].append(round(value, 2) if value is not None else None)
+            week_totals[metric].extend(day_totals[metric])
+
+    total_decisions = sum(daily['decisions'])
+    summary = {
+        'total_feeding': round(sum(daily['feeding']), 1),
+        'alert_count': sum(daily['alerts']),
+        'total_decisions': total_decisions,
+        'decision_adoption': round(week_applied / total_decisions * 100, 1) if total_decisions else None
+    }
+    for metric in WEEKLY_REPORT_METRICS:
+        value = average(week_totals[metric])
+        summary[f'avg_{metric}'] = round(value, 2) if value is not None else None
+
+    return {
+        'week': week,
+        'labels': [day.strftime('%m-%d') for day in dates],
+        'daily': daily,
+        'summary': summary,
+        'ponds': [pond_summary(pond, metric_index) for pond in ponds],
+        'table': table
+    }
+
+
+def pond_summary(pond, metric_index):
+    """单个塘口本周的合计：投喂量、预警次数、决策采纳率和各指标周均值"""
+    cells = list(pond['days'].values())
+    decisions = sum(cell[DECISIONS] for cell in cells)
+    summary = {
+        'name': pond['name'],
+        'feeding': round(sum(cell[FEEDING] for cell in cells), 1),
+        'alerts': sum(cell[ALERTS] for cell in cells),
+        'decisions': decisions,
+        'decision_adoption': round(sum(cell[APPLIED] for cell in cells) / decisions * 100, 1) if decisions else None
+    }
+    for metric in WEEKLY_REPORT_METRICS:
+        totals = [cell[METRICS][metric_index[metric]] for cell in cells
+                  if metric in metric_index and cell[METRICS][metric_index[metric]]]
+        value = average(totals)
+        summary[f'avg_{metric}'] = round(value, 2) if value is not None else None
+    return summary
+
+
+# 全局周报引擎，在app.py中通过 init_app 绑定应用
+report_engine = ReportEngine()
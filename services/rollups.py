@@ -0,0 +1,251 @@
+from datetime import datetime, timedelta
+from models import db, WaterQuality, WaterQualityHourly, WaterQualityDaily
+from services.water_quality import METRIC_FIELDS, point_type
+from services.storage import iter_water_quality, raw_data_start
+
+# 汇总粒度 -> 汇总模型
+ROLLUP_GRANULARITIES = {
+    'hour': WaterQualityHourly,
+    'day': WaterQualityDaily,
+}
+
+# 重建汇总时每批读取的原始记录数
+REBUILD_BATCH_SIZE = 10000
+
+_ROLLUP_COLUMNS = [
+    'pond_id', 'bucket_start', 'metric', 'sample_count', 'value_sum', 'value_min', 'value_max',
+    'value_first', 'first_at', 'value_last', 'last_at'
+]
+
+
+def _upsert_sql(table_name):
+    # 同一时间桶已有汇总时合并：计数和求和累加，最早/最新值按时间比较
+    # （时间相同时以先写入的为 first、后写入的为 last，与按 (timestamp, id) 排序一致）
+    return (
+        f"INSERT INTO {table_name} ({', '.join(_ROLLUP_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in _ROLLUP_COLUMNS)}) "
+        "ON CONFLICT (pond_id, bucket_start, metric) DO UPDATE SET "
+        "sample_count = sample_count + excluded.sample_count, "
+        "value_sum = value_sum + excluded.value_sum, "
+        "value_min = MIN(value_min, excluded.value_min), "
+        "value_max = MAX(value_max, excluded.value_max), "
+        "value_first = CASE WHEN excluded.first_at < first_at THEN excluded.value_first ELSE value_first END, "
+        "first_at = MIN(first_at, excluded.first_at), "
+        "value_last = CASE WHEN excluded.last_at >= last_at THEN excluded.value_last ELSE value_last END, "
+        "last_at = MAX(last_at, excluded.last_at)"
+    )
+
+_UPSERT_SQL = {
+    granularity: _upsert_sql(model.__tablename__)
+    for granularity, model in ROLLUP_GRANULARITIES.items()
+}
+
+
+def bucket_start(timestamp, granularity):
+    """时间所在汇总桶的起点（小时桶对齐整点，天桶对齐零点）"""
+    if granularity == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def aggregate_readings(rows, granularity):
+    """按 (塘口, 时间桶, 指标) 汇总读数，rows 为含 pond_id、timestamp 和指标值的字典
+
+    返回 {(pond_id, bucket_start, metric): [计数, 求和, 最小, 最大, 最早值, 最早时间, 最新值, 最新时间]}。
+    rows 需按写入顺序给出，时间相同的读数以先出现的为最早、后出现的为最新。
+    """
+    buckets = {}
+    for row in rows:
+        timestamp = row['timestamp']
+        start = bucket_start(timestamp, granularity)
+        pond_id = row['pond_id']
+        for metric in METRIC_FIELDS:
+            value = row[metric]
+            if value is None:
+                continue
+            key = (pond_id, start, metric)
+            stats = buckets.get(key)
+            if stats is None:
+                buckets[key] = [1, value, value, value, value, timestamp, value, timestamp]
+                continue
+            stats[0] += 1
+            stats[1] += value
+            if value < stats[2]:
+                stats[2] = value
+            if value > stats[3]:
+                stats[3] = value
+            if timestamp < stats[5]:
+                stats[4] = value
+                stats[5] = timestamp
+            if timestamp >= stats[7]:
+                stats[6] = value
+                stats[7] = timestamp
+    return buckets
+
+
+def upsert_rollups(connection, rows):
+    """将一批新写入的读数合并进小时和天汇总表（在调用方的事务中执行）"""
+    if not rows:
+        return
+
+    for granularity, sql in _UPSERT_SQL.items():
+        params = [
+            (pond_id, _format_datetime(start), metric, count, total, low, high,
+             first, _format_datetime(first_at), last, _format_datetime(last_at))
+            for (pond_id, start, metric), (count, total, low, high, first, first_at, last, last_at)
+            in aggregate_readings(rows, granularity).items()
+        ]
+        connection.exec_driver_sql(sql, params)
+
+
+def rebuild_rollups(start_time=None, end_time=None, pond_ids=None):
+    """根据原始水质记录（含月分区）重建一段时间内的汇总数据
+
+    时间范围向外对齐到整天，保证天汇总完整；不指定时重建全部数据。
+    原始数据已按保留策略删除的时间段不会被重建（保留现有汇总）。
+    返回参与重建的原始记录条数。
+    """
+    if start_time is not None:
+        start_time = bucket_start(start_time, 'day')
+    if end_time is not None:
+        # 结束时间向上对齐到零点（不含）
+        end_time = bucket_start(end_time - timedelta(microseconds=1), 'day') + timedelta(days=1)
+
+    available_from = raw_data_start()
+    if available_from is not None and (start_time is None or start_time < available_from):
+        start_time = available_from
+    if start_time is not None and end_time is not None and start_time >= end_time:
+        return 0
+
+    rows = iter_water_quality(['pond_id', 'timestamp'] + METRIC_FIELDS, start_time, end_time, pond_ids)
+
+    try:
+        for model in ROLLUP_GRANULARITIES.values():
+            stale = db.session.query(model)
+            if start_time is not None:
+                stale = stale.filter(model.bucket_start >= start_time)
+            if end_time is not None:
+                stale = stale.filter(model.bucket_start < end_time)
+            if pond_ids is not None:
+                stale = stale.filter(model.pond_id.in_(list(pond_ids)))
+            stale.delete(synchronize_session=False)
+
+        connection = db.session.connection()
+        total = 0
+        batch = []
+        for row in rows:
+            batch.append(row._asdict())
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                upsert_rollups(connection, batch)
+                total += len(batch)
+                batch = []
+        upsert_rollups(connection, batch)
+        total += len(batch)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return total
+
+
+def ensure_rollups():
+    """汇总表为空而原始数据存在时（如升级后的旧数据库）全量重建汇总"""
+    if WaterQualityHourly.query.first() is None and WaterQuality.query.first() is not None:
+        rebuild_rollups()
+
+
+def choose_granularity(resolution=None, bucket_limit=None, start_time=None, end_time=None):
+    """根据请求的分辨率（每个点代表的秒数）或点数上限选择汇总粒度，不适合时返回 None（读原始数据）
+
+    指定了分辨率时，分辨率不低于1天用天汇总、不低于1小时用小时汇总；
+    否则在小时桶数超过点数上限时用天汇总，未超过时用小时汇总。
+    """
+    if resolution:
+        if resolution >= 86400:
+            return 'day'
+        if resolution >= 3600:
+            return 'hour'
+        return None
+
+    if bucket_limit and start_time is not None and end_time is not None:
+        hours = (end_time - start_time).total_seconds() / 3600
+        return 'day' if hours > bucket_limit else 'hour'
+    return 'hour'
+
+
+def iter_rollup_points(pond_id, start_time, end_time, granularity, metrics=None, stat='avg'):
+    """按时间顺序逐个生成汇总点 (timestamp, 指标...)，只包含有数据的时间桶
+
+    stat 可为 avg/min/max/first/last（均值保留3位小数）；桶内没有某项指标的读数时该指标为 None。
+    只包含起点在 [start_time, end_time] 内的桶，end_time 为 None 时不限制结束时间。
+    """
+    metrics = list(metrics or METRIC_FIELDS)
+    table = ROLLUP_GRANULARITIES[granularity].__table__
+    make_point = point_type(['timestamp'] + metrics)
+    positions = {metric: index for index, metric in enumerate(metrics)}
+
+    if stat == 'avg':
+        value_column = db.func.round(table.c.value_sum / table.c.sample_count, 3)
+    else:
+        value_column = table.c[f'value_{stat}']
+
+    stmt = db.select(table.c.bucket_start, table.c.metric, value_column).where(
+        table.c.pond_id == pond_id,
+        table.c.bucket_start >= start_time,
+        table.c.metric.in_(metrics)
+    )
+    if end_time is not None:
+        stmt = stmt.where(table.c.bucket_start <= end_time)
+    stmt = stmt.order_by(table.c.bucket_start.asc())
+
+    current_start = None
+    values = None
+    for start, metric, value in db.session.execute(stmt, execution_options={'yield_per': REBUILD_BATCH_SIZE}):
+        if start != current_start:
+            if values is not None:
+                yield make_point(current_start, *values)
+            current_start = start
+            values = [None] * len(metrics)
+        values[positions[metric]] = value
+
+    if values is not None:
+        yield make_point(current_start, *values)
+
+
+def rollup_points(pond_id, start_time, end_time, granularity, metrics=None, stat='avg'):
+    """汇总点列表，见 iter_rollup_points"""
+    return list(iter_rollup_points(pond_id, start_time, end_time, granularity, metrics, stat))
+
+
+def daily_metric_totals(pond_ids, start_date, end_date, metrics):
+    """按天读取多个塘口的指标汇总，返回 {(pond_id, date): {指标: (求和, 计数)}}（end_date 包含在内）
+
+    返回求和与计数而不是均值，便于调用方再合并多个塘口或多天的平均值。
+    """
+    start_time = datetime.combine(start_date, datetime.min.time())
+    end_time = datetime.combine(end_date, datetime.min.time()) + timedelta(days=1)
+
+    rows = db.session.query(
+        WaterQualityDaily.pond_id,
+        WaterQualityDaily.bucket_start,
+        WaterQualityDaily.metric,
+        WaterQualityDaily.value_sum,
+        WaterQualityDaily.sample_count
+    ).filter(
+        WaterQualityDaily.pond_id.in_(list(pond_ids)),
+        WaterQualityDaily.bucket_start >= start_time,
+        WaterQualityDaily.bucket_start < end_time,
+        WaterQualityDaily.metric.in_(list(metrics))
+    ).all()
+
+    totals = {}
+    for pond_id, start, metric, value_sum, sample_count in rows:
+        totals.setdefault((pond_id, start.date()), {})[metric] = (value_sum, sample_count)
+    return totals
+
+
+def _format_datetime(value):
+    # 与SQLAlchemy SQLite DateTime 的存储格式一致
+    return value.isoformat(sep=' ', timespec='microseconds')
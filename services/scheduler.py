@@ -0,0 +1,166 @@
+import atexit
+import os
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只能按单进程部署
+    fcntl = None
+
+
+class Scheduler:
+    """周期任务调度器
+
+    单个后台线程按各任务的间隔在应用上下文中依次执行任务，
+    用于分区归档、汇总维护等不需要随请求执行的后台工作。
+    多进程部署（gunicorn 多个 worker、调试重载器）时每个进程都会启动调度线程，
+    只有持有锁文件的进程执行任务；其他进程定期尝试加锁，持有者退出后接替执行。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self.lock_path = None
+        self.lock_poll = 30
+        self._lock_file = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.lock_path = app.config.get('SCHEDULER_LOCK_PATH')
+        self.lock_poll = app.config.get('SCHEDULER_LOCK_POLL', 30)
+        app.extensions['scheduler'] = self
+        atexit.register(self.stop)
+
+    def add_job(self, name, func, interval, delay=None):
+        """注册周期任务：启动后 delay 秒（默认等于 interval）首次执行，之后每 interval 秒执行一次"""
+        with self._lock:
+            self._jobs[name] = {
+                'func': func,
+                'interval': interval,
+                'next_run': time.monotonic() + (interval if delay is None else delay),
+                'last_run': None,
+                'last_duration': None,
+                'last_result': None,
+                'last_error': None,
+                'running': False
+            }
+        self._wakeup.set()
+
+    def start(self):
+        """启动调度线程（重复调用无副作用）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._release_lock()
+
+    def is_leader(self):
+        """当前进程是否负责执行定时任务（未配置锁文件时总是执行）"""
+        if self.lock_path is None or fcntl is None:
+            return True
+        if self._lock_file is not None:
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+        return True
+
+    def _release_lock(self):
+        if self._lock_file is not None:
+            # 关闭文件即释放 flock
+            self._lock_file.close()
+            self._lock_file = None
+
+    def run_job(self, name):
+        """立即在当前线程执行一次任务，返回任务结果"""
+        with self._lock:
+            job = self._jobs[name]
+            if job['running']:
+                raise RuntimeError(f'任务正在执行: {name}')
+            job['running'] = True
+
+        started = time.monotonic()
+        try:
+            with self.app.app_context():
+                result = job['func']()
+            job['last_result'] = result
+            job['last_error'] = None
+            return result
+        except Exception as e:
+            job['last_error'] = str(e)
+            raise
+        finally:
+            job['last_run'] = datetime.now()
+            job['last_duration'] = round(time.monotonic() - started, 3)
+            job['next_run'] = time.monotonic() + job['interval']
+            job['running'] = False
+
+    def status(self):
+        """各任务的执行状态"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {
+                    'interval': job['interval'],
+                    'next_run_in': max(0, round(job['next_run'] - now, 1)),
+                    'last_run': job['last_run'].isoformat() if job['last_run'] else None,
+                    'last_duration': job['last_duration'],
+                    'last_result': job['last_result'],
+                    'last_error': job['last_error'],
+                    'running': job['running']
+                }
+                for name, job in self._jobs.items()
+            }
+
+    def _run(self):
+        while not self._stopping:
+            if not self.is_leader():
+                self._wakeup.wait(self.lock_poll)
+                self._wakeup.clear()
+                continue
+
+            with self._lock:
+                now = time.monotonic()
+                due = [name for name, job in self._jobs.items() if job['next_run'] <= now and not job['running']]
+                next_run = min((job['next_run'] for job in self._jobs.values()), default=now + 60)
+
+            for name in due:
+                if self._stopping:
+                    return
+                try:
+                    self.run_job(name)
+                except Exception as e:
+                    print(f"定时任务 {name} 执行出错: {str(e)}")
+
+            if not due:
+                self._wakeup.wait(max(0.1, next_run - time.monotonic()))
+                self._wakeup.clear()
+
+
+# 全局调度器，在app.py中通过 init_app 绑定应用
+scheduler = Scheduler()
@@ -0,0 +1,423 @@
+import gzip
+import heapq
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from models import db, WaterQuality, WaterQualityHourly, WaterQualityPartition, WaterQualityPartitionLatest
+from services.water_quality import point_type
+
+# 冷数据分区文件中的表名与热表相同，表结构和索引从主库复制
+_TABLE_NAME = WaterQuality.__tablename__
+
+# 记录各塘口分区中最新读数：只在新读数晚于已记录的读数时替换
+_RECORD_LATEST_SQL = (
+    f'INSERT INTO {WaterQualityPartitionLatest.__tablename__} (pond_id, month, reading_id, timestamp, reading) '
+    'VALUES (?, ?, ?, ?, ?) ON CONFLICT (pond_id) DO UPDATE SET month = excluded.month, '
+    'reading_id = excluded.reading_id, timestamp = excluded.timestamp, reading = excluded.reading '
+    'WHERE (excluded.timestamp, excluded.reading_id) > (timestamp, reading_id)'
+)
+
+
+def _config(key):
+    return current_app.config[key]
+
+
+def partition_dir():
+    path = _config('WATER_QUALITY_PARTITION_DIR')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value):
+    return (month_start(value) + timedelta(days=32)).replace(day=1)
+
+
+def _format_datetime(value):
+    # 与SQLAlchemy SQLite DateTime 的存储格式一致，便于直接按字符串比较
+    return value.isoformat(sep=' ', timespec='microseconds')
+
+
+# ---------------------------------------------------------------------------
+# 统一查询层
+# ---------------------------------------------------------------------------
+
+def iter_water_quality(columns, start_time=None, end_time=None, pond_ids=None):
+    """按时间顺序读取原始水质记录，透明地合并月分区文件（含已压缩归档的分区）和热表
+
+    columns 为 WaterQuality 的列名列表；返回的行既可按下标也可按列名访问。
+    时间范围为 [start_time, end_time)，不指定则不限制。
+    """
+    columns = list(columns)
+    sources = [
+        _iter_partition(partition, columns, start_time, end_time, pond_ids)
+        for partition in partitions_between(start_time, end_time)
+    ]
+    sources.append(_iter_hot_table(columns, start_time, end_time, pond_ids))
+
+    if len(sources) == 1:
+        return sources[0]
+
+    # 迟到的读数可能仍在热表中，按时间归并各来源以保证整体有序
+    timestamp_index = columns.index('timestamp') if 'timestamp' in columns else None
+    if timestamp_index is None:
+        return (row for source in sources for row in source)
+    return heapq.merge(*sources, key=lambda row: row[timestamp_index])
+
+
+def partitions_between(start_time=None, end_time=None):
+    """与时间范围有重叠、仍可查询的分区（按月份排序）"""
+    query = WaterQualityPartition.query.filter(WaterQualityPartition.status.in_(['active', 'archived']))
+    if start_time is not None:
+        query = query.filter(WaterQualityPartition.end_time > start_time)
+    if end_time is not None:
+        query = query.filter(WaterQualityPartition.start_time < end_time)
+    return query.order_by(WaterQualityPartition.start_time.asc()).all()
+
+
+def raw_data_start():
+    """原始数据最早可查询的时间：最近一个已按保留策略删除的分区的结束时间，没有删除过时返回 None"""
+    return db.session.query(db.func.max(WaterQualityPartition.end_time)).filter(
+        WaterQualityPartition.status == 'dropped'
+    ).scalar()
+
+
+def latest_partition_rows(pond_ids, columns):
+    """各塘口在分区文件中的最新一条记录 {pond_id: 行}
+
+    用于热表中已没有读数的塘口（最近 WATER_QUALITY_HOT_DAYS 天没有新读数）。
+    读数转存到分区时已记入 WaterQualityPartitionLatest，这里只查询该表，
+    不打开（也不解压）分区文件；从未有过读数的塘口没有记录。columns 需包含 pond_id。
+    """
+    columns = list(columns)
+    pond_ids = list(pond_ids)
+    if not pond_ids:
+        return {}
+
+    make_row = point_type(columns)
+    result = {}
+    for pond_id, reading in db.session.query(
+        WaterQualityPartitionLatest.pond_id, WaterQualityPartitionLatest.reading
+    ).filter(WaterQualityPartitionLatest.pond_id.in_(pond_ids)):
+        values = json.loads(reading)
+        values['timestamp'] = datetime.fromisoformat(values['timestamp'])
+        result[pond_id] = make_row(*[values[column] for column in columns])
+    return result
+
+
+def _latest_by_pond_sql(source, where=''):
+    # 每个塘口按 (timestamp, id) 最新的一条，去掉排名列后与表的列顺序一致
+    return (
+        f'SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY pond_id ORDER BY timestamp DESC, id DESC) '
+        f'AS latest_rank FROM {source} {where}) WHERE latest_rank = 1'
+    )
+
+
+def _latest_params(month, names, rows):
+    """把分区中各塘口的最新读数转换为 _RECORD_LATEST_SQL 的参数"""
+    params = []
+    for row in rows:
+        values = {name: value for name, value in zip(names, row) if name != 'latest_rank'}
+        params.append((values['pond_id'], month, values['id'], values['timestamp'],
+                       json.dumps(values, ensure_ascii=False)))
+    return params
+
+
+def record_partition_latest(partition):
+    """补记分区中各塘口的最新读数（在维护任务中执行，归档分区会解压到缓存）"""
+    connection = sqlite3.connect(f'file:{_readable_path(partition)}?mode=ro', uri=True)
+    try:
+        cursor = connection.execute(_latest_by_pond_sql(_TABLE_NAME))
+        names = [column[0] for column in cursor.description]
+        params = _latest_params(partition.month, names, cursor.fetchall())
+    finally:
+        connection.close()
+
+    with db.engine.begin() as conn:
+        if params:
+            conn.exec_driver_sql(_RECORD_LATEST_SQL, params)
+    partition.latest_recorded = True
+    db.session.commit()
+    return len(params)
+
+
+def _iter_hot_table(columns, start_time, end_time, pond_ids):
+    # 只读路径使用Core查询：结果为普通行元组，不经过ORM对象构造和标识映射
+    table = WaterQuality.__table__
+    stmt = db.select(*[table.c[column] for column in columns])
+    if start_time is not None:
+        stmt = stmt.where(table.c.timestamp >= start_time)
+    if end_time is not None:
+        stmt = stmt.where(table.c.timestamp < end_time)
+    if pond_ids is not None:
+        stmt = stmt.where(table.c.pond_id.in_(list(pond_ids)))
+    stmt = stmt.order_by(table.c.timestamp.asc(), table.c.id.asc())
+    return iter(db.session.execute(stmt, execution_options={'yield_per': 1000}))
+
+
+def _iter_partition(partition, columns, start_time, end_time, pond_ids):
+    # 分区在生成器首次取值时才打开（归档分区此时才解压），读完即关闭连接
+    conditions = []
+    params = []
+    if start_time is not None:
+        conditions.append('timestamp >= ?')
+        params.append(_format_datetime(start_time))
+    if end_time is not None:
+        conditions.append('timestamp < ?')
+        params.append(_format_datetime(end_time))
+    if pond_ids is not None:
+        pond_ids = list(pond_ids)
+        if not pond_ids:
+            return
+        conditions.append(f"pond_id IN ({', '.join('?' for _ in pond_ids)})")
+        params.extend(pond_ids)
+
+    sql = f"SELECT {', '.join(columns)} FROM {_TABLE_NAME}"
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY timestamp, id'
+
+    make_row = point_type(columns)
+    datetime_indexes = [index for index, column in enumerate(columns) if column == 'timestamp']
+    path = _readable_path(partition)
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        cursor = connection.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for row in rows:
+                if datetime_indexes:
+                    row = list(row)
+                    for index in datetime_indexes:
+                        row[index] = datetime.fromisoformat(row[index])
+                yield make_row(*row)
+    finally:
+        connection.close()
+
+
+def _readable_path(partition):
+    """可直接打开的分区数据库路径；已归档的分区解压到缓存目录后返回缓存路径"""
+    directory = partition_dir()
+    path = os.path.join(directory, partition.file_name)
+    if partition.status == 'active':
+        return path
+
+    cache_dir = os.path.join(directory, 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = os.path.join(cache_dir, partition.file_name)
+    if os.path.exists(cached):
+        os.utime(cached)
+        return cached
+
+    # 先解压到临时文件再改名，避免并发请求读到不完整的文件
+    temp_path = f'{cached}.{os.getpid()}.tmp'
+    with gzip.open(path + '.gz', 'rb') as source, open(temp_path, 'wb') as target:
+        shutil.copyfileobj(source, target)
+    os.replace(temp_path, cached)
+    return cached
+
+
+# ---------------------------------------------------------------------------
+# 分区维护：转存已结束的月份、压缩归档、按保留策略删除
+# ---------------------------------------------------------------------------
+
+def maintain_partitions(now=None):
+    """分区维护任务（由定时任务调用），返回各步骤处理的数量"""
+    now = now or datetime.now()
+    result = {'partitioned_rows': 0, 'archived': [], 'dropped': [], 'cache_removed': 0, 'latest_recorded': []}
+
+    # 0. 为记录最新读数之前创建的分区补记各塘口的最新读数
+    for partition in WaterQualityPartition.query.filter(
+        WaterQualityPartition.status.in_(['active', 'archived']),
+        WaterQualityPartition.latest_recorded.isnot(True)
+    ).all():
+        record_partition_latest(partition)
+        result['latest_recorded'].append(partition.month)
+
+    # 1. 早于热数据窗口的整月数据从热表转存到月分区文件
+    cutoff = month_start(now - timedelta(days=_config('WATER_QUALITY_HOT_DAYS')))
+    oldest = db.session.query(db.func.min(WaterQuality.timestamp)).scalar()
+    month = month_start(oldest) if oldest else cutoff
+    while month < cutoff:
+        result['partitioned_rows'] += partition_month(month)
+        month = next_month(month)
+
+    # 2. 超过归档期限的分区压缩归档
+    archive_after = _config('WATER_QUALITY_ARCHIVE_AFTER_DAYS')
+    if archive_after is not None:
+        for partition in WaterQualityPartition.query.filter_by(status='active').all():
+            if partition.end_time <= now - timedelta(days=archive_after):
+                archive_partition(partition)
+                result['archived'].append(partition.month)
+
+    # 3. 超过保留期限且汇总完整的分区删除原始数据
+    default_retention = _config('WATER_QUALITY_RETENTION_DAYS')
+    for partition in WaterQualityPartition.query.filter(
+        WaterQualityPartition.status.in_(['active', 'archived'])
+    ).all():
+        retention = partition.retention_days if partition.retention_days is not None else default_retention
+        if retention is None or partition.end_time > now - timedelta(days=retention):
+            continue
+        if drop_partition(partition):
+            result['dropped'].append(partition.month)
+
+    # 4. 清理长时间未访问的解压缓存
+    result['cache_removed'] = clean_archive_cache()
+    return result
+
+
+def partition_month(start):
+    """将热表中某个月的原始记录转存到该月的分区文件，返回转存的记录数
+
+    已归档或已删除的月份不再接收数据，迟到的读数保留在热表中（查询层会一并读取）。
+    """
+    start = month_start(start)
+    end = next_month(start)
+    key = start.strftime('%Y-%m')
+
+    partition = db.session.get(WaterQualityPartition, key)
+    if partition is not None and partition.status != 'active':
+        return 0
+
+    params = (_format_datetime(start), _format_datetime(end))
+    if not db.session.query(WaterQuality.id).filter(
+        WaterQuality.timestamp >= start, WaterQuality.timestamp < end
+    ).first():
+        return 0
+
+    if partition is None:
+        partition = WaterQualityPartition(
+            month=key, start_time=start, end_time=end,
+            file_name=f"{_TABLE_NAME}_{start.strftime('%Y_%m')}.db",
+            status='active', row_count=0, latest_recorded=True
+        )
+        db.session.add(partition)
+        db.session.commit()
+
+    path = os.path.join(partition_dir(), partition.file_name)
+    _create_partition_file(path)
+
+    # ATTACH 必须在事务外执行，因此使用独立连接而不是会话连接
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql('ATTACH DATABASE ? AS partition_db', (path,))
+        try:
+            # INSERT OR IGNORE：若上次转存在删除热表数据前中断，重试时跳过已复制的记录
+            moved = conn.exec_driver_sql(
+                f'INSERT OR IGNORE INTO partition_db.{_TABLE_NAME} '
+                f'SELECT * FROM main.{_TABLE_NAME} WHERE timestamp >= ? AND timestamp < ?',
+                params
+            ).rowcount
+            # 与转存在同一事务中记录各塘口的最新读数，供热表中没有读数时查询
+            latest = conn.exec_driver_sql(
+                _latest_by_pond_sql(f'main.{_TABLE_NAME}', 'WHERE timestamp >= ? AND timestamp < ?'), params
+            )
+            latest_params = _latest_params(key, list(latest.keys()), latest.fetchall())
+            if latest_params:
+                conn.exec_driver_sql(_RECORD_LATEST_SQL, latest_params)
+            conn.exec_driver_sql(
+                f'DELETE FROM main.{_TABLE_NAME} WHERE timestamp >= ? AND timestamp < ?',
+                params
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.exec_driver_sql('DETACH DATABASE partition_db')
+
+    partition.row_count += moved
+    db.session.commit()
+    return moved
+
+
+def archive_partition(partition):
+    """将分区文件压缩为 .gz 并删除原文件，归档后的分区在查询时按需解压"""
+    path = os.path.join(partition_dir(), partition.file_name)
+    temp_path = path + '.gz.tmp'
+    with open(path, 'rb') as source, gzip.open(temp_path, 'wb') as target:
+        shutil.copyfileobj(source, target)
+    os.replace(temp_path, path + '.gz')
+
+    partition.status = 'archived'
+    partition.archived_at = datetime.now()
+    db.session.commit()
+    os.remove(path)
+
+
+def drop_partition(partition):
+    """删除分区的原始数据（含归档文件），仅在该月的小时汇总已覆盖全部记录时执行
+
+    温度为必填指标，小时汇总中温度的样本数之和即该月已汇总的原始记录数。
+    返回是否已删除。
+    """
+    summarized = db.session.query(db.func.sum(WaterQualityHourly.sample_count)).filter(
+        WaterQualityHourly.metric == 'temperature',
+        WaterQualityHourly.bucket_start >= partition.start_time,
+        WaterQualityHourly.bucket_start < partition.end_time
+    ).scalar() or 0
+    if summarized < partition.row_count:
+        return False
+
+    partition.status = 'dropped'
+    partition.dropped_at = datetime.now()
+    # 原始数据删除后，最新读数在该分区中的塘口不再有可查询的最新读数
+    WaterQualityPartitionLatest.query.filter_by(month=partition.month).delete()
+    db.session.commit()
+
+    directory = partition_dir()
+    for path in (
+        os.path.join(directory, partition.file_name),
+        os.path.join(directory, partition.file_name + '.gz'),
+        os.path.join(directory, 'cache', partition.file_name)
+    ):
+        if os.path.exists(path):
+            os.remove(path)
+    return True
+
+
+def clean_archive_cache(now=None):
+    """删除超过 WATER_QUALITY_ARCHIVE_CACHE_TTL 秒未访问的解压缓存，返回删除的文件数"""
+    cache_dir = os.path.join(partition_dir(), 'cache')
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    now = now or time.time()
+    ttl = _config('WATER_QUALITY_ARCHIVE_CACHE_TTL')
+    removed = 0
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if now - os.path.getmtime(path) > ttl:
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def _create_partition_file(path):
+    """按主库中水质表的建表语句和索引创建分区文件（已存在时跳过）"""
+    if os.path.exists(path):
+        return
+
+    statements = [
+        sql for (sql,) in db.session.execute(
+            db.text("SELECT sql FROM sqlite_master WHERE tbl_name = :name AND sql IS NOT NULL ORDER BY type DESC"),
+            {'name': _TABLE_NAME}
+        )
+    ]
+    temp_path = path + '.tmp'
+    connection = sqlite3.connect(temp_path)
+    try:
+        for sql in statements:
+            connection.execute(sql)
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(temp_path, path)
@@ -0,0 +1,236 @@
+import itertools
+import queue
+import threading
+from collections import deque
+from sqlalchemy import event, inspect, select
+from models import db, Pond, Alert
+from services.ingest import on_readings_inserted
+from services.water_quality import METRIC_FIELDS
+
+# 可订阅的事件类型；resync 在客户端落后太多（队列溢出或重连时历史已淘汰）时发送，
+# 客户端收到后应通过普通接口重新加载数据
+STREAM_EVENT_TYPES = ('reading', 'alert')
+
+
+class StreamFull(Exception):
+    """实时推送连接数已达上限"""
+
+
+class Subscription:
+    """一个客户端连接的订阅：关注的塘口、事件类型和待发送的消息队列"""
+
+    def __init__(self, pond_ids, types, max_queue):
+        self.pond_ids = frozenset(pond_ids) if pond_ids else None
+        self.types = frozenset(types)
+        self.queue = queue.Queue(max_queue)
+        self.lagged = False
+
+    def wants(self, event_type, pond_id):
+        return event_type in self.types and (self.pond_ids is None or pond_id in self.pond_ids)
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # 客户端读取太慢，丢弃后续消息，由 stream 发送 resync 让客户端重新加载
+            self.lagged = True
+
+
+# 预警的这些字段变化时发布 alert 事件（升级、解决、内容更新）
+ALERT_STREAM_FIELDS = ('level', 'status', 'title', 'message')
+
+
+class EventBroker:
+    """服务器推送事件（SSE）的发布/订阅中心
+
+    读数写入和预警（新建、升级、解决）提交后各发布一次事件，事件只序列化一次，
+    再按各连接订阅的塘口和类型分发到其队列，推送本身不为每个客户端查询数据库。
+    最近的事件保留在历史中，断线重连的客户端按 Last-Event-ID 补发。
+
+    事件中心只在本进程内分发：客户端只能收到与其连接处于同一进程的写入产生的
+    事件。多个工作进程部署时，读数写入（/data/api/readings 的写入队列）和推送
+    连接需要由同一个进程处理（如 gunicorn 单 worker 多线程，或把 /data/stream 和
+    写入接口路由到同一进程），否则其他进程的客户端只能通过 resync 后的普通接口
+    看到这些数据。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.heartbeat = 15
+        self.max_queue = 1000
+        self.max_clients = 200
+        self._subscribers = set()
+        self._history = deque(maxlen=1000)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.heartbeat = app.config.get('STREAM_HEARTBEAT_SECONDS', 15)
+        self.max_queue = app.config.get('STREAM_QUEUE_SIZE', 1000)
+        self.max_clients = app.config.get('STREAM_MAX_CLIENTS', 200)
+        self._history = deque(maxlen=app.config.get('STREAM_HISTORY_SIZE', 1000))
+        app.extensions['event_broker'] = self
+
+        on_readings_inserted(self.publish_readings)
+        event.listen(db.session, 'after_flush', _collect_changed_alerts)
+        event.listen(db.session, 'after_commit', self._publish_committed_alerts)
+        event.listen(db.session, 'after_rollback', _discard_changed_alerts)
+
+    # ------------------------------------------------------------------
+    # 发布
+    # ------------------------------------------------------------------
+
+    def publish(self, event_type, pond_id, data):
+        """发布一个事件，返回事件ID"""
+        payload = self.app.json.dumps(data)
+        with self._lock:
+            event_id = next(self._ids)
+            message = f'id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n'
+            self._history.append((event_id, event_type, pond_id, message))
+            # 在锁内投递（只是非阻塞入队），保证每个客户端收到的事件按ID有序
+            for subscription in self._subscribers:
+                if subscription.wants(event_type, pond_id):
+                    subscription.put(message)
+        return event_id
+
+    def publish_readings(self, rows):
+        """读数写入后的回调：每个塘口发布一条事件，包含本批读数条数和其中最新的一条"""
+        latest = {}
+        counts = {}
+        for row in rows:
+            pond_id = row['pond_id']
+            counts[pond_id] = counts.get(pond_id, 0) + 1
+            if pond_id not in latest or row['timestamp'] >= latest[pond_id]['timestamp']:
+                latest[pond_id] = row
+
+        for pond_id, row in latest.items():
+            reading = {'timestamp': row['timestamp']}
+            for metric in METRIC_FIELDS:
+                reading[metric] = row[metric]
+            self.publish('reading', pond_id, {'pond_id': pond_id, 'count': counts[pond_id], 'latest': reading})
+
+    def _publish_committed_alerts(self, session):
+        changes = session.info.pop('stream_alerts', None)
+        if not changes:
+            return
+        try:
+            for alert in load_alert_events(changes):
+                self.publish('alert', alert['pond_id'], alert)
+        except Exception as e:
+            print(f"发布预警推送事件出错: {str(e)}")
+
+    # ------------------------------------------------------------------
+    # 订阅
+    # ------------------------------------------------------------------
+
+    def subscribe(self, pond_ids=None, types=STREAM_EVENT_TYPES, last_event_id=None):
+        """注册一个连接；给出 last_event_id 时先补发历史中更新的事件"""
+        subscription = Subscription(pond_ids, types, self.max_queue)
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                raise StreamFull()
+            if last_event_id is not None:
+                if self._history and self._history[0][0] > last_event_id + 1:
+                    # 中间的事件已从历史中淘汰，无法完整补发
+                    subscription.lagged = True
+                else:
+                    for event_id, event_type, pond_id, message in self._history:
+                        if event_id > last_event_id and subscription.wants(event_type, pond_id):
+                            subscription.put(message)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stream(self, subscription):
+        """生成发送给客户端的SSE文本，空闲时定期发送心跳注释；客户端断开时取消订阅"""
+        try:
+            yield f'retry: {self.heartbeat * 1000}\n\n'
+            while True:
+                if subscription.lagged:
+                    _drain(subscription.queue)
+                    subscription.lagged = False
+                    yield 'event: resync\ndata: {}\n\n'
+                try:
+                    yield subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+    def status(self):
+        with self._lock:
+            return {
+                'clients': len(self._subscribers),
+                'max_clients': self.max_clients,
+                'last_event_id': self._history[-1][0] if self._history else 0
+            }
+
+
+def _drain(q):
+    while True:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            return
+
+
+def _collect_changed_alerts(session, flush_context):
+    # 刷新后只记录新建和字段有变化的预警ID（此时主键已生成），事务提交后再读取并发布
+    changes = None
+    for alert in session.new:
+        if isinstance(alert, Alert):
+            changes = session.info.setdefault('stream_alerts', {})
+            changes[alert.id] = 'created'
+    for alert in session.dirty:
+        if not isinstance(alert, Alert):
+            continue
+        attrs = inspect(alert).attrs
+        changed = [field for field in ALERT_STREAM_FIELDS if attrs[field].history.has_changes()]
+        if not changed:
+            continue
+        changes = session.info.setdefault('stream_alerts', {})
+        if changes.get(alert.id) == 'created':
+            continue
+        if 'status' in changed and alert.status == 'resolved':
+            changes[alert.id] = 'resolved'
+        elif changes.get(alert.id) != 'resolved':
+            changes[alert.id] = 'escalated' if 'level' in changed else 'updated'
+
+
+def _discard_changed_alerts(session):
+    session.info.pop('stream_alerts', None)
+
+
+def load_alert_events(changes):
+    """读取已提交的预警，返回推送事件的数据列表（按预警ID排序）
+
+    changes 为 {预警ID: 变化类型}，变化类型为 created/escalated/resolved/updated。
+    提交后会话不在事务中，使用单独的连接一次查询全部预警。
+    """
+    query = select(
+        Alert.id, Alert.pond_id, Pond.name, Alert.level, Alert.title, Alert.message, Alert.timestamp, Alert.status
+    ).outerjoin(Pond, Pond.id == Alert.pond_id).where(Alert.id.in_(list(changes))).order_by(Alert.id)
+    with db.engine.connect() as connection:
+        rows = connection.execute(query).all()
+    return [{
+        'id': alert_id,
+        'pond_id': pond_id,
+        'pond_name': pond_name,
+        'level': level,
+        'title': title,
+        'message': message,
+        'timestamp': timestamp,
+        'status': status,
+        'change': changes[alert_id]
+    } for alert_id, pond_id, pond_name, level, title, message, timestamp, status in rows]
+
+
+# 全局事件中心，在app.py中通过 init_app 绑定应用
+event_broker = EventBroker()
@@ -0,0 +1,169 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+from models import db, Pond, WaterQuality
+
+
+def latest_rows_by_pond(model, order_column, pond_ids=None, columns=None):
+    """获取每个塘口的最新一条记录，返回 {pond_id: 记录}
+
+    以塘口表为驱动，用关联子查询为每个塘口取最新记录的ID，
+    整个快照只需一次数据库往返，替代逐塘口查询。
+    给出 columns 时只查询这些列（结果为行元组，可按属性名访问），不构造ORM对象。
+    """
+    latest_id = db.session.query(model.id).filter(
+        model.pond_id == Pond.id
+    ).order_by(order_column.desc(), model.id.desc()).limit(1).correlate(Pond).scalar_subquery()
+
+    if columns is None:
+        query = db.session.query(model)
+    else:
+        query = db.session.query(model.pond_id, *columns)
+    query = query.join(Pond, model.id == latest_id)
+    if pond_ids is not None:
+        query = query.filter(Pond.id.in_(list(pond_ids)))
+
+    return {row.pond_id: row for row in query.all()}
+
+
+def latest_water_quality_by_pond(pond_ids=None, columns=None):
+    """获取各塘口最新水质数据快照，返回 {pond_id: WaterQuality}
+
+    热表只保留最近 WATER_QUALITY_HOT_DAYS 天的读数，热表中没有读数的塘口
+    再从月分区文件中取最后一条真实读数（可按列名访问的行）。给出 columns
+    （WaterQuality 列名）时只查询这些列，行为 (pond_id, *columns)。
+    """
+    # storage 依赖本模块，在调用时导入
+    from services.storage import latest_partition_rows
+
+    latest = latest_rows_by_pond(
+        WaterQuality, WaterQuality.timestamp, pond_ids,
+        columns=None if columns is None else [getattr(WaterQuality, column) for column in columns]
+    )
+
+    if pond_ids is None:
+        pond_ids = [pond_id for pond_id, in db.session.query(Pond.id).all()]
+    missing = [pond_id for pond_id in pond_ids if pond_id not in latest]
+    if missing:
+        if columns is None:
+            partition_columns = [column.name for column in WaterQuality.__table__.columns]
+        else:
+            partition_columns = ['pond_id', *columns]
+        latest.update(latest_partition_rows(missing, partition_columns))
+    return latest
+
+
+# 水质指标字段（不含塘口ID和时间戳）
+METRIC_FIELDS = [
+    'temperature', 'turbidity', 'conductivity', 'water_level', 'dissolved_oxygen',
+    'ph', 'cod', 'ammonia', 'heavy_metals', 'residual_chlorine', 'total_phosphorus',
+    'total_nitrogen', 'coliform', 'algae', 'biotoxicity'
+]
+
+# 每个时间桶内为每项指标计算的聚合值
+BUCKET_STATS = ('first', 'last', 'min', 'max', 'avg')
+
+
+def bucketed_history(pond_id, start_time, end_time, interval=timedelta(hours=1), metrics=None):
+    """按时间桶聚合塘口水质数据
+
+    时间桶按 interval 对齐截断（小时桶对齐整点，天桶对齐零点），
+    所有桶的 first/last/min/max/avg 由一条 GROUP BY 语句算出。
+    返回区间内的全部时间桶，没有数据的桶 has_data 为 False、指标值为 None。
+    """
+    metrics = list(metrics or METRIC_FIELDS)
+    interval_seconds = int(interval.total_seconds())
+
+    epoch = db.cast(db.func.strftime('%s', WaterQuality.timestamp), db.Integer)
+    bucket = (epoch // interval_seconds).label('bucket')
+
+    ranked = db.session.query(
+        bucket,
+        WaterQuality.timestamp.label('timestamp'),
+        *[getattr(WaterQuality, metric).label(metric) for metric in metrics],
+        db.func.row_number().over(
+            partition_by=bucket, order_by=(WaterQuality.timestamp.asc(), WaterQuality.id.asc())
+        ).label('rn_first'),
+        db.func.row_number().over(
+            partition_by=bucket, order_by=(WaterQuality.timestamp.desc(), WaterQuality.id.desc())
+        ).label('rn_last')
+    ).filter(
+        WaterQuality.pond_id == pond_id,
+        WaterQuality.timestamp >= start_time,
+        WaterQuality.timestamp < end_time
+    ).subquery()
+
+    columns = [ranked.c.bucket, db.func.count().label('count')]
+    for metric in metrics:
+        value = ranked.c[metric]
+        columns.extend([
+            db.func.max(db.case((ranked.c.rn_first == 1, value))).label(f'{metric}_first'),
+            db.func.max(db.case((ranked.c.rn_last == 1, value))).label(f'{metric}_last'),
+            db.func.min(value).label(f'{metric}_min'),
+            db.func.max(value).label(f'{metric}_max'),
+            db.func.avg(value).label(f'{metric}_avg')
+        ])
+
+    rows = db.session.query(*columns).group_by(ranked.c.bucket).all()
+    rows_by_bucket = {row.bucket: row for row in rows}
+
+    # 补齐没有数据的时间桶
+    buckets = []
+    first_bucket = int(_epoch_seconds(start_time)) // interval_seconds
+    last_bucket = (int(_epoch_seconds(end_time)) - 1) // interval_seconds
+    for key in range(first_bucket, last_bucket + 1):
+        row = rows_by_bucket.get(key)
+        bucket_start = datetime(1970, 1, 1) + timedelta(seconds=key * interval_seconds)
+        values = {}
+        for metric in metrics:
+            values[metric] = {
+                stat: getattr(row, f'{metric}_{stat}') if row else None
+                for stat in BUCKET_STATS
+            }
+        buckets.append({
+            'bucket_start': bucket_start,
+            'bucket_end': bucket_start + interval,
+            'count': row.count if row else 0,
+            'has_data': row is not None,
+            'metrics': values
+        })
+
+    return buckets
+
+
+def hourly_series(pond_id, hours=24, metrics=None, stat='last', now=None):
+    """获取最近若干小时的逐小时水质序列（每小时一个点），用于趋势图
+
+    没有数据的小时保留时间点，指标值为 None，并标记 has_data 为 False。
+    """
+    now = now or datetime.now()
+    end_time = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    start_time = end_time - timedelta(hours=hours)
+    metrics = list(metrics or METRIC_FIELDS)
+
+    series = []
+    for bucket in bucketed_history(pond_id, start_time, end_time, timedelta(hours=1), metrics):
+        point = {
+            'timestamp': bucket['bucket_start'].strftime('%Y-%m-%d %H:%M:%S'),
+            'has_data': bucket['has_data']
+        }
+        for metric in metrics:
+            point[metric] = bucket['metrics'][metric][stat]
+        series.append(point)
+
+    return series
+
+
+_point_types = {}
+
+
+def point_type(columns):
+    """按列名生成（并缓存）行类型，与投影查询的结果行一样既可按下标也可按字段名访问"""
+    key = tuple(columns)
+    if key not in _point_types:
+        _point_types[key] = namedtuple('WaterQualityPoint', key)
+    return _point_types[key]
+
+
+def _epoch_seconds(value):
+    """将本地时间（naive datetime）按与SQLite strftime('%s')一致的方式换算为秒"""
+    return (value - datetime(1970, 1, 1)).total_seconds()
@@ -200,54 +200,148 @@ function generateMockTrendData(hours, minValue, maxValue) {
     return data;
 }
 
-// 设置自动刷新
-function setupAutoRefresh() {
-    // 自动刷新数据（每5分钟）
-    var refreshInterval = 5 * 60 * 1000; // 5分钟
-    var refreshTimer;
+// 实时推送：页面内共享一个到 /data/stream 的服务器推送（SSE）连接
+// （浏览器对同一站点的并发连接数有限），各模块通过 openLiveStream 注册回调
+var LIVE_STREAM_EVENTS = ['reading', 'alert'];
+var liveStream = { source: null, query: null, lastEventId: null, listeners: [] };
+
+// 订阅实时推送，返回带 close() 的订阅对象（浏览器不支持SSE时返回 null）
+// ponds 为关注的塘口ID数组（为空时关注全部塘口），handlers 为 {事件类型: 回调(数据)}；
+// 客户端落后太多时服务端发送 resync 事件，handlers.resync 应通过普通接口重新加载数据
+function openLiveStream(ponds, handlers) {
+    if (!window.EventSource) {
+        return null;
+    }
     
-    // 页面可见性检测
-    function handleVisibilityChange() {
-        if (document.hidden) {
-            // 页面隐藏时清除定时器
-            if (refreshTimer) {
-                clearInterval(refreshTimer);
-                refreshTimer = null;
+    var listener = {
+        ponds: ponds && ponds.length ? ponds.map(String) : null,
+        handlers: handlers,
+        close: function() {
+            liveStream.listeners = liveStream.listeners.filter(function(item) {
+                return item !== listener;
+            });
+            connectLiveStream();
+        }
+    };
+    liveStream.listeners.push(listener);
+    connectLiveStream();
+    return listener;
+}
+
+// 按全部订阅的塘口和事件类型的并集（重新）建立连接，订阅范围不变时保持现有连接
+function connectLiveStream() {
+    var types = {};
+    var ponds = {};
+    var allPonds = false;
+    liveStream.listeners.forEach(function(listener) {
+        LIVE_STREAM_EVENTS.forEach(function(type) {
+            if (listener.handlers[type]) {
+                types[type] = true;
             }
+        });
+        if (listener.ponds) {
+            listener.ponds.forEach(function(pondId) {
+                ponds[pondId] = true;
+            });
         } else {
-            // 页面可见时重新启动定时器
-            if (!refreshTimer) {
-                refreshTimer = setInterval(refreshData, refreshInterval);
-            }
-            // 页面重新可见时立即刷新一次数据
-            refreshData();
+            allPonds = true;
         }
-    }
+    });
     
-    // 添加页面可见性事件监听器
-    document.addEventListener('visibilitychange', handleVisibilityChange);
+    var query = null;
+    if (Object.keys(types).length) {
+        query = 'types=' + Object.keys(types).sort().join(',');
+        if (!allPonds) {
+            query += '&ponds=' + Object.keys(ponds).sort().join(',');
+        }
+    }
+    if (query === liveStream.query) {
+        return;
+    }
     
-    // 启动定时器
-    refreshTimer = setInterval(refreshData, refreshInterval);
+    if (liveStream.source) {
+        liveStream.source.close();
+        liveStream.source = null;
+    }
+    liveStream.query = query;
+    if (!query) {
+        return;
+    }
     
-    // 存储定时器引用，以便后续可以停止
-    window.dataRefreshTimer = refreshTimer;
-}
-
-// 停止自动刷新
-function stopAutoRefresh() {
-    if (window.dataRefreshTimer) {
-        clearInterval(window.dataRefreshTimer);
-        window.dataRefreshTimer = null;
+    // 切换订阅时带上最后收到的事件ID，服务端补发期间错过的事件
+    var url = '/data/stream?' + query;
+    if (liveStream.lastEventId) {
+        url += '&last_event_id=' + liveStream.lastEventId;
     }
-    // 移除页面可见性事件监听器
-    document.removeEventListener('visibilitychange', handleVisibilityChange);
+    var source = new EventSource(url);
+    LIVE_STREAM_EVENTS.concat(['resync']).forEach(function(type) {
+        source.addEventListener(type, function(event) {
+            if (event.lastEventId) {
+                liveStream.lastEventId = event.lastEventId;
+            }
+            var data = JSON.parse(event.data);
+            liveStream.listeners.slice().forEach(function(listener) {
+                var handler = listener.handlers[type];
+                if (!handler) {
+                    return;
+                }
+                if (type !== 'resync' && listener.ponds && listener.ponds.indexOf(String(data.pond_id)) === -1) {
+                    return;
+                }
+                handler(data);
+            });
+        });
+    });
+    liveStream.source = source;
 }
 
-// 重启自动刷新
-function restartAutoRefresh() {
-    stopAutoRefresh();
-    setupAutoRefresh();
+// 设置自动刷新：通过实时推送更新最新水质和预警，浏览器不支持SSE时每5分钟轮询
+function setupAutoRefresh() {
+    var subscription = null;
+    var refreshTimer = null;
+    
+    function start() {
+        subscription = openLiveStream([], {
+            reading: function(event) {
+                var data = {};
+                data[event.pond_id] = event.latest;
+                updateWaterQualityDisplay(data);
+            },
+            alert: function(alert) {
+                // 预警解决和内容更新只刷新列表，新建和升级时提示
+                if (alert.change === 'created' || alert.change === 'escalated') {
+                    showNewAlertsNotification([alert]);
+                }
+            },
+            resync: refreshData
+        });
+        if (!subscription) {
+            refreshTimer = setInterval(refreshData, 5 * 60 * 1000);
+        }
+    }
+    
+    function stop() {
+        if (subscription) {
+            subscription.close();
+            subscription = null;
+        }
+        if (refreshTimer) {
+            clearInterval(refreshTimer);
+            refreshTimer = null;
+        }
+    }
+    
+    // 页面隐藏时断开推送，重新可见时刷新一次数据并重新订阅
+    document.addEventListener('visibilitychange', function() {
+        if (document.hidden) {
+            stop();
+        } else if (!subscription && !refreshTimer) {
+            refreshData();
+            start();
+        }
+    });
+    
+    start();
 }
 
 $(document).ready(function() {
@@ -282,13 +376,42 @@ $(document).ready(function() {
     setupAutoRefresh();
 });
 
+// 轮询接口的条件请求：按用途记录上次渲染的URL及其 ETag / Last-Modified
+var pollValidators = {};
+
+// 以条件请求获取JSON：再次请求同一URL时带上验证器，数据未变化时服务端返回304，
+// 不再传输和渲染数据（onChange 只在数据有变化时调用）
+function pollJSON(key, url, onChange) {
+    var last = pollValidators[key];
+    var headers = {};
+    if (last && last.url === url) {
+        if (last.etag) {
+            headers['If-None-Match'] = last.etag;
+        }
+        if (last.lastModified) {
+            headers['If-Modified-Since'] = last.lastModified;
+        }
+    }
+    
+    return $.ajax({ url: url, dataType: 'json', headers: headers })
+        .done(function(data, status, xhr) {
+            if (xhr.status === 304) {
+                return;
+            }
+            onChange(data);
+            // 渲染成功后才记录验证器，渲染出错时下次请求重新获取完整数据
+            pollValidators[key] = {
+                url: url,
+                etag: xhr.getResponseHeader('ETag'),
+                lastModified: xhr.getResponseHeader('Last-Modified')
+            };
+        });
+}
+
 // 刷新数据
 function refreshData() {
-    // 获取最新水质数据
-    $.get('/data/api/latest_water_quality')
-        .done(function(data) {
-            updateWaterQualityDisplay(data);
-        })
+    // 获取最新水质数据（没有新读数时服务端返回304）
+    pollJSON('latest_water_quality', '/data/api/latest_water_quality', updateWaterQualityDisplay)
         .fail(function(xhr, status, error) {
             console.error('获取最新水质数据失败:', error);
             showToast('获取水质数据失败，请稍后重试', 'error');
@@ -0,0 +1,37 @@
+import pytest
+from flask import Flask
+from models import db, User, Pond
+
+
+@pytest.fixture
+def app(tmp_path):
+    """使用临时SQLite数据库的最小应用（不注册蓝图、后台任务和读数写入回调）"""
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}",
+        WATER_QUALITY_PARTITION_DIR=str(tmp_path / 'partitions'),
+        WATER_QUALITY_ARCHIVE_CACHE_TTL=3600,
+        COLUMNAR_ARCHIVE_ENABLED=False,
+        COLUMNAR_ARCHIVE_DIR=str(tmp_path / 'columnar'),
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def ponds(app):
+    user = User(username='测试')
+    db.session.add(user)
+    db.session.flush()
+    ponds = [
+        Pond(name='1号塘', area=5.0, species='草鱼', user_id=user.id),
+        Pond(name='2号塘', area=3.0, species='南美白对虾', user_id=user.id),
+    ]
+    db.session.add_all(ponds)
+    db.session.commit()
+    return ponds
@@ -0,0 +1,109 @@
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+import pytest
+from models import db, FeedingRecord, FeedingDecision, Alert
+from services.aggregation import daily_feeding_totals, daily_decision_stats, daily_alert_counts
+
+START = datetime(2026, 5, 1)
+END = datetime(2026, 5, 8)
+
+
+@pytest.fixture
+def history(ponds):
+    """一周的投喂记录、预警、三时段的每日方案（部分时段已应用）和没有方案日期的旧决策"""
+    rng = random.Random(7)
+    for pond in ponds:
+        for day in range(7):
+            day_start = START + timedelta(days=day)
+            for _ in range(rng.randint(0, 3)):
+                db.session.add(FeedingRecord(pond_id=pond.id, amount=round(rng.uniform(1, 5), 1),
+                                             time=day_start + timedelta(hours=rng.randint(6, 20))))
+            for _ in range(rng.randint(0, 2)):
+                db.session.add(Alert(pond_id=pond.id, level='warning', title='预警', message='',
+                                     timestamp=day_start + timedelta(hours=rng.randint(0, 23))))
+            if day % 3 != 2:
+                for slot, hour in enumerate((8, 14, 20)):
+                    db.session.add(FeedingDecision(
+                        pond_id=pond.id, recommended_amount=round(rng.uniform(1, 4), 1), reasoning='',
+                        plan_date=day_start.date(), slot=slot, slot_time=day_start + timedelta(hours=hour),
+                        applied=rng.random() < 0.5, created_at=day_start + timedelta(hours=rng.randint(0, 7))
+                    ))
+            else:
+                for _ in range(2):
+                    db.session.add(FeedingDecision(
+                        pond_id=pond.id, recommended_amount=round(rng.uniform(3, 9), 1), reasoning='',
+                        applied=rng.random() < 0.5, created_at=day_start + timedelta(hours=rng.randint(0, 23))
+                    ))
+    # 区间外的记录不计入
+    db.session.add(FeedingRecord(pond_id=ponds[0].id, amount=9.0, time=END))
+    db.session.commit()
+
+
+def python_decision_stats(by_pond):
+    """逐条遍历决策的参照实现：每日方案的各时段合为一条决策"""
+    plans = {}
+    for decision in FeedingDecision.query.filter(FeedingDecision.created_at >= START,
+                                                 FeedingDecision.created_at < END):
+        key = (decision.pond_id, decision.plan_date) if decision.plan_date else (decision.pond_id, decision.id)
+        day = (decision.plan_date or decision.created_at.date()).strftime('%Y-%m-%d')
+        plan = plans.setdefault(key, {'pond_id': decision.pond_id, 'day': day, 'slots': 0, 'applied': 0,
+                                      'recommended': 0})
+        plan['slots'] += 1
+        plan['applied'] += 1 if decision.applied else 0
+        plan['recommended'] += decision.recommended_amount
+
+    result = defaultdict(lambda: {'decisions': 0, 'applied': 0, 'recommended': 0})
+    for plan in plans.values():
+        stats = result[(plan['pond_id'], plan['day']) if by_pond else plan['day']]
+        stats['decisions'] += 1
+        stats['applied'] += plan['applied'] / plan['slots']
+        stats['recommended'] += plan['recommended']
+    return dict(result)
+
+
+def python_daily_sums(rows, time_attr, value):
+    result = defaultdict(lambda: {'value': 0, 'count': 0})
+    for row in rows:
+        timestamp = getattr(row, time_attr)
+        if START <= timestamp < END:
+            totals = result[(row.pond_id, timestamp.strftime('%Y-%m-%d'))]
+            totals['value'] += value(row)
+            totals['count'] += 1
+    return result
+
+
+def assert_stats_equal(actual, expected):
+    assert set(actual) == set(expected)
+    for key, stats in expected.items():
+        for name, value in stats.items():
+            assert actual[key][name] == pytest.approx(value), (key, name)
+
+
+@pytest.mark.parametrize('by_pond', [False, True])
+def test_decision_stats_match_python_loop(history, by_pond):
+    assert_stats_equal(daily_decision_stats(START, END, by_pond=by_pond), python_decision_stats(by_pond))
+
+
+def test_plan_slots_count_as_one_decision(history, ponds):
+    stats = daily_decision_stats(START, END, [ponds[0].id], by_pond=True)
+    plan = stats[(ponds[0].id, '2026-05-01')]
+    slots = FeedingDecision.query.filter_by(pond_id=ponds[0].id, plan_date=date(2026, 5, 1)).all()
+
+    assert plan['decisions'] == 1
+    assert plan['recommended'] == pytest.approx(sum(slot.recommended_amount for slot in slots))
+    assert plan['applied'] == pytest.approx(sum(slot.applied for slot in slots) / 3)
+
+
+def test_feeding_and_alert_totals_match_python_loop(history):
+    feeding = python_daily_sums(FeedingRecord.query.all(), 'time', lambda row: row.amount)
+    assert_stats_equal(
+        daily_feeding_totals(START, END, by_pond=True),
+        {key: {'amount': totals['value'], 'count': totals['count']} for key, totals in feeding.items()}
+    )
+
+    alerts = python_daily_sums(Alert.query.all(), 'timestamp', lambda row: 1)
+    assert_stats_equal(
+        daily_alert_counts(START, END, by_pond=True),
+        {key: {'count': totals['count']} for key, totals in alerts.items()}
+    )
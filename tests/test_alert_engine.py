@@ -0,0 +1,194 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from models import db, Alert, AlertThreshold
+from services.alert_engine import (AlertEngine, DEFAULT_THRESHOLDS, THRESHOLD_FIELDS, METRIC_FIELDS,
+                                   ensure_default_thresholds, resolve_alert, _bounds, np)
+
+TEMPERATURE = METRIC_FIELDS.index('temperature')
+START = datetime(2026, 5, 1, 8, 0, 0)
+
+# 水温默认阈值：警告 18~32，危险 15~35，回差 0.5
+
+
+def make_engine(ponds=2):
+    engine = AlertEngine()
+    bounds = [_bounds(AlertThreshold(metric=metric, enabled=True, **dict(zip(THRESHOLD_FIELDS, DEFAULT_THRESHOLDS[metric]))))
+              for metric in METRIC_FIELDS]
+    engine._thresholds = {pond_id: bounds for pond_id in range(1, ponds + 1)}
+    return engine
+
+
+def reading(minute, pond_id=1, **values):
+    row = dict.fromkeys(METRIC_FIELDS)
+    row.update(pond_id=pond_id, timestamp=START + timedelta(minutes=minute), **values)
+    return row
+
+
+def temperature_readings(values, pond_id=1, start=0):
+    return [reading(start + i, pond_id, temperature=value) for i, value in enumerate(values)]
+
+
+def random_walk(count, ponds, seed):
+    """各指标在默认阈值附近随机游走（偶有空值），与 benchmarks/bench_alert_engine.py 相同"""
+    rnd = random.Random(seed)
+    center = {}
+    for metric, (warning_min, warning_max, _, _, _) in DEFAULT_THRESHOLDS.items():
+        low = warning_min if warning_min is not None else 0.5 * warning_max
+        high = warning_max if warning_max is not None else 2 * warning_min
+        center[metric] = ((low + high) / 2, (high - low) / 2)
+
+    state = {pond_id: {metric: mid for metric, (mid, _) in center.items()} for pond_id in range(1, ponds + 1)}
+    rows = []
+    for i in range(count):
+        pond_id = i % ponds + 1
+        row = {'pond_id': pond_id, 'timestamp': START + timedelta(minutes=i // ponds)}
+        for metric, (mid, spread) in center.items():
+            state[pond_id][metric] += 0.05 * (mid - state[pond_id][metric]) + rnd.gauss(0, 0.1 * spread)
+            row[metric] = None if rnd.random() < 0.05 else state[pond_id][metric]
+        rows.append(row)
+    rnd.shuffle(rows)
+    return rows
+
+
+SCAN_PATHS = [False, pytest.param(True, marks=pytest.mark.skipif(np is None, reason='未安装numpy'))]
+
+
+@pytest.mark.parametrize('use_numpy', SCAN_PATHS)
+def test_escalate_hold_deescalate_and_resolve(use_numpy):
+    engine = make_engine()
+    values = [25, 33, 36, 34.8, 34, 31.8, 31]
+    transitions, levels, last_seen = engine.scan(temperature_readings(values), use_numpy=use_numpy)
+
+    # 34.8 仍在危险阈值回差内、31.8 仍在警告阈值回差内，级别保持
+    assert [(old, new, value) for _, index, old, new, _, value in transitions if index == TEMPERATURE] == [
+        (0, 1, 33), (1, 2, 36), (2, 1, 34), (1, 0, 31)
+    ]
+    assert levels[1][TEMPERATURE] == 0
+    assert last_seen[1] == START + timedelta(minutes=len(values) - 1)
+
+
+@pytest.mark.parametrize('use_numpy', SCAN_PATHS)
+def test_null_values_keep_level(use_numpy):
+    engine = make_engine()
+    transitions, levels, _ = engine.scan(temperature_readings([33, None, None]), use_numpy=use_numpy)
+    assert [(old, new) for _, _, old, new, _, _ in transitions] == [(0, 1)]
+    assert levels[1][TEMPERATURE] == 1
+
+
+@pytest.mark.parametrize('use_numpy', SCAN_PATHS)
+def test_late_readings_ignored(use_numpy):
+    engine = make_engine()
+    engine._levels = {1: [0] * len(METRIC_FIELDS)}
+    engine._last_seen = {1: START + timedelta(minutes=10)}
+
+    # 早于已评估读数的迟到数据不参与评估，之后的读数从已有级别继续
+    rows = temperature_readings([40, 40], start=0) + temperature_readings([33], start=11)
+    transitions, levels, last_seen = engine.scan(rows, use_numpy=use_numpy)
+    assert [(old, new, timestamp) for _, _, old, new, timestamp, _ in transitions] == [
+        (0, 1, START + timedelta(minutes=11))
+    ]
+    assert last_seen[1] == START + timedelta(minutes=11)
+
+
+@pytest.mark.parametrize('use_numpy', SCAN_PATHS)
+def test_initial_levels_continue_from_previous_batch(use_numpy):
+    engine = make_engine()
+    engine._levels = {1: [0] * len(METRIC_FIELDS)}
+    engine._levels[1][TEMPERATURE] = 2
+    transitions, _, _ = engine.scan(temperature_readings([34.8, 33]), use_numpy=use_numpy)
+    assert [(old, new) for _, _, old, new, _, _ in transitions] == [(2, 1)]
+
+
+@pytest.mark.skipif(np is None, reason='未安装numpy')
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_numpy_and_python_paths_agree(seed):
+    rows = random_walk(3000, ponds=3, seed=seed)
+    engine = make_engine(ponds=3)
+    engine._levels = {2: [1] * len(METRIC_FIELDS)}
+    engine._last_seen = {3: START + timedelta(minutes=200)}
+
+    expected = engine.scan(rows, use_numpy=False)
+    actual = engine.scan(rows, use_numpy=True)
+    assert expected[0]
+    assert actual == expected
+
+
+def test_evaluate_keeps_one_alert_per_condition(app, ponds):
+    ensure_default_thresholds()
+    engine = AlertEngine()
+    engine.app = app
+    pond_id = ponds[0].id
+
+    def active():
+        return Alert.query.filter_by(pond_id=pond_id, metric='temperature', status='active').all()
+
+    engine.evaluate(temperature_readings([33, 33.5], pond_id))
+    alerts = active()
+    assert [(alert.level, alert.value, alert.threshold) for alert in alerts] == [('warning', 33, 32)]
+
+    # 升级为危险时更新同一条记录；降为警告时保留最高级别
+    engine.evaluate(temperature_readings([36, 34], pond_id, start=2))
+    assert [(alert.id, alert.level) for alert in active()] == [(alerts[0].id, 'danger')]
+
+    engine.evaluate(temperature_readings([31], pond_id, start=4))
+    assert active() == []
+    assert db.session.get(Alert, alerts[0].id).status == 'resolved'
+
+
+def test_evaluate_reuses_alert_opened_by_other_worker(app, ponds):
+    ensure_default_thresholds()
+    pond_id = ponds[0].id
+    first, second = AlertEngine(), AlertEngine()
+    first.app = second.app = app
+
+    # 两个工作进程的引擎都已加载状态，其中一个先建立预警
+    second.evaluate(temperature_readings([25], pond_id))
+    first.evaluate(temperature_readings([33], pond_id, start=1))
+    second.evaluate(temperature_readings([36], pond_id, start=2))
+
+    alerts = Alert.query.filter_by(pond_id=pond_id, metric='temperature').all()
+    assert [(alert.status, alert.level) for alert in alerts] == [('active', 'danger')]
+
+
+def test_manual_resolution_is_latched_until_metric_clears(app, ponds):
+    ensure_default_thresholds()
+    engine = AlertEngine()
+    engine.app = app
+    pond_id = ponds[0].id
+
+    def temperature_alerts():
+        return [(alert.status, alert.latched) for alert in
+                Alert.query.filter_by(pond_id=pond_id, metric='temperature').order_by(Alert.id)]
+
+    engine.evaluate(temperature_readings([33], pond_id))
+    resolve_alert(Alert.query.filter_by(pond_id=pond_id, metric='temperature').one())
+    db.session.commit()
+
+    # 重新加载状态后（或在其他工作进程中）指标仍超限，不再触发
+    engine.invalidate_thresholds()
+    engine.evaluate(temperature_readings([33.2, 33.4], pond_id, start=1))
+    restarted = AlertEngine()
+    restarted.app = app
+    restarted.evaluate(temperature_readings([33.5], pond_id, start=3))
+    assert temperature_alerts() == [('resolved', True)]
+
+    # 恢复正常后解除锁存，再次超限时新建预警
+    restarted.evaluate(temperature_readings([31, 33], pond_id, start=4))
+    assert temperature_alerts() == [('resolved', None), ('active', None)]
+
+
+def test_escalation_after_manual_resolution_opens_new_alert(app, ponds):
+    ensure_default_thresholds()
+    engine = AlertEngine()
+    engine.app = app
+    pond_id = ponds[0].id
+
+    engine.evaluate(temperature_readings([33], pond_id))
+    resolve_alert(Alert.query.filter_by(pond_id=pond_id, metric='temperature').one())
+    db.session.commit()
+    engine.invalidate_thresholds()
+
+    engine.evaluate(temperature_readings([36], pond_id, start=1))
+    alerts = Alert.query.filter_by(pond_id=pond_id, metric='temperature').order_by(Alert.id).all()
+    assert [(alert.status, alert.level) for alert in alerts] == [('resolved', 'warning'), ('active', 'danger')]
@@ -0,0 +1,95 @@
+from datetime import datetime
+import pytest
+from flask import jsonify
+from werkzeug.datastructures import MultiDict
+from models import db, FeedingRecord
+from services.cache import MemoryCacheBackend, FileCacheBackend, ResponseCache, response_cache, cached
+from services.ingest import insert_readings
+from services.water_quality import METRIC_FIELDS
+
+
+def make_cache(backend):
+    cache = ResponseCache()
+    cache.backend = backend
+    return cache
+
+
+@pytest.mark.parametrize('backend', ['memory', 'file'])
+def test_invalidate_changes_keys_of_written_pond_only(backend, tmp_path):
+    cache = make_cache(MemoryCacheBackend() if backend == 'memory' else FileCacheBackend(str(tmp_path)))
+    args = MultiDict({'days': '7'})
+    pond_1, pond_2, all_ponds = (cache.make_key('view', args, 1), cache.make_key('view', args, 2),
+                                 cache.make_key('view', args))
+    cache.set(pond_1, 'cached', ttl=60)
+    assert cache.get(pond_1) == 'cached'
+
+    cache.invalidate({1})
+    assert cache.make_key('view', args, 1) != pond_1
+    assert cache.make_key('view', args, 2) == pond_2
+    # 不区分塘口的缓存项随任一塘口的写入失效
+    assert cache.make_key('view', args) != all_ponds
+
+
+def test_file_backend_shared_between_processes(tmp_path):
+    first, second = make_cache(FileCacheBackend(str(tmp_path))), make_cache(FileCacheBackend(str(tmp_path)))
+    key = first.make_key('view', MultiDict(), 1)
+    first.set(key, 'cached', ttl=60)
+    assert second.get(second.make_key('view', MultiDict(), 1)) == 'cached'
+
+    second.invalidate({1})
+    assert first.make_key('view', MultiDict(), 1) != key
+
+
+def test_memory_backend_expires_and_evicts():
+    backend = MemoryCacheBackend(max_entries=2)
+    backend.set('a', 1, ttl=60)
+    backend.set('b', 2, ttl=60)
+    backend.get('a')
+    backend.set('c', 3, ttl=60)
+    assert (backend.get('a'), backend.get('b'), backend.get('c')) == (1, None, 3)
+
+    backend.set('d', 4, ttl=-1)
+    assert backend.get('d') is None
+
+
+@pytest.fixture
+def cached_app(app, ponds):
+    app.config['RESPONSE_CACHE_BACKEND'] = 'memory'
+    response_cache.init_app(app)
+    calls = []
+
+    @app.route('/pond/<int:pond_id>')
+    @cached(pond_arg='pond_id')
+    def pond_view(pond_id):
+        calls.append(pond_id)
+        return jsonify({'pond_id': pond_id, 'calls': len(calls)})
+
+    yield app
+    # 测试结束后停用全局缓存（已注册的失效回调在没有后端时直接返回）
+    response_cache.backend = None
+
+
+def test_cached_view_invalidated_by_readings_and_commits(cached_app, ponds):
+    client = cached_app.test_client()
+    pond_id, other_id = ponds[0].id, ponds[1].id
+
+    assert client.get(f'/pond/{pond_id}').headers['X-Cache'] == 'MISS'
+    assert client.get(f'/pond/{pond_id}').headers['X-Cache'] == 'HIT'
+    client.get(f'/pond/{other_id}')
+
+    row = dict.fromkeys(METRIC_FIELDS, 1.0)
+    row.update(pond_id=pond_id, timestamp=datetime(2026, 5, 1))
+    insert_readings([row])
+    assert client.get(f'/pond/{pond_id}').headers['X-Cache'] == 'MISS'
+    assert client.get(f'/pond/{other_id}').headers['X-Cache'] == 'HIT'
+
+    # 回滚的写入不使缓存失效，提交的写入使对应塘口失效
+    db.session.add(FeedingRecord(pond_id=other_id, amount=1.0, time=datetime(2026, 5, 1)))
+    db.session.flush()
+    db.session.rollback()
+    assert client.get(f'/pond/{other_id}').headers['X-Cache'] == 'HIT'
+
+    db.session.add(FeedingRecord(pond_id=other_id, amount=1.0, time=datetime(2026, 5, 1)))
+    db.session.commit()
+    assert client.get(f'/pond/{other_id}').headers['X-Cache'] == 'MISS'
+    assert client.get(f'/pond/{pond_id}').headers['X-Cache'] == 'HIT'
@@ -0,0 +1,89 @@
+from datetime import date, datetime, timedelta
+import pytest
+from models import db, WaterQuality, WaterQualityDayArchive
+from services import columnar_archive
+from services.columnar_archive import archive_closed_days, iter_pond_history, load_pond_history_columns
+from services.ingest import insert_readings
+from services.storage import iter_water_quality
+from services.water_quality import METRIC_FIELDS
+
+pytest.importorskip('pyarrow')
+
+START = datetime(2026, 5, 1)
+NOW = datetime(2026, 5, 3, 12)
+COLUMNS = ['timestamp', 'temperature', 'turbidity', 'ph']
+
+
+def make_rows(pond_id, start, count, step=timedelta(hours=1)):
+    rows = []
+    for i in range(count):
+        row = dict.fromkeys(METRIC_FIELDS, 1.0)
+        row.update(pond_id=pond_id, timestamp=start + i * step, temperature=20 + i % 7,
+                   turbidity=None if i % 5 == 0 else float(i))
+        rows.append(row)
+    return rows
+
+
+@pytest.fixture
+def columnar(app):
+    app.config['COLUMNAR_ARCHIVE_ENABLED'] = True
+    return app
+
+
+@pytest.fixture
+def write_calls(monkeypatch):
+    calls = []
+    real_write = columnar_archive.write_day_archive
+
+    def write(pond_id, day):
+        calls.append((pond_id, day))
+        return real_write(pond_id, day)
+    monkeypatch.setattr(columnar_archive, 'write_day_archive', write)
+    return calls
+
+
+def test_column_reads_match_row_reads_across_archived_days(columnar, ponds):
+    pond_id = ponds[0].id
+    insert_readings(make_rows(pond_id, START, 60))
+    expected = [tuple(row) for row in iter_water_quality(COLUMNS, START + timedelta(hours=5), None, [pond_id])]
+
+    assert archive_closed_days(now=NOW) == 2
+    rows = [tuple(row) for row in iter_pond_history(pond_id, COLUMNS, START + timedelta(hours=5))]
+    columns = load_pond_history_columns(pond_id, COLUMNS, START + timedelta(hours=5))
+
+    assert rows == expected
+    assert [tuple(row) for row in zip(*(columns[column] for column in COLUMNS))] == expected
+    assert columns['turbidity'].count(None) == sum(1 for row in expected if row[2] is None)
+
+    window = load_pond_history_columns(pond_id, COLUMNS, START + timedelta(hours=20), START + timedelta(hours=30))
+    assert window['timestamp'] == [START + timedelta(hours=hour) for hour in range(20, 30)]
+
+
+def test_archived_days_are_not_rescanned(columnar, ponds, write_calls):
+    insert_readings(make_rows(ponds[0].id, START, 48))
+    assert archive_closed_days(now=NOW) == 2
+    assert archive_closed_days(now=NOW) == 0
+    assert len(write_calls) == 2
+
+
+def test_day_without_raw_data_is_recorded_as_unrecoverable(columnar, ponds, write_calls):
+    pond_id = ponds[0].id
+    insert_readings(make_rows(pond_id, START, 24))
+    # 按保留策略删除了原始数据，天汇总仍在
+    WaterQuality.query.delete()
+    db.session.commit()
+
+    assert archive_closed_days(now=NOW) == 0
+    archive = db.session.get(WaterQualityDayArchive, (pond_id, date(2026, 5, 1)))
+    assert archive.unrecoverable and archive.row_count == 24
+    assert load_pond_history_columns(pond_id, COLUMNS, START, START + timedelta(days=1))['timestamp'] == []
+
+    assert archive_closed_days(now=NOW) == 0
+    assert len(write_calls) == 1
+
+    # 有迟到读数时天汇总计数变化，重新写出
+    insert_readings(make_rows(pond_id, START + timedelta(minutes=30), 1))
+    assert archive_closed_days(now=NOW) == 1
+    archive = db.session.get(WaterQualityDayArchive, (pond_id, date(2026, 5, 1)))
+    assert not archive.unrecoverable and archive.row_count == 1
+    assert len(write_calls) == 2
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+from models import db, WaterQuality
+from services.conditional import water_quality_validators
+
+
+def reading(pond_id):
+    return WaterQuality(pond_id=pond_id, timestamp=datetime(2026, 5, 1, 10), temperature=25.0,
+                        ph=7.2, dissolved_oxygen=6.1, ammonia=0.2)
+
+
+def test_validators_change_with_new_reading(ponds):
+    pond_id = ponds[0].id
+    before = water_quality_validators([pond_id])
+    db.session.add(reading(pond_id))
+    db.session.commit()
+    after = water_quality_validators([pond_id])
+
+    assert before[0] != after[0]
+    assert after[1] is not None
+
+
+def test_validators_change_when_window_moves(ponds):
+    pond_id = ponds[0].id
+    db.session.add(reading(pond_id))
+    db.session.commit()
+
+    window = datetime(2026, 5, 1, 9)
+    etag, last_modified = water_quality_validators([pond_id], window)
+    assert water_quality_validators([pond_id], window)[0] == etag
+
+    moved_etag, moved_last_modified = water_quality_validators([pond_id], window + timedelta(hours=2))
+    assert moved_etag != etag
+    assert moved_last_modified > last_modified
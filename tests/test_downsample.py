@@ -0,0 +1,27 @@
+import math
+
+import pytest
+
+from services.downsample import downsample_indices
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+@pytest.mark.parametrize('metrics,threshold', [(15, 20), (15, 3), (3, 20), (1, 500)])
+def test_downsample_indices_respects_budget(method, metrics, threshold):
+    xs = list(range(5000))
+    series = {
+        f'm{k}': [math.sin(x / (k + 3)) * (k + 1) for x in xs]
+        for k in range(metrics)
+    }
+    indices = downsample_indices(xs, series, threshold, method)
+
+    assert len(indices) <= threshold
+    assert indices == sorted(set(indices))
+    if method == 'lttb':
+        assert indices[0] == 0
+        assert indices[-1] == len(xs) - 1
+
+
+def test_downsample_indices_returns_all_points_under_budget():
+    xs = list(range(10))
+    assert downsample_indices(xs, {'ph': [7.0] * 10}, 20) == list(range(10))
@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pytest
+from models import db
+from services import export as export_module
+from services.export import ExportPool, chunk_lines
+from services.ingest import insert_readings
+from services.scheduler import Scheduler
+from services.water_quality import METRIC_FIELDS
+
+NOW = datetime(2026, 5, 2)
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """记录最大在途任务数的线程池，代替工作进程（线程中推入应用上下文）"""
+
+    def __init__(self, app):
+        super().__init__(max_workers=2, initializer=lambda: app.app_context().push())
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.submitted = 0
+        self._count_lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        with self._count_lock:
+            self.in_flight += 1
+            self.submitted += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        future = super().submit(fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, _future):
+        with self._count_lock:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def pool(app, ponds, monkeypatch):
+    for pond in ponds:
+        rows = []
+        for hour in range(3):
+            row = dict.fromkeys(METRIC_FIELDS, 1.0)
+            row.update(pond_id=pond.id, timestamp=NOW - timedelta(hours=hour + 1))
+            rows.append(row)
+        insert_readings(rows)
+
+    pool = ExportPool()
+    pool.app = app
+    pool.processes = 2
+    executor = CountingExecutor(app)
+    monkeypatch.setattr(pool, '_get_executor', lambda: executor)
+    yield pool
+    executor.shutdown()
+
+
+def export_chunks(pool, ponds):
+    return pool.chunks(ponds, ['temperature'], NOW - timedelta(days=1), NOW, 1, None, 'csv')
+
+
+def test_worker_config_forwards_sqlite_tuning(app):
+    app.config.update(SQLITE_PROFILE='production', SQLITE_PRAGMAS={'cache_size': -2000},
+                      SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 30}})
+    pool = ExportPool()
+    pool.app = app
+    config = pool._worker_config()
+
+    assert config['SQLALCHEMY_DATABASE_URI'].endswith('?mode=ro&uri=true')
+    assert config['SQLALCHEMY_ENGINE_OPTIONS'] == {'connect_args': {'timeout': 30}}
+    assert config['SQLITE_PRAGMAS']['busy_timeout'] == 5000
+    assert config['SQLITE_PRAGMAS']['cache_size'] == -2000
+    assert 'journal_mode' not in config['SQLITE_PRAGMAS']
+    assert config['COLUMNAR_ARCHIVE_DIR'] == app.config['COLUMNAR_ARCHIVE_DIR']
+
+    # 工作进程的初始化在当前进程中执行一次：只读连接上生效了相同的busy_timeout
+    export_module._init_worker(config)
+    try:
+        assert db.session.execute(db.text('PRAGMA busy_timeout')).scalar() == 5000
+        with pytest.raises(Exception):
+            db.session.execute(db.text("INSERT INTO user (username) VALUES ('x')"))
+    finally:
+        db.session.remove()
+        db.engine.dispose()
+        export_module._worker_context.pop()
+
+
+def test_chunks_are_merged_in_pond_order_with_bounded_in_flight_tasks(pool, ponds):
+    pool.processes = 1
+    many = ponds * 3
+    pool.parallel = lambda pond_count: True
+
+    results = [(pond.id, count, list(chunk_lines(path))) for pond, path, count in export_chunks(pool, many)]
+    executor = pool._get_executor()
+    assert [pond_id for pond_id, _, _ in results] == [pond.id for pond in many]
+    assert all(count == 3 and len(lines) == 3 for _, count, lines in results)
+    assert executor.submitted == len(many)
+    assert executor.max_in_flight <= pool.processes
+
+
+def test_closing_export_removes_temporary_directory(pool, ponds):
+    chunks = export_chunks(pool, ponds)
+    _, path, _ = next(chunks)
+    directory = os.path.dirname(path)
+    assert os.path.isdir(directory)
+
+    chunks.close()
+    pool._get_executor().shutdown(wait=True)
+    assert not os.path.exists(directory)
+
+
+def test_start_launches_the_pool_once(app, monkeypatch):
+    pool = ExportPool()
+    pool.app = app
+    pool.processes = 2
+    started = threading.Event()
+    calls = []
+
+    def prestart():
+        calls.append(1)
+        started.wait(5)
+        pool._starting = False
+    monkeypatch.setattr(pool, '_prestart', prestart)
+
+    pool.start()
+    pool.start()
+    started.set()
+    for _ in range(50):
+        if not pool._starting:
+            break
+        time.sleep(0.1)
+    assert calls == [1]
+
+    pool.prestart = False
+    pool.start()
+    assert calls == [1]
+
+
+def test_only_one_scheduler_runs_jobs(app, tmp_path):
+    app.config['SCHEDULER_LOCK_PATH'] = str(tmp_path / 'scheduler.lock')
+    first, second = Scheduler(app), Scheduler(app)
+
+    assert first.is_leader()
+    assert not second.is_leader()
+
+    # 持有锁的进程退出后由其他进程接替
+    first.stop()
+    assert second.is_leader()
+    second.stop()
@@ -0,0 +1,72 @@
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from models import db, FeedingRecord, WaterQuality
+from services import feeding_engine
+from services.feeding_engine import (calculate_feeding_amount, feeding_recommendations, load_feeding_state,
+                                     recommend_feeding_amounts, round_amounts, np)
+
+pytestmark = pytest.mark.skipif(np is None, reason='需要numpy')
+
+NOW = datetime(2026, 5, 1, 12)
+
+# 各系数的分界值及其两侧
+BOUNDARIES = {
+    'dissolved_oxygen': (3.9, 4.0, 4.1, 6.9, 7.0, 7.1),
+    'temperature': (19.9, 20, 20.1, 27.9, 28, 28.1),
+    'ph': (6.9, 7.0, 7.1, 8.4, 8.5, 8.6),
+    'ammonia': (0.39, 0.4, 0.41),
+}
+HOURS = (None, 5.9, 6, 6.1, 23.9, 24, 24.1)
+
+
+def random_case(rng):
+    water_quality = {}
+    for metric, values in BOUNDARIES.items():
+        # 一半取分界值附近，一半在分界值两侧随机取值
+        water_quality[metric] = (rng.choice(values) if rng.random() < 0.5
+                                 else round(rng.uniform(values[0] - 2, values[-1] + 2), 2))
+    hours = rng.choice(HOURS)
+    feeding = None if hours is None else SimpleNamespace(time=NOW - timedelta(hours=hours))
+    pond = SimpleNamespace(area=rng.choice([0.1, 0.3, 1.0, 2.5, rng.uniform(0.1, 50)]))
+    return pond, water_quality, feeding
+
+
+def test_batch_amounts_match_scalar_calculation():
+    rng = random.Random(21)
+    cases = [random_case(rng) for _ in range(3000)]
+
+    amounts = recommend_feeding_amounts(
+        [pond.area for pond, _, _ in cases],
+        *([quality[metric] for _, quality, _ in cases] for metric in feeding_engine.FEEDING_METRICS),
+        [(NOW - feeding.time).total_seconds() / 3600 if feeding else float('nan') for _, _, feeding in cases]
+    )
+    assert amounts == [calculate_feeding_amount(pond, quality, feeding, NOW) for pond, quality, feeding in cases]
+
+
+def test_round_amounts_matches_round_at_half_steps():
+    values = np.array([0.05, 0.15, 0.25, 0.35, 1.45, 2.675, 10.05, 12.25, 0.5, 3.0])
+    assert round_amounts(values) == [round(value, 1) for value in values.tolist()]
+
+
+def test_recommendations_with_and_without_numpy_agree(app, ponds, monkeypatch):
+    db.session.add_all([
+        WaterQuality(pond_id=ponds[0].id, timestamp=NOW - timedelta(hours=1), temperature=28.0, ph=8.5,
+                     dissolved_oxygen=7.0, ammonia=0.41),
+        FeedingRecord(pond_id=ponds[0].id, amount=3.0, time=NOW - timedelta(hours=6)),
+        FeedingRecord(pond_id=ponds[1].id, amount=2.0, time=NOW - timedelta(hours=30)),
+    ])
+    db.session.commit()
+    state = load_feeding_state()
+    fixed_quality = {'temperature': 19.9, 'dissolved_oxygen': 3.9, 'ph': 7.0, 'ammonia': 0.2}
+
+    vectorized = feeding_recommendations(state, lambda: dict(fixed_quality), NOW)
+    monkeypatch.setattr(feeding_engine, 'np', None)
+    scalar = feeding_recommendations(state, lambda: dict(fixed_quality), NOW)
+
+    assert [amount for *_, amount in vectorized] == [amount for *_, amount in scalar]
+    assert [quality for _, quality, _, _ in vectorized][1] == fixed_quality
+    assert [amount for *_, amount in vectorized] == [
+        calculate_feeding_amount(pond, quality, feeding, NOW) for pond, quality, feeding, _ in scalar
+    ]
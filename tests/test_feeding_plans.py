@@ -0,0 +1,88 @@
+import json
+from datetime import datetime
+import pytest
+from werkzeug.datastructures import MultiDict
+from models import db, FeedingDecision, WaterQuality
+from services.cache import MemoryCacheBackend, response_cache
+from services.feeding_engine import calculate_feeding_amount
+from services.feeding_plans import FeedingPlanner
+
+NOW = datetime(2026, 5, 1, 10, 0, 0)
+
+
+def add_reading(pond_id, timestamp, **metrics):
+    values = {'temperature': 25.0, 'ph': 7.5, 'dissolved_oxygen': 6.0, 'ammonia': 0.2}
+    values.update(metrics)
+    db.session.add(WaterQuality(pond_id=pond_id, timestamp=timestamp, **values))
+    db.session.commit()
+
+
+@pytest.fixture
+def planner(ponds):
+    for pond in ponds:
+        add_reading(pond.id, datetime(2026, 5, 1, 9))
+    return FeedingPlanner()
+
+
+def decisions():
+    return FeedingDecision.query.order_by(FeedingDecision.pond_id, FeedingDecision.slot).all()
+
+
+def test_plan_stores_each_slots_share_of_the_daily_amount(planner, ponds):
+    result = planner.plan(now=NOW)
+    assert result == {'ponds': 2, 'created': 6, 'updated': 0}
+
+    rows = decisions()
+    assert [(row.pond_id, row.slot, row.slot_time.hour) for row in rows] == [
+        (pond.id, slot, hour) for pond in ponds for slot, hour in enumerate((8, 14, 20))
+    ]
+    ponds_by_id = {pond.id: pond for pond in ponds}
+    for row in rows:
+        daily = calculate_feeding_amount(ponds_by_id[row.pond_id], json.loads(row.water_quality), None,
+                                         max(NOW, row.slot_time))
+        assert row.recommended_amount == round(daily / 3, 1)
+
+
+def test_plan_is_idempotent(planner):
+    planner.plan(now=NOW)
+    assert planner.plan(now=NOW) == {'ponds': 2, 'created': 0, 'updated': 0}
+    assert len(decisions()) == 6
+
+
+def test_plan_updates_future_unapplied_slots_beyond_tolerance(planner, ponds):
+    planner.plan(now=NOW)
+    pond_id = ponds[0].id
+    before = {row.slot: row.recommended_amount for row in decisions() if row.pond_id == pond_id}
+
+    # 各指标变化都在容差内：不更新
+    add_reading(pond_id, datetime(2026, 5, 1, 9, 30), temperature=25.2)
+    assert planner.plan([pond_id], now=NOW)['updated'] == 0
+
+    # 溶解氧降到4以下，推荐量减少30%：只更新尚未到时间且未应用的时段
+    FeedingDecision.query.filter_by(pond_id=pond_id, slot=2).update({'applied': True})
+    db.session.commit()
+    add_reading(pond_id, datetime(2026, 5, 1, 9, 45), dissolved_oxygen=3.0)
+    assert planner.plan([pond_id], now=NOW)['updated'] == 1
+
+    after = {row.slot: row.recommended_amount for row in decisions() if row.pond_id == pond_id}
+    assert after[0] == before[0]
+    assert after[1] < before[1]
+    assert after[2] == before[2]
+
+
+def test_refresh_plans_only_dirty_ponds_after_first_run(planner, ponds):
+    assert planner.refresh(NOW)['ponds'] == 2
+    assert planner.refresh(NOW) == {'ponds': 0, 'created': 0, 'updated': 0}
+
+    planner.mark_dirty({ponds[1].id})
+    assert planner.refresh(NOW)['ponds'] == 1
+
+
+def test_plan_invalidates_cached_responses(planner, ponds):
+    response_cache.backend = MemoryCacheBackend()
+    try:
+        key = response_cache.make_key('view', MultiDict(), ponds[0].id)
+        planner.plan(now=NOW)
+        assert response_cache.make_key('view', MultiDict(), ponds[0].id) != key
+    finally:
+        response_cache.backend = None
@@ -0,0 +1,68 @@
+from datetime import datetime, timezone
+import pytest
+from services.ingest import validate_readings, REQUIRED_METRICS
+from services.water_quality import METRIC_FIELDS
+
+NOW = datetime(2026, 5, 1, 12, 0, 0)
+
+
+def reading(**fields):
+    item = {'pond_id': 1, 'timestamp': '2026-05-01T10:00:00', 'temperature': 25.5,
+            'ph': 7.2, 'dissolved_oxygen': 6.1, 'ammonia': 0.2}
+    item.update(fields)
+    return item
+
+
+def test_valid_reading_fills_all_columns():
+    rows, rejects = validate_readings([reading(turbidity=12)], {1}, NOW)
+    assert rejects == []
+    row = rows[0]
+    assert set(row) == {'pond_id', 'timestamp', *METRIC_FIELDS}
+    assert row['timestamp'] == datetime(2026, 5, 1, 10, 0, 0)
+    assert row['turbidity'] == 12.0 and row['turbidity'].__class__ is float
+    assert row['cod'] is None
+
+
+def test_missing_timestamp_uses_now():
+    rows, _ = validate_readings([reading(timestamp=None)], {1}, NOW)
+    assert rows[0]['timestamp'] == NOW
+
+
+def test_aware_timestamp_converted_to_local_time():
+    rows, _ = validate_readings([reading(timestamp='2026-05-01T02:00:00Z')], {1}, NOW)
+    expected = datetime(2026, 5, 1, 2, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    assert rows[0]['timestamp'] == expected
+
+
+@pytest.mark.parametrize('item, error', [
+    ('not a dict', '读数必须是JSON对象'),
+    (reading(unknown=1), '未知字段: unknown'),
+    (reading(pond_id=True), 'pond_id 必须是整数'),
+    (reading(pond_id='1'), 'pond_id 必须是整数'),
+    (reading(pond_id=9), '塘口不存在: 9'),
+    (reading(timestamp='yesterday'), '时间格式错误: yesterday'),
+    (reading(timestamp=1714550400), 'timestamp 必须是ISO 8601字符串'),
+    (reading(ph=None), '缺少必填指标: ph'),
+    (reading(temperature=float('nan')), '指标 temperature 必须是有限数值'),
+    (reading(temperature=float('inf')), '指标 temperature 必须是有限数值'),
+    (reading(temperature='25'), '指标 temperature 必须是有限数值'),
+    (reading(turbidity=True), '指标 turbidity 必须是有限数值'),
+])
+def test_invalid_readings_rejected(item, error):
+    rows, rejects = validate_readings([item], {1}, NOW)
+    assert rows == []
+    assert rejects == [{'index': 0, 'error': error}]
+
+
+def test_rejects_keep_batch_positions():
+    # 解析失败的NDJSON行以 None 占位，不产生拒绝项，其余拒绝项的下标与原位置一致
+    items = [reading(), None, reading(pond_id=2), reading(timestamp='2026-05-01T11:00:00')]
+    rows, rejects = validate_readings(items, {1}, NOW)
+    assert [row['timestamp'] for row in rows] == [datetime(2026, 5, 1, 10), datetime(2026, 5, 1, 11)]
+    assert rejects == [{'index': 2, 'error': '塘口不存在: 2'}]
+
+
+def test_optional_metrics_may_be_missing():
+    rows, rejects = validate_readings([reading()], {1}, NOW)
+    assert rejects == []
+    assert all(rows[0][metric] is None for metric in METRIC_FIELDS if metric not in REQUIRED_METRICS)
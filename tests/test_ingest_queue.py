@@ -0,0 +1,140 @@
+import json
+import sqlite3
+import time
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+from models import WaterQuality
+from services import ingest_queue as ingest_queue_module
+from services.ingest_queue import IngestQueue, IngestQueueFull
+from services.water_quality import METRIC_FIELDS
+
+
+def make_rows(pond_id, count):
+    rows = []
+    for i in range(count):
+        row = dict.fromkeys(METRIC_FIELDS, 1.0)
+        row.update(pond_id=pond_id, timestamp=datetime(2026, 5, 1) + timedelta(minutes=i))
+        rows.append(row)
+    return rows
+
+
+def sqlite_error(message, code):
+    error = sqlite3.OperationalError(message)
+    error.sqlite_errorcode = code
+    return OperationalError('INSERT INTO water_quality', {}, error)
+
+
+@pytest.fixture
+def queue(app, tmp_path):
+    queue = IngestQueue()
+    queue.app = app
+    queue.retry_backoff = 0
+    queue.dead_letter_path = str(tmp_path / 'dead_letter.ndjson')
+    return queue
+
+
+@pytest.fixture
+def failing_insert(monkeypatch):
+    """让 insert_readings 按 fail(rows, 调用次数) 的返回值抛出异常，返回每次调用的条数"""
+    calls = []
+
+    def install(fail):
+        real_insert = ingest_queue_module.insert_readings
+
+        def insert(rows):
+            calls.append(len(rows))
+            error = fail(rows, len(calls))
+            if error is not None:
+                raise error
+            return real_insert(rows)
+        monkeypatch.setattr(ingest_queue_module, 'insert_readings', insert)
+        return calls
+    return install
+
+
+def dead_letters(queue):
+    with open(queue.dead_letter_path, encoding='utf-8') as lines:
+        return [json.loads(line) for line in lines]
+
+
+def test_next_batch_never_exceeds_batch_size(queue):
+    queue.batch_size = 100
+    first, second = make_rows(1, 250), make_rows(2, 30)
+    queue._pending.extend([first, second])
+    queue._pending_rows = 280
+    queue._oldest_enqueued_at = time.monotonic()
+
+    batches = [queue._next_batch() for _ in range(3)]
+    assert [len(batch) for batch in batches] == [100, 100, 80]
+    assert [row for batch in batches for row in batch] == first + second
+    assert queue._pending_rows == 0
+    assert queue.metrics()['depth'] == 280
+
+
+def test_locked_database_is_retried_until_written(queue, ponds, failing_insert):
+    queue.max_retries = 0
+    calls = failing_insert(lambda rows, call: sqlite_error('database is locked', 5) if call <= 4 else None)
+    queue._writing_rows = 10
+
+    queue._write(make_rows(ponds[0].id, 10))
+    assert calls == [10] * 5
+    assert WaterQuality.query.count() == 10
+    metrics = queue.metrics()
+    assert (metrics['retries'], metrics['committed_rows'], metrics['failed_rows'], metrics['depth']) == (4, 10, 0, 0)
+
+
+def test_schema_error_dead_letters_the_batch_without_retrying_forever(queue, ponds, failing_insert):
+    queue.max_retries = 2
+    calls = failing_insert(lambda rows, call: sqlite_error('no such table: water_quality', 1))
+    queue._writing_rows = 8
+
+    queue._write(make_rows(ponds[0].id, 8))
+    # 重试 max_retries 次后整批转入死信文件，不拆分
+    assert calls == [8, 8, 8]
+    assert len(dead_letters(queue)) == 8
+    assert 'no such table' in dead_letters(queue)[0]['error']
+    assert queue.metrics()['failed_rows'] == 8
+    assert queue.metrics()['depth'] == 0
+
+
+def test_invalid_reading_is_isolated_and_dead_lettered(queue, ponds, failing_insert):
+    queue.max_retries = 1
+    rows = make_rows(ponds[0].id, 9)
+    rows[6]['temperature'] = 'bad'
+    failing_insert(lambda batch, call: IntegrityError('INSERT', {}, sqlite3.IntegrityError('CHECK'))
+                   if any(row['temperature'] == 'bad' for row in batch) else None)
+    queue._writing_rows = 9
+
+    queue._write(rows)
+    assert WaterQuality.query.count() == 8
+    letters = dead_letters(queue)
+    assert len(letters) == 1 and letters[0]['reading']['temperature'] == 'bad'
+    assert (queue.metrics()['committed_rows'], queue.metrics()['failed_rows']) == (8, 1)
+
+
+def test_submit_rejects_when_queue_is_full(queue, monkeypatch):
+    monkeypatch.setattr(queue, '_ensure_writer', lambda: None)
+    queue.max_rows = 10
+    queue.submit(make_rows(1, 8))
+    with pytest.raises(IngestQueueFull) as error:
+        queue.submit(make_rows(1, 3))
+    assert error.value.retry_after >= 1
+    assert queue.metrics()['rejected_batches'] == 1
+
+    # 写线程已取出、尚未写入的读数仍占用容量
+    queue._next_batch()
+    with pytest.raises(IngestQueueFull):
+        queue.submit(make_rows(1, 3))
+
+
+def test_writer_thread_commits_queued_readings(queue, ponds):
+    queue.batch_size = 50
+    queue.flush_interval = 0.01
+    for _ in range(3):
+        queue.submit(make_rows(ponds[0].id, 40))
+    queue.stop()
+
+    assert WaterQuality.query.count() == 120
+    assert queue.metrics()['committed_rows'] == 120
+    assert queue.metrics()['depth'] == 0
@@ -0,0 +1,119 @@
+from datetime import date, datetime, timedelta
+import pytest
+from models import db, FeedingRecord, FeedingDecision, WeeklyReport
+from services.ingest import insert_readings
+from services.reports import ReportEngine, recent_weeks, report_response, encode_payload, decode_payload
+from services.water_quality import METRIC_FIELDS
+
+WEEK_START = datetime(2026, 5, 4)  # 周一
+
+
+def reading(pond_id, timestamp, dissolved_oxygen):
+    row = dict.fromkeys(METRIC_FIELDS, 1.0)
+    row.update(pond_id=pond_id, timestamp=timestamp, dissolved_oxygen=dissolved_oxygen)
+    return row
+
+
+@pytest.fixture
+def week_data(ponds):
+    """1号塘第一天有三时段方案（一个时段已应用）、两次投喂和两条读数，2号塘只有一次投喂"""
+    first, second = ponds
+    insert_readings([reading(first.id, WEEK_START + timedelta(hours=6), 5.0),
+                     reading(first.id, WEEK_START + timedelta(hours=18), 7.0)])
+    for slot, hour in enumerate((8, 14, 20)):
+        db.session.add(FeedingDecision(
+            pond_id=first.id, recommended_amount=1.5, reasoning='', plan_date=WEEK_START.date(), slot=slot,
+            slot_time=WEEK_START + timedelta(hours=hour), applied=slot == 0, created_at=WEEK_START
+        ))
+    db.session.add_all([
+        FeedingRecord(pond_id=first.id, amount=1.5, time=WEEK_START + timedelta(hours=8)),
+        FeedingRecord(pond_id=first.id, amount=2.0, time=WEEK_START + timedelta(hours=14)),
+        FeedingRecord(pond_id=second.id, amount=3.0, time=WEEK_START + timedelta(days=1, hours=8)),
+    ])
+    db.session.commit()
+    return ponds
+
+
+def closed_week():
+    return recent_weeks(2, date(2026, 5, 12))[1]
+
+
+def test_report_counts_each_daily_plan_once(week_data):
+    week = closed_week()
+    payload, built = ReportEngine().report(week, now=datetime(2026, 5, 12))
+    response = report_response(payload, week)
+
+    assert built
+    assert response['daily']['decisions'][:2] == [1, 0]
+    assert response['daily']['applied'][0] == pytest.approx(0.3)
+    assert response['summary']['total_decisions'] == 1
+    assert response['summary']['decision_adoption'] == pytest.approx(33.3)
+    assert response['summary']['total_feeding'] == pytest.approx(6.5)
+
+
+def test_report_includes_per_pond_figures(week_data):
+    week = closed_week()
+    payload, _ = ReportEngine().report(week, now=datetime(2026, 5, 12))
+
+    first, second = report_response(payload, week)['ponds']
+    assert (first['name'], first['feeding'], first['decisions'], first['decision_adoption']) == ('1号塘', 3.5, 1, 33.3)
+    assert first['avg_dissolved_oxygen'] == pytest.approx(6.0)
+    assert (second['name'], second['feeding'], second['decisions'], second['decision_adoption']) == ('2号塘', 3.0, 0, None)
+    assert second['avg_dissolved_oxygen'] is None
+
+    only_second = report_response(payload, week, week_data[1].id)
+    assert [pond['name'] for pond in only_second['ponds']] == ['2号塘']
+
+
+def test_closed_week_is_built_once(week_data):
+    engine, week = ReportEngine(), closed_week()
+    engine.report(week, now=datetime(2026, 5, 12))
+
+    db.session.add(FeedingRecord(pond_id=week_data[0].id, amount=9.0, time=WEEK_START + timedelta(days=2)))
+    db.session.commit()
+    payload, built = engine.report(week, now=datetime(2026, 5, 13))
+    assert not built
+    assert report_response(payload, week)['summary']['total_feeding'] == pytest.approx(6.5)
+
+
+def test_outdated_payload_version_is_rebuilt(week_data):
+    engine, week = ReportEngine(), closed_week()
+    engine.report(week, now=datetime(2026, 5, 12))
+    report = db.session.get(WeeklyReport, WEEK_START.date())
+    payload = decode_payload(report.payload)
+    del payload['version']
+    report.payload = encode_payload(payload)
+    report.built_at = datetime(2026, 5, 12, 1)
+    db.session.commit()
+
+    payload, built = engine.report(week, now=datetime(2026, 5, 13))
+    assert built
+    assert 'version' in payload
+
+
+def test_open_week_is_updated_incrementally(week_data):
+    engine = ReportEngine()
+    week = recent_weeks(1, date(2026, 5, 6))[0]
+    engine.report(week, now=datetime(2026, 5, 6, 12))
+
+    db.session.add(FeedingRecord(pond_id=week_data[1].id, amount=4.0, time=datetime(2026, 5, 6, 13)))
+    db.session.commit()
+    payload, built = engine.report(week, now=datetime(2026, 5, 6, 12, 30), max_age=3600)
+    assert not built
+    assert report_response(payload, week)['summary']['total_feeding'] == pytest.approx(6.5)
+
+    payload, built = engine.report(week, now=datetime(2026, 5, 6, 14), max_age=0)
+    assert built
+    assert report_response(payload, week)['daily']['feeding'][2] == pytest.approx(4.0)
+    assert report_response(payload, week)['summary']['total_feeding'] == pytest.approx(10.5)
+
+
+def test_report_returns_previous_payload_while_another_thread_builds(week_data):
+    engine = ReportEngine()
+    week = recent_weeks(1, date(2026, 5, 6))[0]
+    previous, _ = engine.report(week, now=datetime(2026, 5, 6, 12))
+
+    engine._building.add(WEEK_START.date())
+    payload, built = engine.report(week, now=datetime(2026, 5, 6, 14), max_age=0)
+    assert not built
+    assert payload is previous
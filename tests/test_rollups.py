@@ -0,0 +1,73 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from models import db, WaterQualityHourly, WaterQualityDaily
+from services.ingest import insert_readings
+from services.rollups import rebuild_rollups, aggregate_readings
+from services.water_quality import METRIC_FIELDS
+
+START = datetime(2026, 5, 1, 22, 0, 0)
+
+
+def make_rows(pond_ids, count, seed=1):
+    """跨越零点的读数，含空值、相同时间戳和乱序到达的迟到读数"""
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(count):
+        timestamp = START + timedelta(seconds=37 * i)
+        for pond_id in pond_ids:
+            row = {'pond_id': pond_id, 'timestamp': timestamp}
+            for metric in METRIC_FIELDS:
+                row[metric] = None if rnd.random() < 0.1 else round(rnd.uniform(0, 10), 3)
+            for metric in ('temperature', 'ph', 'dissolved_oxygen', 'ammonia'):
+                row[metric] = round(rnd.uniform(0, 10), 3)
+            rows.append(row)
+    rnd.shuffle(rows)
+    return rows
+
+
+def snapshot(model):
+    columns = ['value_first', 'first_at', 'value_last', 'last_at', 'sample_count', 'value_min', 'value_max']
+    return {
+        (row.pond_id, row.bucket_start, row.metric): (row.value_sum, tuple(getattr(row, column) for column in columns))
+        for row in db.session.query(model).all()
+    }
+
+
+def assert_same_rollups(expected, actual):
+    assert expected.keys() == actual.keys()
+    for key, (value_sum, values) in expected.items():
+        assert actual[key][0] == pytest.approx(value_sum)
+        assert actual[key][1] == values
+
+
+def test_incremental_upserts_match_rebuild(app, ponds):
+    pond_ids = [pond.id for pond in ponds]
+    rows = make_rows(pond_ids, 400)
+    # 分多批写入，每批在各自的事务中合并进已有汇总
+    for start in range(0, len(rows), 150):
+        insert_readings(rows[start:start + 150])
+
+    incremental = {model: snapshot(model) for model in (WaterQualityHourly, WaterQualityDaily)}
+    assert incremental[WaterQualityDaily]
+
+    assert rebuild_rollups() == len(rows)
+    for model, expected in incremental.items():
+        assert_same_rollups(expected, snapshot(model))
+
+
+def test_rebuild_range_keeps_other_buckets(app, ponds):
+    insert_readings(make_rows([ponds[0].id], 300))
+    before = snapshot(WaterQualityHourly)
+
+    # 只重建第二天，前一天的汇总保持不变
+    rebuild_rollups(START + timedelta(hours=3), START + timedelta(hours=4))
+    assert_same_rollups(before, snapshot(WaterQualityHourly))
+
+
+def test_aggregate_first_and_last_follow_arrival_order_for_equal_timestamps():
+    timestamp = START + timedelta(minutes=5)
+    rows = [dict.fromkeys(METRIC_FIELDS) | {'pond_id': 1, 'timestamp': timestamp, 'ph': value}
+            for value in (7.0, 7.5, 8.0)]
+    stats = aggregate_readings(rows, 'hour')[(1, START, 'ph')]
+    assert stats == [3, 22.5, 7.0, 8.0, 7.0, timestamp, 8.0, timestamp]
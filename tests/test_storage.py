@@ -0,0 +1,137 @@
+import os
+from datetime import datetime, timedelta
+from models import db, Pond, WaterQuality, WaterQualityPartition, WaterQualityPartitionLatest
+from services import storage
+from services.ingest import insert_readings
+from services.storage import (iter_water_quality, partition_month, archive_partition, drop_partition,
+                              maintain_partitions, latest_partition_rows)
+from services.water_quality import METRIC_FIELDS, latest_water_quality_by_pond
+
+COLUMNS = ['pond_id', 'timestamp', 'temperature', 'ph']
+
+
+def make_rows(pond_id, start, count, step=timedelta(hours=7)):
+    rows = []
+    for i in range(count):
+        row = dict.fromkeys(METRIC_FIELDS, 1.0)
+        row.update(pond_id=pond_id, timestamp=start + i * step, temperature=20 + i % 10, ph=7 + i % 3 / 10)
+        rows.append(row)
+    return rows
+
+
+def read_all(**kwargs):
+    return [tuple(row) for row in iter_water_quality(COLUMNS, **kwargs)]
+
+
+def test_partition_month_moves_rows_and_queries_stay_the_same(app, ponds):
+    insert_readings(make_rows(ponds[0].id, datetime(2026, 3, 28), 40) + make_rows(ponds[1].id, datetime(2026, 4, 2), 20))
+    before = read_all()
+    window = {'start_time': datetime(2026, 3, 30), 'end_time': datetime(2026, 4, 3, 12)}
+    window_before = read_all(**window)
+
+    moved = partition_month(datetime(2026, 3, 15))
+    assert moved == sum(1 for row in before if row[1] < datetime(2026, 4, 1))
+    assert WaterQuality.query.filter(WaterQuality.timestamp < datetime(2026, 4, 1)).count() == 0
+    assert db.session.get(WaterQualityPartition, '2026-03').row_count == moved
+
+    # 分区和热表按时间归并，读取结果与转存前一致
+    assert read_all() == before
+    assert read_all(**window) == window_before
+    assert read_all(pond_ids=[ponds[1].id]) == [row for row in before if row[0] == ponds[1].id]
+
+    # 再次转存同一个月份时没有需要转存的记录
+    assert partition_month(datetime(2026, 3, 1)) == 0
+
+
+def test_archived_partition_is_readable(app, ponds):
+    insert_readings(make_rows(ponds[0].id, datetime(2026, 3, 1), 30))
+    before = read_all()
+    partition_month(datetime(2026, 3, 1))
+    archive_partition(db.session.get(WaterQualityPartition, '2026-03'))
+
+    assert db.session.get(WaterQualityPartition, '2026-03').status == 'archived'
+    assert read_all() == before
+
+
+def test_late_reading_for_archived_month_stays_in_hot_table(app, ponds):
+    insert_readings(make_rows(ponds[0].id, datetime(2026, 3, 1), 10))
+    partition_month(datetime(2026, 3, 1))
+    archive_partition(db.session.get(WaterQualityPartition, '2026-03'))
+
+    late = make_rows(ponds[0].id, datetime(2026, 3, 1, 1), 1)
+    insert_readings(late)
+    assert partition_month(datetime(2026, 3, 1)) == 0
+    timestamps = [row[1] for row in read_all()]
+    assert timestamps == sorted(timestamps) and late[0]['timestamp'] in timestamps
+
+
+def test_latest_reading_falls_back_to_partitions(app, ponds):
+    old = make_rows(ponds[0].id, datetime(2026, 3, 1), 10)
+    recent = make_rows(ponds[1].id, datetime(2026, 4, 20), 3)
+    insert_readings(old + recent)
+    partition_month(datetime(2026, 3, 1))
+
+    latest = latest_water_quality_by_pond()
+    assert latest[ponds[1].id].timestamp == recent[-1]['timestamp']
+    assert latest[ponds[0].id].timestamp == old[-1]['timestamp']
+    assert latest[ponds[0].id].temperature == old[-1]['temperature']
+
+    latest = latest_water_quality_by_pond([ponds[0].id], columns=['temperature', 'ph'])
+    assert tuple(latest[ponds[0].id]) == (ponds[0].id, old[-1]['temperature'], old[-1]['ph'])
+
+
+def test_latest_fallback_never_opens_partition_files(app, ponds, monkeypatch):
+    old = make_rows(ponds[0].id, datetime(2026, 3, 1), 10)
+    insert_readings(old)
+    partition_month(datetime(2026, 3, 1))
+    archive_partition(db.session.get(WaterQualityPartition, '2026-03'))
+    # 另一个从未有过读数的塘口
+    db.session.add(Pond(name='3号塘', area=1.0, species='草鱼', user_id=ponds[0].user_id))
+    db.session.commit()
+
+    def fail(partition):
+        raise AssertionError(f'opened partition {partition.month}')
+    monkeypatch.setattr(storage, '_readable_path', fail)
+
+    latest = latest_water_quality_by_pond()
+    assert latest[ponds[0].id].timestamp == old[-1]['timestamp']
+    assert len(latest) == 1
+    assert not os.path.exists(os.path.join(app.config['WATER_QUALITY_PARTITION_DIR'], 'cache'))
+
+
+def test_later_partition_replaces_recorded_latest_reading(app, ponds):
+    insert_readings(make_rows(ponds[0].id, datetime(2026, 2, 10), 5) + make_rows(ponds[0].id, datetime(2026, 3, 1), 5))
+    partition_month(datetime(2026, 3, 1))
+    partition_month(datetime(2026, 2, 1))
+
+    marker = db.session.get(WaterQualityPartitionLatest, ponds[0].id)
+    assert marker.month == '2026-03'
+    assert latest_partition_rows([ponds[0].id], COLUMNS)[ponds[0].id].timestamp == datetime(2026, 3, 2, 4)
+
+
+def test_maintenance_records_latest_for_older_partitions(app, ponds):
+    rows = make_rows(ponds[0].id, datetime(2026, 3, 1), 10)
+    insert_readings(rows)
+    partition_month(datetime(2026, 3, 1))
+    archive_partition(db.session.get(WaterQualityPartition, '2026-03'))
+    # 模拟记录最新读数之前创建的分区
+    WaterQualityPartitionLatest.query.delete()
+    db.session.get(WaterQualityPartition, '2026-03').latest_recorded = None
+    db.session.commit()
+    assert latest_partition_rows([ponds[0].id], COLUMNS) == {}
+
+    app.config.update(WATER_QUALITY_HOT_DAYS=30, WATER_QUALITY_ARCHIVE_AFTER_DAYS=None,
+                      WATER_QUALITY_RETENTION_DAYS=None)
+    result = maintain_partitions(now=datetime(2026, 3, 20))
+    assert result['latest_recorded'] == ['2026-03']
+    assert latest_partition_rows([ponds[0].id], COLUMNS)[ponds[0].id].timestamp == rows[-1]['timestamp']
+    assert maintain_partitions(now=datetime(2026, 3, 20))['latest_recorded'] == []
+
+
+def test_dropped_partition_removes_latest_reading(app, ponds):
+    rows = make_rows(ponds[0].id, datetime(2026, 3, 1), 10)
+    insert_readings(rows)
+    partition_month(datetime(2026, 3, 1))
+    # 小时汇总覆盖了全部记录时才允许删除
+    assert drop_partition(db.session.get(WaterQualityPartition, '2026-03'))
+    assert latest_partition_rows([ponds[0].id], COLUMNS) == {}
@@ -0,0 +1,81 @@
+import json
+from datetime import datetime
+import pytest
+from sqlalchemy import event
+from models import db, Alert
+from services import stream
+from services.stream import EventBroker
+
+
+@pytest.fixture
+def broker(app):
+    """只注册预警相关的会话监听（测试结束后移除，不影响其他测试）"""
+    broker = EventBroker()
+    broker.app = app
+    listeners = [
+        ('after_flush', stream._collect_changed_alerts),
+        ('after_commit', broker._publish_committed_alerts),
+        ('after_rollback', stream._discard_changed_alerts),
+    ]
+    for name, listener in listeners:
+        event.listen(db.session, name, listener)
+    yield broker
+    for name, listener in listeners:
+        event.remove(db.session, name, listener)
+
+
+def received(subscription):
+    events = []
+    while not subscription.queue.empty():
+        lines = subscription.queue.get_nowait().strip().split('\n')
+        events.append(json.loads(lines[2][len('data: '):]))
+    return events
+
+
+def add_alert(pond_id, level='warning'):
+    alert = Alert(pond_id=pond_id, level=level, title='溶解氧偏低', message='', metric='dissolved_oxygen',
+                  timestamp=datetime(2026, 5, 1, 8))
+    db.session.add(alert)
+    db.session.commit()
+    return alert
+
+
+def test_new_alert_is_published_after_commit(broker, ponds):
+    subscription = broker.subscribe()
+    alert = Alert(pond_id=ponds[0].id, level='warning', title='溶解氧偏低', message='',
+                  timestamp=datetime(2026, 5, 1, 8))
+    db.session.add(alert)
+    db.session.flush()
+    assert received(subscription) == []
+
+    db.session.commit()
+    [published] = received(subscription)
+    assert (published['id'], published['pond_name'], published['change']) == (alert.id, '1号塘', 'created')
+
+
+def test_escalation_and_resolution_are_published(broker, ponds):
+    alert = add_alert(ponds[0].id)
+    subscription = broker.subscribe(pond_ids=[ponds[0].id])
+
+    alert.level = 'danger'
+    db.session.commit()
+    alert.status = 'resolved'
+    db.session.commit()
+    # 与推送无关的字段变化不发布
+    alert.value = 2.5
+    db.session.commit()
+
+    assert [(event['change'], event['level'], event['status']) for event in received(subscription)] == [
+        ('escalated', 'danger', 'active'), ('resolved', 'danger', 'resolved')
+    ]
+
+
+def test_rolled_back_changes_are_not_published(broker, ponds):
+    alert = add_alert(ponds[0].id)
+    subscription = broker.subscribe()
+
+    alert.status = 'resolved'
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+    assert received(subscription) == []